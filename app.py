@@ -30,6 +30,25 @@ from modules.nutricao_estrategica import NutricaoEstrategicaModule
 from modules.suplementos_ergogenicos import SuplementosErgogenicosModule
 from modules.treinamento_periodizacao import TreinamentoPeriodizacaoModule
 from modules.monitoramento_ajustes import MonitoramentoAjustesModule
+from modules.hematologia_derivados import PainelLaboratorial
+from modules.hematologia_coorte import RegistroCoortes
+from modules.hematologia_codificacao import codificar_painel, decodificar_painel, decodificar_paineis
+from modules.hematologia_linha_base import atualizar_linha_base
+from modules.hematologia_importacao import ImportadorExames
+from modules.hematologia_consulta import GRUPOS_STATUS, OPERADORES_CONSULTA, OPERADORES_SQL, consultar_marcador
+from modules.hematologia_referencias import (
+    STATUS_ORDEM, CacheReferenciasCamadas, converter_idade, normalizar_laboratorio, obter_tabelas_referencia,
+    validar_sobreposicao
+)
+from modules.nutricao_alimentos import REFEICOES_ALIMENTOS, componentes_excluidos, mascara_bits
+from modules.nutricao_busca import obter_indice_busca
+from modules.nutricao_compras import agregar_compras, codificar_itens_plano
+from modules.nutricao_energia import calcular_gasto_energetico
+from modules.nutricao_gasto_adaptativo import CAMPOS_ESTADO, atualizar_gasto, estimativa_gasto
+from modules.nutricao_micronutrientes import obter_cobertura
+from modules.nutricao_receitas import obter_livro_receitas, resolver_ingredientes, versao_receita
+from modules.nutricao_rotacao import DIAS_MAXIMOS_ROTACAO
+from modules.nutricao_substituicao import obter_substituicao
 
 # Modelos do banco de dados
 class User(UserMixin, db.Model):
@@ -62,6 +81,106 @@ class Cliente(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ExameLaboratorial(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False, index=True)
+    data_coleta = db.Column(db.Date, nullable=False)
+    laboratorio = db.Column(db.String(100))
+    sexo = db.Column(db.String(10))
+    idade = db.Column(db.Integer)
+    painel = db.Column(db.LargeBinary, nullable=False)  # formato binário (modules/hematologia_codificacao.py)
+    dados = db.Column(db.Text)  # JSON com marcadores fora do registro, se houver
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # revisão (coorte)
+
+class LinhaBaseMarcador(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False, index=True)
+    marcador = db.Column(db.String(50), nullable=False)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    media = db.Column(db.Float, nullable=False, default=0.0)
+    variancia = db.Column(db.Float, nullable=False, default=0.0)  # variância exponencial (modules/hematologia_linha_base.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('cliente_id', 'marcador'),)
+
+class IndiceMarcador(db.Model):
+    """Um valor por (exame, marcador) para consultas no roster sem decodificar painéis"""
+    id = db.Column(db.Integer, primary_key=True)
+    exame_id = db.Column(db.Integer, db.ForeignKey('exame_laboratorial.id'), nullable=False, index=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False)
+    marcador = db.Column(db.String(50), nullable=False)
+    valor = db.Column(db.Float, nullable=False)
+    data_coleta = db.Column(db.Date, nullable=False)
+    sexo = db.Column(db.String(10))
+    idade = db.Column(db.Integer)
+    laboratorio = db.Column(db.String(100))
+    __table_args__ = (
+        db.Index('ix_indice_marcador_valor', 'marcador', 'valor'),
+        db.Index('ix_indice_marcador_data', 'marcador', 'data_coleta'),
+    )
+
+class ReferenciaPersonalizada(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    laboratorio = db.Column(db.String(100))  # vazio: sobreposição do coach para qualquer laboratório
+    marcador = db.Column(db.String(50), nullable=False)
+    sexo = db.Column(db.String(10))  # vazio: ambos os sexos
+    min = db.Column(db.Float)
+    max = db.Column(db.Float)
+    ideal_min = db.Column(db.Float)
+    ideal_max = db.Column(db.Float)
+    unidade = db.Column(db.String(20))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RegistroDiario(db.Model):
+    """Pesagem em jejum e calorias ingeridas no dia"""
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+    peso = db.Column(db.Float)
+    calorias = db.Column(db.Float)
+    __table_args__ = (db.UniqueConstraint('cliente_id', 'data'),)
+
+class GastoAdaptativo(db.Model):
+    """Estado do estimador de gasto (modules/nutricao_gasto_adaptativo.py), atualizado a cada registro"""
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False, unique=True)
+    ultimo_registro = db.Column(db.Date, nullable=False)
+    data_peso = db.Column(db.Date, nullable=False)
+    peso = db.Column(db.Float, nullable=False)  # peso de tendência (filtrado)
+    variancia = db.Column(db.Float, nullable=False)
+    gasto = db.Column(db.Float, nullable=False)
+    dias_balanco = db.Column(db.Integer, nullable=False, default=0)
+    ingestao_pendente = db.Column(db.Float, nullable=False, default=0.0)  # kcal desde a última pesagem
+    dias_pendentes = db.Column(db.Integer, nullable=False, default=0)
+    ingestao_media = db.Column(db.Float)  # média exponencial das calorias registradas (dias sem registro)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PlanoNutricional(db.Model):
+    """Cardápio rotativo gerado para o cliente (modules/nutricao_rotacao.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False, index=True)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    data_inicio = db.Column(db.Date, nullable=False)
+    dias = db.Column(db.Integer, nullable=False)
+    semente = db.Column(db.Integer, nullable=False, default=0)
+    parametros = db.Column(db.Text)  # JSON com os dados usados nas metas
+    plano = db.Column(db.Text, nullable=False)  # JSON com os dias, variedade e metas
+    alimentos = db.Column(db.Text)  # JSON com os ids dos alimentos referenciados em itens
+    itens = db.Column(db.LargeBinary)  # formato binário (modules/nutricao_compras.py) para a lista de compras
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Receita(db.Model):
+    """Receita do coach: ingredientes (ids da base de alimentos) e rendimento (modules/nutricao_receitas.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    nome = db.Column(db.String(120), nullable=False)
+    porcoes = db.Column(db.Float, nullable=False, default=1.0)
+    refeicoes = db.Column(db.String(120))  # tipos separados por '|' (cafe|lanche)
+    ingredientes = db.Column(db.Text, nullable=False)  # JSON [{alimento, gramas}]
+    versao = db.Column(db.String(16), nullable=False)  # hash do rendimento e dos ingredientes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -158,7 +277,320 @@ def modulo5():
 def modulo6():
     return render_template('modulos/modulo6_monitoramento.html')
 
+# Coortes hematológicas por coach, atualizadas incrementalmente a partir dos exames armazenados
+registro_coortes = RegistroCoortes()
+
+def _chave_exame(cliente_id, data_coleta, laboratorio):
+    """Identidade de um painel: cliente, data de coleta e laboratório normalizado"""
+    return cliente_id, data_coleta, normalizar_laboratorio(laboratorio)
+
+def _exames_por_chave(chaves):
+    """Painéis gravados por chave (_chave_exame); havendo mais de um, vale o mais antigo"""
+    existentes = {}
+    for exame in ExameLaboratorial.query.filter(
+        ExameLaboratorial.cliente_id.in_({cliente_id for cliente_id, _, _ in chaves}),
+        ExameLaboratorial.data_coleta.in_({data_coleta for _, data_coleta, _ in chaves})
+    ).order_by(ExameLaboratorial.id):
+        chave = _chave_exame(exame.cliente_id, exame.data_coleta, exame.laboratorio)
+        if chave in chaves:
+            existentes.setdefault(chave, exame)
+    return existentes
+
+def _exame_armazenado(cliente_id, data_coleta, laboratorio):
+    """Painel já gravado para (cliente, data de coleta, laboratório), se houver"""
+    chave = _chave_exame(cliente_id, data_coleta, laboratorio)
+    return _exames_por_chave({chave}).get(chave)
+
+def _tem_exame_posterior(cliente_id, data_coleta):
+    return ExameLaboratorial.query.filter(
+        ExameLaboratorial.cliente_id == cliente_id, ExameLaboratorial.data_coleta > data_coleta
+    ).first() is not None
+
+def _salvar_exame(cliente, dados, data_coleta, exame=None):
+    """
+    Armazena o painel enviado para o cliente e atualiza sua linha de base. Com o exame já
+    gravado para a mesma data e laboratório, os valores enviados são mesclados nele (como na
+    importação) em vez de criar um registro duplicado.
+    """
+    sexo = dados.get('sexo', 'masculino').lower()
+    medidos = PainelLaboratorial(dados.get('exames', {})).medidos
+    atualizado = exame is not None
+    if atualizado:
+        medidos = {**_valores_exame(exame), **medidos}
+    painel_laboratorial = PainelLaboratorial(medidos)
+    painel, extras = codificar_painel(painel_laboratorial.medidos, sexo)
+    if exame is None:
+        exame = ExameLaboratorial(cliente_id=cliente.id, data_coleta=data_coleta, laboratorio=dados.get('laboratorio'))
+        db.session.add(exame)
+    exame.sexo = sexo
+    idade = converter_idade(dados.get('idade'))
+    exame.idade = int(idade) if idade is not None else None
+    exame.painel = painel
+    exame.dados = json.dumps(extras) if extras else None
+    valores = dict(painel_laboratorial.items())
+    db.session.flush()
+    # A média exponencial depende da ordem de coleta: painel alterado ou retroativo refaz o histórico
+    if atualizado or _tem_exame_posterior(cliente.id, data_coleta):
+        _recalcular_linha_base(cliente.id)
+    else:
+        _atualizar_linha_base(cliente.id, valores)
+    _indexar_exames([(exame, valores)])
+    db.session.commit()
+    return exame
+
+def _carregar_linha_base(cliente_id):
+    """Linha de base do cliente: marcador -> (n, media, variancia)"""
+    return {
+        linha.marcador: (linha.n, linha.media, linha.variancia)
+        for linha in LinhaBaseMarcador.query.filter_by(cliente_id=cliente_id)
+    }
+
+def _gravar_linha_base(cliente_id, estados, linhas=None):
+    """Grava os estados (marcador -> (n, media, variancia)) nas linhas do cliente"""
+    linhas = {} if linhas is None else linhas
+    for marcador, (n, media, variancia) in estados.items():
+        linha = linhas.get(marcador)
+        if linha is None:
+            linha = LinhaBaseMarcador(cliente_id=cliente_id, marcador=marcador)
+            db.session.add(linha)
+        linha.n, linha.media, linha.variancia = n, media, variancia
+
+def _atualizar_linha_base(cliente_id, valores):
+    """Inclui o painel na linha de base em O(marcadores), sem reler o histórico"""
+    linhas = {linha.marcador: linha for linha in LinhaBaseMarcador.query.filter_by(cliente_id=cliente_id)}
+    estados = {marcador: (linha.n, linha.media, linha.variancia) for marcador, linha in linhas.items()}
+    novos = atualizar_linha_base(estados, valores)
+    _gravar_linha_base(cliente_id, {marcador: novos[marcador] for marcador in valores}, linhas)
+
+def _indexar_exames(exames):
+    """(Re)indexa os valores de exames já com id: lista de (exame, marcador -> valor)"""
+    ids = [exame.id for exame, _ in exames]
+    IndiceMarcador.query.filter(IndiceMarcador.exame_id.in_(ids)).delete(synchronize_session=False)
+    linhas = [
+        {'exame_id': exame.id, 'cliente_id': exame.cliente_id, 'marcador': marcador, 'valor': float(valor),
+         'data_coleta': exame.data_coleta, 'sexo': exame.sexo, 'idade': exame.idade,
+         'laboratorio': exame.laboratorio}
+        for exame, valores in exames
+        for marcador, valor in valores.items()
+    ]
+    if linhas:
+        db.session.execute(IndiceMarcador.__table__.insert(), linhas)
+
+def _valores_exame(exame):
+    """Marcadores medidos de um exame armazenado (registrados + extras)"""
+    valores, _ = decodificar_painel(exame.painel)
+    if exame.dados:
+        valores.update(json.loads(exame.dados))
+    return valores
+
+def _valores_exames(exames):
+    """Marcadores medidos de vários exames armazenados, com os painéis decodificados em lote"""
+    resultado = []
+    for exame, (valores, _) in zip(exames, decodificar_paineis([exame.painel for exame in exames])):
+        if exame.dados:
+            valores.update(json.loads(exame.dados))
+        resultado.append(valores)
+    return resultado
+
+def _sincronizar_coorte(coach_id):
+    """Coorte do coach com todos os painéis armazenados até agora (refeita se algum painel mudou)"""
+    exames_coach = (ExameLaboratorial.query
+                    .join(Cliente, ExameLaboratorial.cliente_id == Cliente.id)
+                    .filter(Cliente.coach_id == coach_id))
+
+    def impressao(ate_id):
+        consulta = exames_coach if ate_id is None else exames_coach.filter(ExameLaboratorial.id <= ate_id)
+        return tuple(consulta.with_entities(
+            db.func.count(ExameLaboratorial.id), db.func.max(ExameLaboratorial.id),
+            db.func.max(ExameLaboratorial.updated_at)
+        ).one())
+
+    def buscar_paineis(ultimo_id, ate_id):
+        exames = (exames_coach
+                  .filter(ExameLaboratorial.id > ultimo_id, ExameLaboratorial.id <= ate_id)
+                  .order_by(ExameLaboratorial.id)
+                  .all())
+        for exame, valores in zip(exames, _valores_exames(exames)):
+            painel = PainelLaboratorial(valores)
+            yield exame.id, dict(painel.items()), exame.sexo, exame.cliente_id
+
+    return registro_coortes.obter(coach_id).sincronizar(buscar_paineis, impressao)
+
+def _idade_na_coleta(cliente, data_coleta):
+    nascimento = cliente.data_nascimento
+    if nascimento is None:
+        return None
+    return data_coleta.year - nascimento.year - ((data_coleta.month, data_coleta.day) < (nascimento.month, nascimento.day))
+
+def _linha_base_historico(cliente_id, excluir_exame_id=None, ate=None):
+    """Linha de base calculada a partir dos painéis gravados (coletados até 'ate'), em ordem de coleta"""
+    estados = {}
+    exames = ExameLaboratorial.query.filter_by(cliente_id=cliente_id)
+    if ate is not None:
+        exames = exames.filter(ExameLaboratorial.data_coleta <= ate)
+    exames = [exame for exame in exames.order_by(ExameLaboratorial.data_coleta, ExameLaboratorial.id)
+              if exame.id != excluir_exame_id]
+    for valores in _valores_exames(exames):
+        estados = atualizar_linha_base(estados, dict(PainelLaboratorial(valores).items()))
+    return estados
+
+def _recalcular_linha_base(cliente_id):
+    """Refaz a linha de base do cliente a partir do histórico (após painéis alterados em lote)"""
+    estados = _linha_base_historico(cliente_id)
+    LinhaBaseMarcador.query.filter_by(cliente_id=cliente_id).delete()
+    _gravar_linha_base(cliente_id, estados)
+
+def _gravar_lote_importado(coach_id, paineis, clientes_por_email, nao_encontrados, chaves_importacao):
+    """
+    Upsert de um lote de painéis importados (um por cliente, data de coleta e laboratório) em uma
+    única transação. chaves_importacao: chaves (_chave_exame) já gravadas pelos lotes anteriores da
+    mesma importação; um painel dividido entre dois lotes é contado uma vez só (criado ou atualizado).
+    Retorna (ids dos clientes afetados, painéis criados, painéis atualizados).
+    """
+    novos_emails = {email for email, _, _ in paineis} - clientes_por_email.keys() - nao_encontrados
+    if novos_emails:
+        for cliente in Cliente.query.filter(Cliente.coach_id == coach_id,
+                                            db.func.lower(Cliente.email).in_(novos_emails)):
+            clientes_por_email[cliente.email.lower()] = cliente
+        nao_encontrados.update(novos_emails - clientes_por_email.keys())
+    
+    por_chave = {}
+    for (email, data_coleta, _), painel in paineis.items():
+        cliente = clientes_por_email.get(email)
+        if cliente is not None:
+            por_chave[_chave_exame(cliente.id, data_coleta, painel['laboratorio'])] = (cliente, painel)
+    if not por_chave:
+        return set(), 0, 0
+    
+    existentes = _exames_por_chave(set(por_chave))
+    
+    criados = atualizados = 0
+    indexar = []
+    for chave, (cliente, painel) in por_chave.items():
+        exame = existentes.get(chave)
+        valores = dict(painel['exames'])
+        if exame is None:
+            exame = ExameLaboratorial(cliente_id=cliente.id, data_coleta=chave[1], laboratorio=painel['laboratorio'],
+                                      sexo=cliente.sexo, idade=_idade_na_coleta(cliente, chave[1]))
+            db.session.add(exame)
+            criados += 1
+        else:
+            valores = {**_valores_exame(exame), **valores}
+            atualizados += chave not in chaves_importacao
+        chaves_importacao.add(chave)
+        codificado, extras = codificar_painel(valores, exame.sexo)
+        exame.painel = codificado
+        exame.dados = json.dumps(extras) if extras else None
+        indexar.append((exame, dict(PainelLaboratorial(valores).items())))
+    
+    db.session.flush()
+    _indexar_exames(indexar)
+    db.session.commit()
+    return {cliente_id for cliente_id, _, _ in por_chave}, criados, atualizados
+
+# Referências em camadas (coach -> laboratório -> tabelas base) por (coach, laboratório)
+cache_referencias = CacheReferenciasCamadas()
+
+def _sobreposicao_dict(referencia):
+    return {
+        'id': referencia.id,
+        'escopo': 'laboratorio' if referencia.laboratorio else 'coach',
+        'laboratorio': referencia.laboratorio,
+        'marcador': referencia.marcador,
+        'sexo': referencia.sexo,
+        'min': referencia.min,
+        'max': referencia.max,
+        'ideal_min': referencia.ideal_min,
+        'ideal_max': referencia.ideal_max,
+        'unidade': referencia.unidade
+    }
+
+def _referencias_camadas(coach_id, laboratorio):
+    """Tabela achatada do coach para o laboratório, reconstruída só quando uma sobreposição muda"""
+    laboratorio = normalizar_laboratorio(laboratorio)
+    consulta = ReferenciaPersonalizada.query.filter_by(coach_id=coach_id)
+
+    def impressao():
+        return consulta.with_entities(
+            db.func.count(ReferenciaPersonalizada.id), db.func.max(ReferenciaPersonalizada.updated_at)
+        ).one()
+
+    def carregar():
+        sobreposicoes = [_sobreposicao_dict(referencia) for referencia in consulta.filter(
+            db.or_(ReferenciaPersonalizada.laboratorio.is_(None), ReferenciaPersonalizada.laboratorio == laboratorio)
+        )]
+        return (
+            [sobreposicao for sobreposicao in sobreposicoes if sobreposicao['escopo'] == 'laboratorio'],
+            [sobreposicao for sobreposicao in sobreposicoes if sobreposicao['escopo'] == 'coach']
+        )
+
+    return cache_referencias.obter(coach_id, laboratorio, obter_tabelas_referencia(), impressao, carregar)
+
 # APIs dos módulos
+def _nivel_atividade(cliente, padrao='moderadamente_ativo'):
+    """Nível de atividade salvo em dados_adicionais, se houver"""
+    try:
+        adicionais = json.loads(cliente.dados_adicionais or '{}')
+    except ValueError:
+        adicionais = {}
+    return adicionais.get('nivel_atividade') or padrao
+
+def _gasto_pelas_equacoes(cliente, data):
+    """GET pelas equações para iniciar o estimador adaptativo (None com perfil incompleto)"""
+    if not (cliente.peso and cliente.altura and cliente.data_nascimento
+            and (cliente.sexo or '').lower() in ('masculino', 'feminino')):
+        return None
+    calculo = calcular_gasto_energetico(
+        [cliente.peso], [cliente.altura], [_idade_na_coleta(cliente, data)], [cliente.sexo],
+        [cliente.percentual_gordura], [_nivel_atividade(cliente)]
+    )
+    return float(calculo['get'][0])
+
+def _carregar_gasto_adaptativo(cliente_id):
+    linha = GastoAdaptativo.query.filter_by(cliente_id=cliente_id).first()
+    return {campo: getattr(linha, campo) for campo in CAMPOS_ESTADO} if linha else None
+
+def _gravar_gasto_adaptativo(cliente_id, estado):
+    linha = GastoAdaptativo.query.filter_by(cliente_id=cliente_id).first()
+    if estado is None:
+        if linha is not None:
+            db.session.delete(linha)
+        return
+    if linha is None:
+        linha = GastoAdaptativo(cliente_id=cliente_id)
+        db.session.add(linha)
+    for campo in CAMPOS_ESTADO:
+        setattr(linha, campo, estado[campo])
+
+def _exames_recentes(cliente):
+    """Referências do coach e valores do painel mais recente do cliente (para cruzar com a dieta)"""
+    exame = (ExameLaboratorial.query.filter_by(cliente_id=cliente.id)
+             .order_by(ExameLaboratorial.data_coleta.desc(), ExameLaboratorial.id.desc()).first())
+    if exame is None:
+        return _referencias_camadas(cliente.coach_id, None), {}
+    return _referencias_camadas(cliente.coach_id, exame.laboratorio), _valores_exame(exame)
+
+def _receitas_coach(coach_id):
+    """Receitas do coach no formato do livro de receitas"""
+    return [
+        {
+            'id': f'receita_{receita.id}',
+            'nome': receita.nome,
+            'porcoes': receita.porcoes,
+            'refeicoes': [refeicao for refeicao in (receita.refeicoes or '').split('|') if refeicao],
+            'ingredientes': json.loads(receita.ingredientes)
+        }
+        for receita in Receita.query.filter_by(coach_id=coach_id).order_by(Receita.id)
+    ]
+
+def _recalcular_gasto_adaptativo(cliente):
+    """Refaz o estado a partir de todos os registros diários (após correção de um dia passado)"""
+    estado = None
+    for registro in RegistroDiario.query.filter_by(cliente_id=cliente.id).order_by(RegistroDiario.data):
+        gasto_inicial = _gasto_pelas_equacoes(cliente, registro.data) if estado is None else None
+        estado = atualizar_gasto(estado, registro.data, registro.peso, registro.calorias, gasto_inicial)
+    return estado
+
 @app.route('/api/perfil', methods=['POST'])
 @login_required
 def api_perfil():
@@ -168,14 +600,708 @@ def api_perfil():
 @app.route('/api/hematologia', methods=['POST'])
 @login_required
 def api_hematologia():
-    hematologia_module = AvaliacaoHematologicaModule()
-    return hematologia_module.analisar_exames(request.get_json())
+    dados = request.get_json()
+    
+    coorte = None
+    linha_base = None
+    referencias = None
+    if current_user.is_coach:
+        referencias = _referencias_camadas(current_user.id, dados.get('laboratorio'))
+        if dados.get('cliente_id'):
+            cliente = Cliente.query.filter_by(id=dados['cliente_id'], coach_id=current_user.id).first()
+            if cliente is None:
+                return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+            try:
+                data_coleta = datetime.strptime(dados['data_coleta'], '%Y-%m-%d').date() \
+                    if dados.get('data_coleta') else datetime.utcnow().date()
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': 'Data de coleta inválida (use AAAA-MM-DD)'})
+            if cliente.sexo:
+                dados.setdefault('sexo', cliente.sexo)
+            dados['cliente_id'] = cliente.id
+            # Linha de base dos painéis anteriores a este, que é então incluído nela (ou substituído, se reenviado)
+            exame = _exame_armazenado(cliente.id, data_coleta, dados.get('laboratorio'))
+            if exame is None and not _tem_exame_posterior(cliente.id, data_coleta):
+                linha_base = _carregar_linha_base(cliente.id)
+            else:
+                linha_base = _linha_base_historico(cliente.id, exame.id if exame else None, data_coleta)
+            _salvar_exame(cliente, dados, data_coleta, exame)
+        coorte = _sincronizar_coorte(current_user.id)
+    
+    hematologia_module = AvaliacaoHematologicaModule(referencias)
+    return hematologia_module.analisar_exames(dados, coorte=coorte, linha_base=linha_base)
+
+@app.route('/api/hematologia/comparar', methods=['POST'])
+@login_required
+def api_hematologia_comparar():
+    dados = request.get_json()
+    referencias = None
+    if current_user.is_coach:
+        referencias = _referencias_camadas(current_user.id, dados.get('laboratorio'))
+    hematologia_module = AvaliacaoHematologicaModule(referencias)
+    
+    # Painéis armazenados do cliente, por id
+    if dados.get('paineis_ids'):
+        cliente = Cliente.query.filter_by(id=dados.get('cliente_id'), coach_id=current_user.id).first()
+        if cliente is None:
+            return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+        exames = ExameLaboratorial.query.filter(
+            ExameLaboratorial.cliente_id == cliente.id,
+            ExameLaboratorial.id.in_(dados['paineis_ids'])
+        ).all()
+        if cliente.sexo:
+            dados.setdefault('sexo', cliente.sexo)
+        dados['paineis'] = dados.get('paineis', []) + [
+            {'id': exame.id, 'data_coleta': exame.data_coleta.isoformat(), 'exames': _valores_exame(exame)}
+            for exame in exames
+        ]
+    
+    return hematologia_module.comparar_exames(dados)
+
+@app.route('/api/hematologia/criticos', methods=['POST'])
+@login_required
+def api_hematologia_criticos():
+    dados = request.get_json()
+    referencias = None
+    if current_user.is_coach:
+        # Limites críticos relativos ao limite superior seguem as referências do laboratório/coach
+        referencias = _referencias_camadas(current_user.id, dados.get('laboratorio'))
+    hematologia_module = AvaliacaoHematologicaModule(referencias)
+    return hematologia_module.verificar_valores_criticos(dados)
+
+@app.route('/api/hematologia/importar', methods=['POST'])
+@login_required
+def api_hematologia_importar():
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem importar exames'})
+    
+    arquivo = request.files.get('arquivo')
+    if arquivo is None or not arquivo.filename:
+        return jsonify({'success': False, 'message': 'Nenhum arquivo enviado'})
+    
+    try:
+        importador = ImportadorExames(
+            mapeamento=json.loads(request.form['mapeamento']) if request.form.get('mapeamento') else None,
+            laboratorio=request.form.get('laboratorio')
+        )
+        clientes_por_email, nao_encontrados = {}, set()
+        afetados, chaves_importacao = set(), set()
+        criados = atualizados = 0
+        for paineis in importador.lotes(arquivo.stream, secure_filename(arquivo.filename),
+                                        codificacao=request.form.get('codificacao', 'utf-8-sig')):
+            clientes, novos, alterados = _gravar_lote_importado(
+                current_user.id, paineis, clientes_por_email, nao_encontrados, chaves_importacao
+            )
+            afetados |= clientes
+            criados += novos
+            atualizados += alterados
+        
+        # Linha de base e coorte refeitas uma vez por cliente, após todos os lotes
+        for cliente_id in afetados:
+            _recalcular_linha_base(cliente_id)
+        db.session.commit()
+        _sincronizar_coorte(current_user.id)
+        
+        # Análise em lote do painel mais recente de cada cliente afetado
+        ultimos = {}
+        for cliente_id in afetados:
+            exame = (ExameLaboratorial.query.filter_by(cliente_id=cliente_id)
+                     .order_by(ExameLaboratorial.data_coleta.desc(), ExameLaboratorial.id.desc()).first())
+            ultimos[cliente_id] = {
+                'cliente_id': cliente_id,
+                'data_coleta': exame.data_coleta.isoformat(),
+                'exames': _valores_exame(exame),
+                'sexo': exame.sexo,
+                'idade': exame.idade
+            }
+        hematologia_module = AvaliacaoHematologicaModule(_referencias_camadas(current_user.id, request.form.get('laboratorio')))
+        
+        return jsonify({
+            'success': True,
+            'importacao': {
+                **importador.relatorio(),
+                'paineis_criados': criados,
+                'paineis_atualizados': atualizados,
+                'clientes_afetados': len(afetados),
+                'emails_nao_encontrados': sorted(nao_encontrados)[:50],
+                'total_emails_nao_encontrados': len(nao_encontrados)
+            },
+            'analises': hematologia_module.analisar_lote(list(ultimos.values()))
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro na importação de exames: {str(e)}'})
+
+@app.route('/api/hematologia/consulta', methods=['GET'])
+@login_required
+def api_hematologia_consulta():
+    """Ex.: ?marcador=ferritina&status=abaixo_ideal ou ?marcador=alt&operador=>&valor=40&dias=90"""
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem consultar o roster'})
+    
+    try:
+        marcador = (request.args.get('marcador') or '').strip().lower().replace(' ', '_').replace('-', '_')
+        status = request.args.get('status')
+        operador = request.args.get('operador')
+        if not marcador:
+            return jsonify({'success': False, 'message': 'Informe o marcador'})
+        if status and status not in GRUPOS_STATUS and status not in STATUS_ORDEM:
+            return jsonify({'success': False, 'message': f'Status inválido: {status}'})
+        if operador and operador not in OPERADORES_CONSULTA:
+            return jsonify({'success': False, 'message': f'Operador inválido: {operador}'})
+        if not status and not operador:
+            return jsonify({'success': False, 'message': 'Informe um status ou um operador com valor'})
+        limite = float(request.args['valor']) if operador else None
+        
+        campos = ('cliente_id', 'exame_id', 'valor', 'data_coleta', 'sexo', 'idade', 'laboratorio')
+        consulta = (db.session.query(*(getattr(IndiceMarcador, campo) for campo in campos))
+                    .join(Cliente, IndiceMarcador.cliente_id == Cliente.id)
+                    .filter(IndiceMarcador.marcador == marcador, Cliente.coach_id == current_user.id))
+        if request.args.get('dias'):
+            inicio = datetime.utcnow().date() - timedelta(days=int(request.args['dias']))
+            consulta = consulta.filter(IndiceMarcador.data_coleta >= inicio)
+        colunas_consulta = IndiceMarcador
+        if request.args.get('todos') != '1':
+            # Só a medida mais recente de cada cliente, escolhida antes do limiar
+            ordem = db.func.row_number().over(
+                partition_by=IndiceMarcador.cliente_id,
+                order_by=(IndiceMarcador.data_coleta.desc(), IndiceMarcador.exame_id.desc())
+            ).label('ordem')
+            ultimas = consulta.add_columns(ordem).subquery()
+            consulta = db.session.query(*(ultimas.c[campo] for campo in campos)).filter(ultimas.c.ordem == 1)
+            colunas_consulta = ultimas.c
+        if operador:
+            consulta = consulta.filter(OPERADORES_SQL[operador](colunas_consulta.valor, limite))
+        linhas = consulta.order_by(colunas_consulta.cliente_id, colunas_consulta.data_coleta.desc(),
+                                   colunas_consulta.exame_id.desc()).all()
+        colunas = dict(zip(campos, zip(*linhas))) if linhas else {campo: () for campo in campos}
+        
+        # Limiar e última medida já aplicados no SQL; o status usa as referências do laboratório de cada exame
+        resultados = consultar_marcador(
+            colunas, marcador, lambda laboratorio: _referencias_camadas(current_user.id, laboratorio),
+            status=status, apenas_ultimo=False
+        )
+        nomes = dict(db.session.query(Cliente.id, Cliente.nome).filter(
+            Cliente.id.in_({resultado['cliente_id'] for resultado in resultados})
+        )) if resultados else {}
+        for resultado in resultados:
+            resultado['cliente_nome'] = nomes.get(resultado['cliente_id'])
+        
+        return jsonify({'success': True, 'marcador': marcador, 'total': len(resultados), 'resultados': resultados})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro na consulta: {str(e)}'})
+
+@app.route('/api/hematologia/referencias', methods=['GET', 'POST'])
+@login_required
+def api_hematologia_referencias():
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem personalizar referências'})
+    
+    if request.method == 'GET':
+        referencias = ReferenciaPersonalizada.query.filter_by(coach_id=current_user.id).all()
+        return jsonify({'success': True, 'referencias': [_sobreposicao_dict(referencia) for referencia in referencias]})
+    
+    try:
+        dados = request.get_json()
+        marcador = (dados.get('marcador') or '').strip().lower().replace(' ', '_').replace('-', '_')
+        limites = {campo: dados.get(campo) for campo in ('min', 'max', 'ideal_min', 'ideal_max')}
+        if not marcador or all(valor is None for valor in limites.values()):
+            return jsonify({'success': False, 'message': 'Informe o marcador e ao menos um limite'})
+        
+        laboratorio = normalizar_laboratorio(dados.get('laboratorio'))
+        sexo = (dados.get('sexo') or '').lower() or None
+        referencia = ReferenciaPersonalizada.query.filter_by(
+            coach_id=current_user.id, laboratorio=laboratorio, marcador=marcador, sexo=sexo
+        ).first()
+        if referencia is None:
+            referencia = ReferenciaPersonalizada(
+                coach_id=current_user.id, laboratorio=laboratorio, marcador=marcador, sexo=sexo
+            )
+            db.session.add(referencia)
+        for campo, valor in limites.items():
+            setattr(referencia, campo, float(valor) if valor is not None else None)
+        referencia.unidade = dados.get('unidade')
+        erro = validar_sobreposicao(obter_tabelas_referencia(), _sobreposicao_dict(referencia))
+        if erro:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': erro})
+        referencia.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        cache_referencias.invalidar(coach_id=current_user.id)
+        return jsonify({'success': True, 'referencia': _sobreposicao_dict(referencia)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro ao salvar referência: {str(e)}'})
+
+@app.route('/api/hematologia/referencias/<int:referencia_id>', methods=['DELETE'])
+@login_required
+def api_hematologia_referencias_remover(referencia_id):
+    referencia = ReferenciaPersonalizada.query.filter_by(id=referencia_id, coach_id=current_user.id).first()
+    if referencia is None:
+        return jsonify({'success': False, 'message': 'Referência não encontrada'})
+    db.session.delete(referencia)
+    db.session.commit()
+    cache_referencias.invalidar(coach_id=current_user.id)
+    return jsonify({'success': True})
 
 @app.route('/api/nutricao', methods=['POST'])
 @login_required
 def api_nutricao():
+    dados = request.get_json()
+    gasto_adaptativo = None
+    referencias = None
+    receitas = _receitas_coach(current_user.id) if current_user.is_coach else None
+    if current_user.is_coach and dados.get('cliente_id'):
+        cliente = Cliente.query.filter_by(id=dados['cliente_id'], coach_id=current_user.id).first()
+        if cliente is None:
+            return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+        gasto_adaptativo = estimativa_gasto(_carregar_gasto_adaptativo(cliente.id), datetime.utcnow().date())
+        referencias, exames_recentes = _exames_recentes(cliente)
+        dados.setdefault('exames_recentes', exames_recentes)
+    
     nutricao_module = NutricaoEstrategicaModule()
-    return nutricao_module.gerar_plano_alimentar(request.get_json())
+    return nutricao_module.gerar_plano_alimentar(dados, gasto_adaptativo=gasto_adaptativo, referencias=referencias,
+                                                 receitas=receitas)
+
+@app.route('/api/nutricao/recalcular', methods=['POST'])
+@login_required
+def api_nutricao_recalcular():
+    """
+    Recálculo incremental de planos gerados: {plano_nutricional, alteracoes: {peso: 79.4},
+    cliente_id (opcional), forcar (opcional)} ou {planos: [...]} para o roster (ex.: pesagem semanal).
+    Só as seções que dependem dos campos alterados são refeitas.
+    """
+    try:
+        dados = request.get_json()
+        nutricao_module = NutricaoEstrategicaModule()
+        receitas = _receitas_coach(current_user.id) if current_user.is_coach else None
+        
+        resultados = []
+        for pedido in dados.get('planos', [dados]):
+            try:
+                alteracoes = dict(pedido.get('alteracoes') or {})
+                gasto_adaptativo = None
+                referencias = None
+                if current_user.is_coach and pedido.get('cliente_id'):
+                    cliente = Cliente.query.filter_by(id=pedido['cliente_id'], coach_id=current_user.id).first()
+                    if cliente is None:
+                        raise ValueError('Cliente não encontrado')
+                    gasto_adaptativo = estimativa_gasto(_carregar_gasto_adaptativo(cliente.id), datetime.utcnow().date())
+                    referencias, exames_recentes = _exames_recentes(cliente)
+                    alteracoes.setdefault('exames_recentes', exames_recentes)
+                
+                plano, recalculo = nutricao_module.recalcular_plano(
+                    pedido['plano_nutricional'], alteracoes, pedido.get('dados'), gasto_adaptativo=gasto_adaptativo,
+                    referencias=referencias, receitas=receitas, forcar=pedido.get('forcar', ())
+                )
+                resultados.append({'success': True, 'cliente_id': pedido.get('cliente_id'),
+                                   'plano_nutricional': plano, 'recalculo': recalculo})
+            except Exception as e:
+                resultados.append({'success': False, 'cliente_id': pedido.get('cliente_id'),
+                                   'message': f'Erro no recálculo do plano: {str(e)}'})
+        
+        if 'planos' not in dados:
+            return jsonify(dict(resultados[0], timestamp=datetime.now().isoformat()))
+        return jsonify({
+            'success': True,
+            'total': len(resultados),
+            'sem_alteracao': sum(1 for resultado in resultados if resultado.get('recalculo', {}).get('sem_alteracao')),
+            'refeicoes_mantidas': sum(1 for resultado in resultados if resultado['success']
+                                      and 'plano_refeicoes' not in resultado['recalculo']['secoes_recalculadas']),
+            'resultados': resultados,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro no recálculo do plano: {str(e)}'})
+
+@app.route('/api/nutricao/rotacao', methods=['POST'])
+@login_required
+def api_rotacao():
+    """
+    Cardápio rotativo de 7 a 28 dias: dados do plano + {dias, repeticao_maxima, semente,
+    data_inicio, cliente_id (opcional: usa o gasto adaptativo e grava o plano)}
+    """
+    try:
+        dados = request.get_json()
+        dias = int(dados.get('dias', 7))
+        repeticao_maxima = int(dados.get('repeticao_maxima', 3))
+        semente = int(dados.get('semente', 0))
+        inicio = datetime.strptime(dados['data_inicio'], '%Y-%m-%d').date() if dados.get('data_inicio') \
+            else datetime.utcnow().date()
+        
+        cliente = None
+        gasto_adaptativo = None
+        if current_user.is_coach and dados.get('cliente_id'):
+            cliente = Cliente.query.filter_by(id=dados['cliente_id'], coach_id=current_user.id).first()
+            if cliente is None:
+                return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+            gasto_adaptativo = estimativa_gasto(_carregar_gasto_adaptativo(cliente.id), datetime.utcnow().date())
+        
+        rotacao = NutricaoEstrategicaModule().calcular_rotacao(
+            dados, dias, repeticao_maxima, semente, inicio, gasto_adaptativo=gasto_adaptativo,
+            receitas=_receitas_coach(current_user.id) if current_user.is_coach else None
+        )
+        
+        plano_id = None
+        if cliente is not None:
+            alimentos, itens = codificar_itens_plano(rotacao['dias'])
+            plano = PlanoNutricional(
+                cliente_id=cliente.id, coach_id=current_user.id, data_inicio=inicio, dias=dias, semente=semente,
+                parametros=json.dumps(dados, ensure_ascii=False), plano=json.dumps(rotacao, ensure_ascii=False),
+                alimentos=json.dumps(alimentos), itens=itens
+            )
+            db.session.add(plano)
+            db.session.commit()
+            plano_id = plano.id
+        
+        return jsonify({'success': True, 'plano_id': plano_id, 'rotacao': rotacao})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro na rotação de cardápios: {str(e)}'})
+
+@app.route('/api/nutricao/micronutrientes', methods=['POST'])
+@login_required
+def api_micronutrientes():
+    """
+    Cobertura de micronutrientes de um plano editado:
+    {itens: [{alimento ou id, gramas}], sexo, idade, cliente_id (opcional, cruza com os exames)}
+    """
+    try:
+        dados = request.get_json()
+        itens = dados.get('itens', [])
+        if not itens:
+            return jsonify({'success': False, 'message': 'Informe os itens do plano'})
+        
+        nomes = [item.get('id') or item.get('alimento') or '' for item in itens]
+        posicoes, nao_encontrados = obter_indice_busca().resolver_lista(nomes)
+        if nao_encontrados:
+            return jsonify({'success': False, 'message': 'Alimentos não encontrados',
+                            'nao_encontrados': nao_encontrados})
+        
+        sexo, idade = dados.get('sexo'), dados.get('idade')
+        referencias, exames = None, dados.get('exames')
+        if current_user.is_coach and dados.get('cliente_id'):
+            cliente = Cliente.query.filter_by(id=dados['cliente_id'], coach_id=current_user.id).first()
+            if cliente is None:
+                return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+            sexo = sexo or cliente.sexo
+            idade = idade if idade is not None else _idade_na_coleta(cliente, datetime.utcnow().date())
+            referencias, exames_recentes = _exames_recentes(cliente)
+            exames = exames or exames_recentes
+        
+        cobertura = obter_cobertura().avaliar(
+            [posicoes[nome] for nome in nomes], [float(item.get('gramas', 0)) for item in itens],
+            sexo or 'masculino', idade, exames=exames, referencias=referencias or obter_tabelas_referencia()
+        )
+        return jsonify({'success': True, 'micronutrientes': cobertura})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro na cobertura de micronutrientes: {str(e)}'})
+
+@app.route('/api/nutricao/registro-diario', methods=['POST'])
+@login_required
+def api_registro_diario():
+    """
+    Pesagem e/ou calorias de um ou mais dias: {cliente_id, data, peso, calorias}
+    ou {cliente_id, registros: [{data, peso, calorias}, ...]}
+    """
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem registrar o acompanhamento'})
+    
+    try:
+        dados = request.get_json()
+        cliente = Cliente.query.filter_by(id=dados.get('cliente_id'), coach_id=current_user.id).first()
+        if cliente is None:
+            return jsonify({'success': False, 'message': 'Cliente não encontrado'})
+        
+        registros = sorted(
+            ({'data': datetime.strptime(registro['data'], '%Y-%m-%d').date() if registro.get('data')
+              else datetime.utcnow().date(),
+              'peso': registro.get('peso'), 'calorias': registro.get('calorias')}
+             for registro in dados.get('registros', [dados])),
+            key=lambda registro: registro['data']
+        )
+        estado = _carregar_gasto_adaptativo(cliente.id)
+        ultimo_processado = estado['ultimo_registro'] if estado else db.session.query(
+            db.func.max(RegistroDiario.data)).filter(RegistroDiario.cliente_id == cliente.id).scalar()
+        existentes = {registro.data: registro for registro in RegistroDiario.query.filter(
+            RegistroDiario.cliente_id == cliente.id,
+            RegistroDiario.data.in_([registro['data'] for registro in registros])
+        )}
+        
+        # Dias novos em ordem entram no estado em O(1); correções de dias passados refazem o histórico
+        recalcular = False
+        for registro in registros:
+            linha = existentes.get(registro['data'])
+            if linha is None:
+                linha = RegistroDiario(cliente_id=cliente.id, data=registro['data'])
+                db.session.add(linha)
+                existentes[registro['data']] = linha
+            if registro['peso'] is not None:
+                linha.peso = float(registro['peso'])
+            if registro['calorias'] is not None:
+                linha.calorias = float(registro['calorias'])
+            
+            if recalcular or (ultimo_processado is not None and registro['data'] <= ultimo_processado):
+                recalcular = True
+                continue
+            gasto_inicial = _gasto_pelas_equacoes(cliente, registro['data']) if estado is None else None
+            estado = atualizar_gasto(estado, registro['data'], linha.peso, linha.calorias, gasto_inicial)
+            ultimo_processado = registro['data']
+        
+        if recalcular:
+            db.session.flush()
+            estado = _recalcular_gasto_adaptativo(cliente)
+        _gravar_gasto_adaptativo(cliente.id, estado)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'registros': len(registros),
+            'recalculado': recalcular,
+            'gasto_adaptativo': estimativa_gasto(estado, datetime.utcnow().date())
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro no registro diário: {str(e)}'})
+
+@app.route('/api/nutricao/roster/energia', methods=['GET'])
+@login_required
+def api_energia_roster():
+    """Gasto energético e metas de todo o roster em um único cálculo vetorizado (ex.: após a pesagem semanal)"""
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem calcular o roster'})
+    
+    try:
+        hoje = datetime.utcnow().date()
+        nivel_padrao = request.args.get('nivel_atividade', 'moderadamente_ativo')
+        clientes = Cliente.query.filter_by(coach_id=current_user.id).order_by(Cliente.id).all()
+        completos = [cliente for cliente in clientes
+                     if cliente.peso and cliente.altura and cliente.data_nascimento
+                     and (cliente.sexo or '').lower() in ('masculino', 'feminino')]
+        incompletos = [{'cliente_id': cliente.id, 'cliente_nome': cliente.nome}
+                       for cliente in clientes if cliente not in completos]
+        if not completos:
+            return jsonify({'success': True, 'total': 0, 'resultados': [], 'incompletos': incompletos})
+        
+        niveis = [_nivel_atividade(cliente, nivel_padrao) for cliente in completos]
+        
+        calculo = calcular_gasto_energetico(
+            [cliente.peso for cliente in completos],
+            [cliente.altura for cliente in completos],
+            [_idade_na_coleta(cliente, hoje) for cliente in completos],
+            [cliente.sexo for cliente in completos],
+            [cliente.percentual_gordura for cliente in completos],
+            niveis,
+            [cliente.objetivo_primario for cliente in completos]
+        )
+        colunas = {
+            campo: [None if valor != valor else round(valor, 3 if campo == 'fator_atividade' else 1)
+                    for valor in valores.tolist()]
+            for campo, valores in calculo.items()
+        }
+        resultados = [
+            dict({'cliente_id': cliente.id, 'cliente_nome': cliente.nome, 'nivel_atividade': nivel},
+                 **{campo: valores[posicao] for campo, valores in colunas.items()})
+            for posicao, (cliente, nivel) in enumerate(zip(completos, niveis))
+        ]
+        return jsonify({'success': True, 'total': len(resultados), 'resultados': resultados, 'incompletos': incompletos})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro no cálculo energético do roster: {str(e)}'})
+
+@app.route('/api/nutricao/receitas', methods=['GET'])
+@login_required
+def api_receitas():
+    """Receitas padrão e do coach com macros por porção (?refeicao=almoco&restricoes=lactose,gluten)"""
+    try:
+        padrao = obter_livro_receitas()
+        livro = padrao.com_receitas(_receitas_coach(current_user.id)) if current_user.is_coach else padrao
+        indices = livro.filtrar(request.args.get('refeicao'),
+                                componentes_excluidos(request.args.get('restricoes', '')))
+        receitas = [
+            dict(livro.item(indice), refeicoes=livro.receitas[indice].get('refeicoes', []),
+                 origem='coach' if indice >= len(padrao) else 'padrao')
+            for indice in indices.tolist()
+        ]
+        return jsonify({'success': True, 'total': len(receitas), 'receitas': receitas})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro ao listar receitas: {str(e)}'})
+
+@app.route('/api/nutricao/receitas', methods=['POST'])
+@login_required
+def api_receitas_salvar():
+    """
+    Cria ou atualiza (com id) uma receita do coach: {nome, porcoes, refeicoes,
+    ingredientes: [{alimento, gramas}]}; nomes aproximados são resolvidos pela busca
+    (ambíguos voltam com sugestões) e a resposta traz o alimento escolhido para cada um
+    """
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem cadastrar receitas'})
+    
+    try:
+        dados = request.get_json()
+        ingredientes = dados.get('ingredientes', [])
+        if not dados.get('nome') or not ingredientes:
+            return jsonify({'success': False, 'message': 'Informe o nome e os ingredientes da receita'})
+        if float(dados.get('porcoes', 1)) <= 0 or any(float(item.get('gramas', 0)) <= 0 for item in ingredientes):
+            return jsonify({'success': False, 'message': 'Rendimento e gramas dos ingredientes devem ser positivos'})
+        
+        posicoes, nao_encontrados = resolver_ingredientes(ingredientes)
+        if nao_encontrados:
+            return jsonify({'success': False, 'message': 'Ingredientes não encontrados',
+                            'nao_encontrados': nao_encontrados})
+        
+        base = obter_livro_receitas().base
+        receita_dados = {
+            'porcoes': float(dados.get('porcoes', 1)),
+            'ingredientes': [{'alimento': base.ids[posicoes[item['alimento']]], 'gramas': float(item['gramas'])}
+                             for item in ingredientes]
+        }
+        refeicoes = dados.get('refeicoes', [])
+        mascara_bits(refeicoes, REFEICOES_ALIMENTOS)  # valida os tipos de refeição
+        
+        if dados.get('id'):
+            receita = Receita.query.filter_by(id=dados['id'], coach_id=current_user.id).first()
+            if receita is None:
+                return jsonify({'success': False, 'message': 'Receita não encontrada'})
+        else:
+            receita = Receita(coach_id=current_user.id)
+            db.session.add(receita)
+        receita.nome = dados['nome']
+        receita.porcoes = receita_dados['porcoes']
+        receita.refeicoes = '|'.join(refeicoes)
+        receita.ingredientes = json.dumps(receita_dados['ingredientes'], ensure_ascii=False)
+        receita.versao = versao_receita(receita_dados)
+        db.session.commit()
+        
+        livro = obter_livro_receitas().com_receitas(_receitas_coach(current_user.id))
+        return jsonify({
+            'success': True,
+            'receita': livro.item(livro.posicao[f'receita_{receita.id}']),
+            # Nome enviado -> alimento da base em que foi resolvido, para conferência do coach
+            'ingredientes_resolvidos': [
+                {'informado': item['alimento'], 'id': base.ids[posicoes[item['alimento']]],
+                 'alimento': base.nomes[posicoes[item['alimento']]],
+                 'exato': base.posicao(item['alimento']) is not None}
+                for item in ingredientes
+            ]
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro ao salvar receita: {str(e)}'})
+
+@app.route('/api/nutricao/receitas/<int:receita_id>', methods=['DELETE'])
+@login_required
+def api_receitas_remover(receita_id):
+    receita = Receita.query.filter_by(id=receita_id, coach_id=current_user.id).first()
+    if receita is None:
+        return jsonify({'success': False, 'message': 'Receita não encontrada'})
+    db.session.delete(receita)
+    db.session.commit()
+    return jsonify({'success': True})
+
+@app.route('/api/nutricao/receitas/escalar', methods=['POST'])
+@login_required
+def api_receitas_escalar():
+    """Porção da receita para as metas da refeição: {receita (id), metas: {calorias, proteina, carboidrato, gordura}}"""
+    try:
+        dados = request.get_json()
+        livro = obter_livro_receitas()
+        if current_user.is_coach:
+            livro = livro.com_receitas(_receitas_coach(current_user.id))
+        indice = livro.posicao.get(dados.get('receita'))
+        if indice is None:
+            return jsonify({'success': False, 'message': f"Receita não encontrada: {dados.get('receita')}"})
+        
+        metas = dados.get('metas') or {}
+        porcoes, _ = livro.escalar([indice], metas)
+        return jsonify({'success': True, 'receita': livro.item(indice, porcoes[0], metas)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro ao escalar receita: {str(e)}'})
+
+@app.route('/api/nutricao/roster/compras', methods=['POST'])
+@login_required
+def api_compras_roster():
+    """
+    Lista de compras consolidada dos planos gravados: {data_inicio, data_fim,
+    clientes (opcional, padrão: todo o roster)}
+    """
+    if not current_user.is_coach:
+        return jsonify({'success': False, 'message': 'Apenas coaches podem gerar a lista de compras'})
+    
+    try:
+        dados = request.get_json()
+        inicio = datetime.strptime(dados['data_inicio'], '%Y-%m-%d').date()
+        fim = datetime.strptime(dados['data_fim'], '%Y-%m-%d').date()
+        if fim < inicio or (fim - inicio).days >= 92:
+            return jsonify({'success': False, 'message': 'Período inválido (até 92 dias, fim após o início)'})
+        
+        consulta = Cliente.query.with_entities(Cliente.id).filter_by(coach_id=current_user.id)
+        if dados.get('clientes'):
+            consulta = consulta.filter(Cliente.id.in_(dados['clientes']))
+        clientes = [cliente_id for cliente_id, in consulta]
+        
+        # Só as colunas binárias: o JSON completo dos planos não é carregado
+        planos = (db.session.query(PlanoNutricional.cliente_id, PlanoNutricional.id, PlanoNutricional.data_inicio,
+                                   PlanoNutricional.alimentos, PlanoNutricional.itens)
+                  .filter(PlanoNutricional.coach_id == current_user.id,
+                          PlanoNutricional.cliente_id.in_(clientes),
+                          PlanoNutricional.itens.isnot(None),
+                          PlanoNutricional.data_inicio <= fim,
+                          PlanoNutricional.data_inicio > inicio - timedelta(days=DIAS_MAXIMOS_ROTACAO))
+                  .all())
+        compras = agregar_compras(
+            [(cliente_id, plano_id, data_inicio, json.loads(alimentos), itens)
+             for cliente_id, plano_id, data_inicio, alimentos, itens in planos],
+            inicio, fim, clientes
+        )
+        return jsonify(dict({'success': True}, **compras))
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro na lista de compras: {str(e)}'})
+
+@app.route('/api/nutricao/substituicoes', methods=['POST'])
+@login_required
+def api_substituicoes():
+    """
+    Substitutos equivalentes em macros: {alimento, gramas, quantidade, categorias,
+    alergias_restricoes, refeicao}
+    """
+    try:
+        dados = request.get_json()
+        indice = obter_indice_busca()
+        posicao = indice.resolver(dados.get('alimento') or '')
+        if posicao is None:
+            return jsonify({'success': False, 'message': f"Alimento não encontrado: {dados.get('alimento')}",
+                            'sugestoes': indice.sugestoes(dados.get('alimento') or '', 3)})
+        
+        gramas = float(dados.get('gramas', 100))
+        substitutos = obter_substituicao().substituir(
+            posicao, gramas,
+            quantidade=min(int(dados.get('quantidade', 5)), 20),
+            categorias=dados.get('categorias'),
+            restricoes=dados.get('alergias_restricoes', []),
+            refeicao=dados.get('refeicao')
+        )
+        base = indice.base
+        return jsonify({
+            'success': True,
+            'original': {'id': base.ids[posicao], 'alimento': base.nomes[posicao], 'gramas': gramas},
+            'substitutos': substitutos
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro na substituição de alimentos: {str(e)}'})
+
+@app.route('/api/nutricao/alimentos/busca', methods=['GET'])
+@login_required
+def api_busca_alimentos():
+    """Autocompletar de alimentos: ?q=bata doce&limite=10&categoria=proteinas"""
+    try:
+        limite = min(int(request.args.get('limite', 10)), 50)
+        categorias = request.args.getlist('categoria') or None
+        resultados = obter_indice_busca().sugestoes(request.args.get('q', ''), limite, categorias)
+        return jsonify({'success': True, 'total': len(resultados), 'resultados': resultados})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro na busca de alimentos: {str(e)}'})
 
 @app.route('/api/suplementos', methods=['POST'])
 @login_required
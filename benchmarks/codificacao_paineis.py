@@ -0,0 +1,58 @@
+"""
+Benchmark: tamanho e tempo de carga de painéis armazenados em JSON x formato binário
+
+Uso: python benchmarks/codificacao_paineis.py [numero_paineis] [marcadores_por_painel]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.hematologia_codificacao import (
+    codificar_painel, decodificar_lote, decodificar_painel, obter_registro_marcadores
+)
+
+
+def gerar_paineis(quantidade, marcadores_por_painel, semente=42):
+    aleatorio = random.Random(semente)
+    marcadores = obter_registro_marcadores().marcadores
+    for _ in range(quantidade):
+        escolhidos = aleatorio.sample(marcadores, marcadores_por_painel)
+        yield {marcador: round(aleatorio.uniform(0.5, 900), 2) for marcador in escolhidos}
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    marcadores_por_painel = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    textos, blobs = [], []
+    for painel in gerar_paineis(quantidade, marcadores_por_painel):
+        textos.append(json.dumps(painel))
+        blobs.append(codificar_painel(painel, 'masculino')[0])
+
+    tamanho_json = sum(len(texto.encode('utf-8')) for texto in textos)
+    tamanho_binario = sum(len(blob) for blob in blobs)
+
+    _, tempo_json = cronometrar(lambda: [json.loads(texto) for texto in textos])
+    _, tempo_binario_dict = cronometrar(lambda: [decodificar_painel(blob) for blob in blobs])
+    _, tempo_binario_lote = cronometrar(lambda: decodificar_lote(blobs))
+
+    print(f'Painéis: {quantidade:,} x {marcadores_por_painel} marcadores')
+    print(f'JSON:    {tamanho_json / 1e6:8.1f} MB   carga {tempo_json:6.2f} s')
+    print(f'Binário: {tamanho_binario / 1e6:8.1f} MB   carga {tempo_binario_dict:6.2f} s (dicts)'
+          f'   {tempo_binario_lote:6.2f} s (lote colunar)')
+    print(f'Redução de tamanho: {tamanho_json / tamanho_binario:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
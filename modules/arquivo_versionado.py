@@ -0,0 +1,76 @@
+"""
+ARQUIVOS DE DADOS VERSIONADOS
+Tabelas carregadas de arquivos JSON, compiladas e recarregadas a quente quando o arquivo muda
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre verificações do arquivo (segundos)
+INTERVALO_VERIFICACAO = 1.0
+
+
+class ArquivoVersionado:
+    """
+    Mantém a versão compilada de um arquivo JSON e a recarrega quando
+    mtime/tamanho/inode mudam. A verificação custa um time.monotonic() por
+    acesso e no máximo um os.stat() por intervalo; a troca do objeto compilado
+    é uma única atribuição, então cada requisição vê uma versão inteira.
+    Cada worker verifica o arquivo por conta própria. Para publicar uma nova
+    versão, grave em arquivo temporário e use os.replace (ver publicar()).
+    """
+
+    def __init__(self, caminho, compilar, intervalo=INTERVALO_VERIFICACAO):
+        self.caminho = caminho
+        self.compilar = compilar
+        self.intervalo = intervalo
+        self._atual = None
+        self._assinatura = None
+        self._proxima_verificacao = 0.0
+        self._lock = threading.Lock()
+
+    def _assinatura_arquivo(self):
+        estado = os.stat(self.caminho)
+        return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+    def _recarregar(self, assinatura):
+        with open(self.caminho, encoding='utf-8') as arquivo:
+            conteudo = json.load(arquivo)
+        self._atual = self.compilar(conteudo)
+        self._assinatura = assinatura
+
+    def obter(self):
+        """Versão compilada vigente, recarregando se o arquivo mudou"""
+        agora = time.monotonic()
+        if self._atual is not None and agora < self._proxima_verificacao:
+            return self._atual
+
+        with self._lock:
+            if self._atual is not None and agora < self._proxima_verificacao:
+                return self._atual
+            self._proxima_verificacao = agora + self.intervalo
+
+            try:
+                assinatura = self._assinatura_arquivo()
+                if assinatura != self._assinatura:
+                    self._recarregar(assinatura)
+            except (OSError, ValueError, KeyError) as erro:
+                # Sem versão anterior não há como seguir; com ela, mantém a última válida
+                if self._atual is None:
+                    raise
+                logger.warning('Falha ao recarregar %s, mantendo versão anterior: %s', self.caminho, erro)
+
+        return self._atual
+
+    def publicar(self, conteudo):
+        """Grava uma nova versão do arquivo de forma atômica"""
+        temporario = f'{self.caminho}.{os.getpid()}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(conteudo, arquivo, ensure_ascii=False, indent=4)
+        os.replace(temporario, self.caminho)
+        self._proxima_verificacao = 0.0
@@ -8,85 +8,36 @@ import json
 import re
 from datetime import datetime
 import pandas as pd
+from modules.hematologia_regras import obter_motor_regras
+from modules.hematologia_derivados import PainelLaboratorial
+from modules.hematologia_referencias import converter_idade, obter_tabelas_referencia
+from modules.hematologia_linha_base import avaliar_desvios
+from modules.hematologia_comparacao import comparar_paineis
 
 class AvaliacaoHematologicaModule:
-    def __init__(self):
-        self.valores_referencia = {
-            'masculino': {
-                'testosterona_total': {'min': 300, 'max': 1000, 'unidade': 'ng/dL', 'ideal_min': 500, 'ideal_max': 800},
-                'testosterona_livre': {'min': 8.7, 'max': 25.1, 'unidade': 'pg/mL', 'ideal_min': 15, 'ideal_max': 22},
-                'lh': {'min': 1.7, 'max': 8.6, 'unidade': 'mIU/mL', 'ideal_min': 3, 'ideal_max': 7},
-                'fsh': {'min': 1.5, 'max': 12.4, 'unidade': 'mIU/mL', 'ideal_min': 2, 'ideal_max': 8},
-                'estradiol': {'min': 7.6, 'max': 42.6, 'unidade': 'pg/mL', 'ideal_min': 15, 'ideal_max': 30},
-                'prolactina': {'min': 4.0, 'max': 15.2, 'unidade': 'ng/mL', 'ideal_min': 5, 'ideal_max': 12},
-                'shbg': {'min': 18, 'max': 54, 'unidade': 'nmol/L', 'ideal_min': 25, 'ideal_max': 45}
-            },
-            'feminino': {
-                'testosterona_total': {'min': 15, 'max': 70, 'unidade': 'ng/dL', 'ideal_min': 25, 'ideal_max': 50},
-                'testosterona_livre': {'min': 0.3, 'max': 3.2, 'unidade': 'pg/mL', 'ideal_min': 1, 'ideal_max': 2.5},
-                'lh': {'min': 2.4, 'max': 12.6, 'unidade': 'mIU/mL', 'ideal_min': 4, 'ideal_max': 10},
-                'fsh': {'min': 3.5, 'max': 12.5, 'unidade': 'mIU/mL', 'ideal_min': 4, 'ideal_max': 10},
-                'estradiol': {'min': 12.5, 'max': 166, 'unidade': 'pg/mL', 'ideal_min': 50, 'ideal_max': 120},
-                'prolactina': {'min': 4.8, 'max': 23.3, 'unidade': 'ng/mL', 'ideal_min': 6, 'ideal_max': 18},
-                'shbg': {'min': 26, 'max': 110, 'unidade': 'nmol/L', 'ideal_min': 35, 'ideal_max': 85}
-            },
-            'geral': {
-                'tsh': {'min': 0.27, 'max': 4.2, 'unidade': 'uUI/mL', 'ideal_min': 1, 'ideal_max': 2.5},
-                't3_livre': {'min': 2.0, 'max': 4.4, 'unidade': 'pg/mL', 'ideal_min': 2.5, 'ideal_max': 4.0},
-                't4_livre': {'min': 0.93, 'max': 1.7, 'unidade': 'ng/dL', 'ideal_min': 1.1, 'ideal_max': 1.5},
-                't3_reverso': {'min': 10, 'max': 24, 'unidade': 'ng/dL', 'ideal_min': 12, 'ideal_max': 20},
-                'ast': {'min': 0, 'max': 40, 'unidade': 'U/L', 'ideal_min': 15, 'ideal_max': 30},
-                'alt': {'min': 0, 'max': 41, 'unidade': 'U/L', 'ideal_min': 15, 'ideal_max': 35},
-                'ggt': {'min': 0, 'max': 60, 'unidade': 'U/L', 'ideal_min': 10, 'ideal_max': 40},
-                'creatinina': {'min': 0.7, 'max': 1.3, 'unidade': 'mg/dL', 'ideal_min': 0.8, 'ideal_max': 1.1},
-                'ureia': {'min': 10, 'max': 50, 'unidade': 'mg/dL', 'ideal_min': 15, 'ideal_max': 40},
-                'tfg': {'min': 90, 'max': 120, 'unidade': 'mL/min/1.73m²', 'ideal_min': 100, 'ideal_max': 120},
-                'pcr': {'min': 0, 'max': 3.0, 'unidade': 'mg/L', 'ideal_min': 0, 'ideal_max': 1.0},
-                'ferritina_m': {'min': 30, 'max': 400, 'unidade': 'ng/mL', 'ideal_min': 50, 'ideal_max': 200},
-                'ferritina_f': {'min': 15, 'max': 150, 'unidade': 'ng/mL', 'ideal_min': 25, 'ideal_max': 100},
-                'glicemia': {'min': 70, 'max': 99, 'unidade': 'mg/dL', 'ideal_min': 80, 'ideal_max': 95},
-                'insulina': {'min': 2.6, 'max': 24.9, 'unidade': 'uUI/mL', 'ideal_min': 4, 'ideal_max': 12},
-                'homa_ir': {'min': 0, 'max': 2.5, 'unidade': '', 'ideal_min': 0.5, 'ideal_max': 1.5},
-                'hb_glicada': {'min': 4.0, 'max': 5.6, 'unidade': '%', 'ideal_min': 4.5, 'ideal_max': 5.2},
-                'hdl_m': {'min': 40, 'max': 60, 'unidade': 'mg/dL', 'ideal_min': 50, 'ideal_max': 70},
-                'hdl_f': {'min': 50, 'max': 70, 'unidade': 'mg/dL', 'ideal_min': 60, 'ideal_max': 80},
-                'ldl': {'min': 0, 'max': 100, 'unidade': 'mg/dL', 'ideal_min': 60, 'ideal_max': 90},
-                'triglicerides': {'min': 0, 'max': 150, 'unidade': 'mg/dL', 'ideal_min': 50, 'ideal_max': 100},
-                'colesterol_total': {'min': 0, 'max': 200, 'unidade': 'mg/dL', 'ideal_min': 160, 'ideal_max': 190},
-                'vitamina_d': {'min': 30, 'max': 100, 'unidade': 'ng/mL', 'ideal_min': 40, 'ideal_max': 80},
-                'zinco': {'min': 70, 'max': 120, 'unidade': 'ug/dL', 'ideal_min': 80, 'ideal_max': 110},
-                'magnesio': {'min': 1.7, 'max': 2.2, 'unidade': 'mg/dL', 'ideal_min': 1.8, 'ideal_max': 2.1},
-                'b12': {'min': 211, 'max': 946, 'unidade': 'pg/mL', 'ideal_min': 400, 'ideal_max': 700},
-                'acido_folico': {'min': 2.7, 'max': 17.0, 'unidade': 'ng/mL', 'ideal_min': 5, 'ideal_max': 15}
-            }
-        }
+    def __init__(self, referencias=None):
+        # Tabelas de referência versionadas (modules/dados/referencias_hematologicas.json),
+        # recarregadas a quente; a instância usa uma única versão do início ao fim
+        self.tabelas_referencia = obter_tabelas_referencia()
+        # Referências em camadas do coach/laboratório (ReferenciasEmCamadas), se houver
+        self.referencias = referencias or self.tabelas_referencia
+        self.versao_referencias = self.tabelas_referencia.versao
+        self.valores_referencia = self.tabelas_referencia.valores_referencia
+        self.interpretacoes_clinicas = self.tabelas_referencia.interpretacoes_clinicas
         
-        self.interpretacoes_clinicas = {
-            'testosterona_baixa': {
-                'sintomas': ['Fadiga', 'Diminuição da libido', 'Perda de massa muscular', 'Dificuldade de concentração'],
-                'causas': ['Hipogonadismo', 'Stress crônico', 'Sobrepeso/obesidade', 'Idade avançada'],
-                'recomendacoes': ['Avaliação endocrinológica', 'Otimização do sono', 'Redução do stress', 'Exercícios de força']
-            },
-            'tsh_elevado': {
-                'sintomas': ['Fadiga', 'Ganho de peso', 'Intolerância ao frio', 'Constipação'],
-                'causas': ['Hipotireoidismo subclínico/clínico', 'Tireoidite de Hashimoto', 'Deficiência de iodo'],
-                'recomendacoes': ['Avaliação endocrinológica', 'Dosagem de anti-TPO', 'Suplementação de selênio']
-            },
-            'ferritina_baixa': {
-                'sintomas': ['Fadiga', 'Diminuição da performance', 'Unhas quebradiças', 'Queda de cabelo'],
-                'causas': ['Deficiência de ferro', 'Sangramento oculto', 'Dieta inadequada'],
-                'recomendacoes': ['Suplementação de ferro', 'Investigação de sangramento', 'Otimização dietética']
-            }
-        }
+        # Correlações e padrões patológicos declarados em modules/dados/regras_clinicas.json
+        self.motor_regras = obter_motor_regras()
     
-    def analisar_exames(self, dados):
+    def analisar_exames(self, dados, coorte=None, linha_base=None):
         """
-        Analisa exames laboratoriais e gera relatório interpretativo
+        Analisa exames laboratoriais e gera relatório interpretativo.
+        Com uma coorte (roster do coach), inclui percentil e z-score de cada marcador;
+        com a linha de base do atleta (marcador -> (n, media, variancia)), sinaliza desvios individuais.
         """
         try:
             exames = dados.get('exames', {})
             sexo = dados.get('sexo', 'masculino').lower()
-            idade = dados.get('idade', 30)
+            idade = converter_idade(dados.get('idade', 30))
             
             if not exames:
                 return jsonify({
@@ -94,14 +45,28 @@ class AvaliacaoHematologicaModule:
                     'message': 'Nenhum exame fornecido para análise'
                 })
             
+            # Fase 1: limites críticos, antes de qualquer análise mais pesada
+            alertas_criticos = self.referencias.criticos.verificar(exames, sexo)
+            
+            # Painel com marcadores derivados (HOMA-IR, T:C, LDL...) calculados uma única vez
+            painel = PainelLaboratorial(exames)
+            
             # Análise individual dos marcadores
-            analise_marcadores = self._analisar_marcadores_individuais(exames, sexo)
+            analise_marcadores = self._analisar_marcadores_individuais(painel, sexo, idade)
+            
+            # Posição do atleta em relação ao próprio roster
+            if coorte is not None:
+                self._incluir_posicao_coorte(analise_marcadores, painel, sexo, coorte, dados.get('cliente_id'))
             
-            # Análise correlacional
-            analise_correlacional = self._analisar_correlacoes(exames, sexo)
+            # Desvios em relação ao histórico do próprio atleta
+            alteracoes_individuais = []
+            if linha_base:
+                alteracoes_individuais = self._incluir_desvios_linha_base(analise_marcadores, painel, linha_base)
             
-            # Identificação de padrões patológicos
-            padroes_patologicos = self._identificar_padroes_patologicos(exames, sexo)
+            # Correlações e padrões patológicos (motor de regras declarativo)
+            achados_clinicos = self.motor_regras.avaliar(painel, sexo)
+            analise_correlacional = achados_clinicos['correlacao']
+            padroes_patologicos = achados_clinicos['padrao']
             
             # Recomendações específicas
             recomendacoes = self._gerar_recomendacoes_especificas(exames, sexo, analise_marcadores)
@@ -114,17 +79,21 @@ class AvaliacaoHematologicaModule:
             
             resultado = {
                 'success': True,
+                'alertas_criticos': alertas_criticos,
                 'analise_completa': {
                     'resumo_executivo': self._gerar_resumo_executivo(analise_marcadores, padroes_patologicos),
                     'marcadores_individuais': analise_marcadores,
                     'analise_correlacional': analise_correlacional,
                     'padroes_identificados': padroes_patologicos,
+                    'alteracoes_individuais': alteracoes_individuais,
                     'nivel_risco': self._calcular_nivel_risco(analise_marcadores),
                     'recomendacoes_especificas': recomendacoes,
                     'protocolo_correcao': protocolo_correcao,
                     'encaminhamentos_medicos': encaminhamentos,
                     'proxima_reavaliacao': self._sugerir_reavaliacao(analise_marcadores)
                 },
+                'versao_referencias': self.versao_referencias,
+                'versao_regras': self.motor_regras.versao,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -136,30 +105,102 @@ class AvaliacaoHematologicaModule:
                 'message': f'Erro na análise hematológica: {str(e)}'
             })
     
-    def _analisar_marcadores_individuais(self, exames, sexo):
-        """Analisa cada marcador individualmente"""
+    def analisar_lote(self, paineis):
+        """
+        Resumo da análise de vários painéis (ex.: após importação em lote):
+        alertas críticos, nível de risco, marcadores fora da referência e padrões.
+        paineis: lista de dicts com cliente_id, exames, sexo, idade e data_coleta
+        """
+        resumos = []
+        for dados in paineis:
+            sexo = (dados.get('sexo') or 'masculino').lower()
+            painel = PainelLaboratorial(dados['exames'])
+            analise_marcadores = self._analisar_marcadores_individuais(painel, sexo, converter_idade(dados.get('idade')))
+            padroes = self.motor_regras.avaliar(painel, sexo)['padrao']
+            resumos.append({
+                'cliente_id': dados.get('cliente_id'),
+                'data_coleta': dados.get('data_coleta'),
+                'alertas_criticos': self.referencias.criticos.verificar(dados['exames'], sexo),
+                'nivel_risco': self._calcular_nivel_risco(analise_marcadores),
+                'alteracoes_significativas': [
+                    marcador for marcador, analise in analise_marcadores.items()
+                    if analise['status'] in ['BAIXO', 'ELEVADO']
+                ],
+                'padroes_identificados': [padrao['padrao'] for padrao in padroes]
+            })
+        return resumos
+    
+    def verificar_valores_criticos(self, dados):
+        """
+        Checagem rápida de valores críticos, sem o relatório completo,
+        para que alertas urgentes cheguem ao coach imediatamente
+        """
+        try:
+            exames = dados.get('exames', {})
+            sexo = dados.get('sexo', 'masculino').lower()
+            
+            alertas = self.referencias.criticos.verificar(exames, sexo)
+            
+            return jsonify({
+                'success': True,
+                'alertas_criticos': alertas,
+                'necessita_contato_imediato': bool(alertas),
+                'versao_referencias': self.versao_referencias,
+                'timestamp': datetime.now().isoformat()
+            })
+            
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'Erro na verificação de valores críticos: {str(e)}'
+            })
+    
+    def comparar_exames(self, dados):
+        """
+        Compara dois ou mais painéis do mesmo cliente (antes/depois),
+        alinhando marcadores e calculando deltas e transições de status
+        """
+        try:
+            paineis = dados.get('paineis', [])
+            sexo = dados.get('sexo', 'masculino').lower()
+            idade = converter_idade(dados.get('idade', 30))
+            
+            if len(paineis) < 2:
+                return jsonify({
+                    'success': False,
+                    'message': 'Informe ao menos dois painéis para comparação'
+                })
+            
+            # Ordem cronológica; painéis sem data vão para o fim, na ordem enviada (sort estável)
+            paineis = sorted(paineis, key=lambda painel: (not painel.get('data_coleta'), painel.get('data_coleta') or ''))
+            
+            comparacao = comparar_paineis(
+                [painel.get('exames', {}) for painel in paineis], sexo, idade, self.referencias
+            )
+            comparacao['paineis'] = [
+                {'id': painel.get('id'), 'data_coleta': painel.get('data_coleta')} for painel in paineis
+            ]
+            
+            return jsonify({
+                'success': True,
+                'comparacao': comparacao,
+                'versao_referencias': self.versao_referencias,
+                'timestamp': datetime.now().isoformat()
+            })
+            
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'Erro na comparação de exames: {str(e)}'
+            })
+    
+    def _analisar_marcadores_individuais(self, painel, sexo, idade=None):
+        """Analisa cada marcador individualmente (medidos e derivados)"""
         analise = {}
         
-        for marcador, valor in exames.items():
-            if not isinstance(valor, (int, float)):
-                continue
-                
-            marcador_lower = marcador.lower().replace(' ', '_').replace('-', '_')
-            
-            # Buscar referência específica por sexo ou geral
-            referencia = None
-            if sexo in self.valores_referencia and marcador_lower in self.valores_referencia[sexo]:
-                referencia = self.valores_referencia[sexo][marcador_lower]
-            elif marcador_lower in self.valores_referencia['geral']:
-                referencia = self.valores_referencia['geral'][marcador_lower]
-            elif sexo == 'feminino' and marcador_lower == 'ferritina':
-                referencia = self.valores_referencia['geral']['ferritina_f']
-            elif sexo == 'masculino' and marcador_lower == 'ferritina':
-                referencia = self.valores_referencia['geral']['ferritina_m']
-            elif sexo == 'feminino' and marcador_lower == 'hdl':
-                referencia = self.valores_referencia['geral']['hdl_f']
-            elif sexo == 'masculino' and marcador_lower == 'hdl':
-                referencia = self.valores_referencia['geral']['hdl_m']
+        for marcador_lower, valor in painel.items():
+            marcador = painel.nome_original(marcador_lower)
+            referencia = self._resolver_referencia(marcador_lower, sexo, idade)
             
             if referencia:
                 status = self._classificar_valor(valor, referencia)
@@ -172,9 +213,50 @@ class AvaliacaoHematologicaModule:
                     'interpretacao': self._interpretar_valor(marcador_lower, valor, referencia, status),
                     'nivel_prioridade': self._definir_prioridade_correcao(status)
                 }
+                if 'faixa_etaria' in referencia:
+                    analise[marcador]['faixa_etaria'] = referencia['faixa_etaria']
+                if 'origem' in referencia:
+                    analise[marcador]['origem_referencia'] = referencia['origem']
+                if painel.calculado(marcador_lower):
+                    analise[marcador]['valor'] = round(valor, 2)
+                    analise[marcador]['calculado'] = True
         
         return analise
     
+    def _incluir_posicao_coorte(self, analise, painel, sexo, coorte, cliente_id=None):
+        """Adiciona percentil e z-score da coorte (sem o próprio cliente) ao lado do status de cada marcador"""
+        posicoes = coorte.posicionar_painel(dict(painel.items()), sexo, cliente_id)
+        for marcador_lower, posicao in posicoes.items():
+            marcador = painel.nome_original(marcador_lower)
+            if marcador in analise:
+                analise[marcador]['coorte'] = posicao
+    
+    def _incluir_desvios_linha_base(self, analise, painel, linha_base):
+        """Adiciona a comparação com a linha de base individual e lista as mudanças significativas"""
+        alteracoes = []
+        for marcador_lower, desvio in avaliar_desvios(dict(painel.items()), linha_base).items():
+            marcador = painel.nome_original(marcador_lower)
+            if marcador not in analise:
+                continue
+            analise[marcador]['linha_base'] = desvio
+            if desvio['significativo']:
+                alteracoes.append({
+                    'marcador': marcador,
+                    'status': analise[marcador]['status'],
+                    'variacao_percentual': desvio['variacao_percentual'],
+                    'z_score_individual': desvio['z_score_individual'],
+                    'interpretacao': (
+                        'Mudança individual significativa dentro da faixa de referência'
+                        if analise[marcador]['status'] in ['IDEAL', 'SUBÓTIMO_BAIXO', 'SUBÓTIMO_ALTO']
+                        else 'Mudança individual significativa fora da faixa de referência'
+                    )
+                })
+        return alteracoes
+    
+    def _resolver_referencia(self, marcador, sexo, idade):
+        """Sobreposição do coach, do laboratório, faixa etária, sexo e por fim a geral"""
+        return self.referencias.resolver(marcador, sexo, idade)
+    
     def _classificar_valor(self, valor, referencia):
         """Classifica o valor do exame"""
         if valor < referencia['min']:
@@ -223,88 +305,6 @@ class AvaliacaoHematologicaModule:
         else:
             return f'{marcador.title()} dentro da faixa ideal'
     
-    def _analisar_correlacoes(self, exames, sexo):
-        """Analisa correlações entre marcadores"""
-        correlacoes = []
-        
-        # Eixo hipofisário-gonadal
-        if all(key in exames for key in ['testosterona_total', 'lh', 'fsh']):
-            if exames['testosterona_total'] < 300 and exames['lh'] < 2:
-                correlacoes.append({
-                    'tipo': 'Hipogonadismo Hipogonadotrópico',
-                    'marcadores': ['testosterona_total', 'lh', 'fsh'],
-                    'interpretacao': 'Disfunção do eixo hipotálamo-hipófise-gonadal',
-                    'severidade': 'ALTA'
-                })
-        
-        # Resistência à insulina
-        if all(key in exames for key in ['glicemia', 'insulina']):
-            homa_ir = (exames['glicemia'] * exames['insulina']) / 405
-            if homa_ir > 2.5:
-                correlacoes.append({
-                    'tipo': 'Resistência à Insulina',
-                    'marcadores': ['glicemia', 'insulina', 'homa_ir'],
-                    'interpretacao': 'Padrão compatível com resistência insulínica',
-                    'severidade': 'MÉDIA'
-                })
-        
-        # Função tireoidiana
-        if all(key in exames for key in ['tsh', 't3_livre', 't4_livre']):
-            if exames['tsh'] > 2.5 and exames['t4_livre'] < 1.1:
-                correlacoes.append({
-                    'tipo': 'Hipotireoidismo Subclínico',
-                    'marcadores': ['tsh', 't3_livre', 't4_livre'],
-                    'interpretacao': 'Função tireoidiana comprometida',
-                    'severidade': 'MÉDIA'
-                })
-        
-        # Perfil inflamatório
-        if all(key in exames for key in ['pcr', 'ferritina']):
-            if exames['pcr'] > 3.0 and exames['ferritina'] > 200:
-                correlacoes.append({
-                    'tipo': 'Processo Inflamatório',
-                    'marcadores': ['pcr', 'ferritina'],
-                    'interpretacao': 'Possível processo inflamatório sistêmico',
-                    'severidade': 'MÉDIA'
-                })
-        
-        return correlacoes
-    
-    def _identificar_padroes_patologicos(self, exames, sexo):
-        """Identifica padrões patológicos específicos"""
-        padroes = []
-        
-        # Síndrome metabólica
-        criterios_sm = 0
-        if 'triglicerides' in exames and exames['triglicerides'] >= 150:
-            criterios_sm += 1
-        if 'hdl' in exames:
-            if (sexo == 'masculino' and exames['hdl'] < 40) or (sexo == 'feminino' and exames['hdl'] < 50):
-                criterios_sm += 1
-        if 'glicemia' in exames and exames['glicemia'] >= 100:
-            criterios_sm += 1
-        
-        if criterios_sm >= 2:
-            padroes.append({
-                'padrao': 'Síndrome Metabólica',
-                'criterios_presentes': criterios_sm,
-                'risco': 'ALTO',
-                'recomendacao': 'Intervenção imediata no estilo de vida'
-            })
-        
-        # Overtraining syndrome
-        if 'testosterona_total' in exames and 'cortisol' in exames:
-            ratio_t_c = exames['testosterona_total'] / exames.get('cortisol', 1)
-            if ratio_t_c < 0.35:
-                padroes.append({
-                    'padrao': 'Possível Overtraining',
-                    'criterios_presentes': 'Ratio T:C baixo',
-                    'risco': 'MÉDIO',
-                    'recomendacao': 'Reduzir volume de treino e priorizar recuperação'
-                })
-        
-        return padroes
-    
     def _gerar_recomendacoes_especificas(self, exames, sexo, analise):
         """Gera recomendações específicas baseadas nos achados"""
         recomendacoes = {
@@ -0,0 +1,151 @@
+"""
+CODIFICAÇÃO BINÁRIA DE PAINÉIS
+Formato compacto para painéis armazenados: cabeçalho + registros esparsos
+(marcador:uint16, valor:float32, unidade:uint8) indexados por um registro de marcadores
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+ARQUIVO_REGISTRO = os.path.join(os.path.dirname(__file__), 'dados', 'registro_marcadores.json')
+
+MAGICO = b'HP'
+VERSAO_FORMATO = 1
+
+# Cabeçalho: mágico (2s), versão do formato (B), sexo (B), número de registros (H)
+CABECALHO = struct.Struct('<2sBBH')
+
+REGISTRO = np.dtype([('marcador', '<u2'), ('valor', '<f4'), ('unidade', 'u1')])
+
+# O mesmo cabeçalho como dtype estruturado, para ler os de vários painéis de uma vez
+CABECALHO_LOTE = np.dtype([('magico', 'S2'), ('versao', 'u1'), ('sexo', 'u1'), ('quantidade', '<u2')])
+
+SEXOS = {None: 0, 'masculino': 1, 'feminino': 2}
+SEXOS_POR_CODIGO = {codigo: sexo for sexo, codigo in SEXOS.items()}
+
+
+class RegistroMarcadores:
+    """Ids estáveis de marcadores e unidades (posição na lista do arquivo de registro)"""
+
+    def __init__(self, caminho=ARQUIVO_REGISTRO):
+        with open(caminho, encoding='utf-8') as arquivo:
+            conteudo = json.load(arquivo)
+
+        self.unidades = conteudo['unidades']
+        self.id_unidade = {unidade: posicao for posicao, unidade in enumerate(self.unidades)}
+
+        self.marcadores = [item['marcador'] for item in conteudo['marcadores']]
+        self.id_marcador = {marcador: posicao for posicao, marcador in enumerate(self.marcadores)}
+        self.unidade_canonica = np.array(
+            [self.id_unidade[item['unidade']] for item in conteudo['marcadores']],
+            dtype=np.uint8
+        )
+        self.nomes = np.array(self.marcadores, dtype=object)
+
+    def __contains__(self, marcador):
+        return marcador in self.id_marcador
+
+    def separar(self, valores):
+        """Divide um painel em (ids, valores) registrados e extras não registrados"""
+        ids, numeros, extras = [], [], {}
+        for marcador, valor in valores.items():
+            posicao = self.id_marcador.get(marcador)
+            if posicao is None:
+                extras[marcador] = valor
+            else:
+                ids.append(posicao)
+                numeros.append(valor)
+        return np.array(ids, dtype=np.uint16), np.array(numeros, dtype=np.float32), extras
+
+
+_registro_padrao = None
+
+
+def obter_registro_marcadores():
+    global _registro_padrao
+    if _registro_padrao is None:
+        _registro_padrao = RegistroMarcadores()
+    return _registro_padrao
+
+
+def codificar_painel(valores, sexo=None, registro=None):
+    """
+    Codifica um painel (marcador normalizado -> valor) em bytes.
+    Retorna (bytes, extras) com os marcadores fora do registro.
+    """
+    registro = registro or obter_registro_marcadores()
+    ids, numeros, extras = registro.separar(valores)
+
+    registros = np.empty(len(ids), dtype=REGISTRO)
+    registros['marcador'] = ids
+    registros['valor'] = numeros
+    registros['unidade'] = registro.unidade_canonica[ids]
+
+    cabecalho = CABECALHO.pack(MAGICO, VERSAO_FORMATO, SEXOS.get(sexo, 0), len(ids))
+    return cabecalho + registros.tobytes(), extras
+
+
+def decodificar_painel(dados, registro=None):
+    """Decodifica bytes de um painel em (valores, sexo)"""
+    registro = registro or obter_registro_marcadores()
+    magico, versao, sexo, quantidade = CABECALHO.unpack_from(dados)
+    if magico != MAGICO or versao != VERSAO_FORMATO:
+        raise ValueError('Painel codificado em formato desconhecido')
+
+    registros = np.frombuffer(dados, dtype=REGISTRO, count=quantidade, offset=CABECALHO.size)
+    valores = dict(zip(registro.nomes[registros['marcador']].tolist(), registros['valor'].tolist()))
+    return valores, SEXOS_POR_CODIGO.get(sexo)
+
+
+def decodificar_lote(blobs):
+    """
+    Decodifica vários painéis de uma vez em formato colunar:
+    (painel, marcador, valor, unidade) como arrays, mais o sexo de cada painel.
+    Cabeçalhos e registros são separados em dois buffers contíguos e lidos como views
+    estruturadas (np.frombuffer), sem arrays de índices por byte.
+    """
+    if not blobs:
+        vazio = np.empty(0, dtype=REGISTRO)
+        return {
+            'painel': np.empty(0, dtype=np.int64),
+            'marcador': vazio['marcador'],
+            'valor': vazio['valor'],
+            'unidade': vazio['unidade'],
+            'sexo': np.empty(0, dtype=np.uint8)
+        }
+
+    cabecalhos = np.frombuffer(b''.join(blob[:CABECALHO.size] for blob in blobs), dtype=CABECALHO_LOTE)
+    if not (np.all(cabecalhos['magico'] == MAGICO) and np.all(cabecalhos['versao'] == VERSAO_FORMATO)):
+        raise ValueError('Painel codificado em formato desconhecido')
+
+    quantidades = cabecalhos['quantidade'].astype(np.int64)
+    tamanhos = np.fromiter((len(blob) for blob in blobs), dtype=np.int64, count=len(blobs))
+    if np.any(tamanhos != CABECALHO.size + quantidades * REGISTRO.itemsize):
+        raise ValueError('Painel codificado truncado ou com registros a mais')
+
+    registros = np.frombuffer(b''.join(blob[CABECALHO.size:] for blob in blobs), dtype=REGISTRO)
+
+    return {
+        'painel': np.repeat(np.arange(len(blobs)), quantidades),
+        'marcador': registros['marcador'],
+        'valor': registros['valor'],
+        'unidade': registros['unidade'],
+        'sexo': cabecalhos['sexo']
+    }
+
+
+def decodificar_paineis(blobs, registro=None):
+    """Vários painéis em [(valores, sexo)] como decodificar_painel, lidos de uma vez por decodificar_lote"""
+    registro = registro or obter_registro_marcadores()
+    lote = decodificar_lote(blobs)
+    nomes = registro.nomes[lote['marcador']].tolist()
+    valores = lote['valor'].tolist()
+    fins = np.cumsum(np.bincount(lote['painel'], minlength=len(blobs))).tolist()
+    paineis, inicio = [], 0
+    for fim, sexo in zip(fins, lote['sexo'].tolist()):
+        paineis.append((dict(zip(nomes[inicio:fim], valores[inicio:fim])), SEXOS_POR_CODIGO.get(sexo)))
+        inicio = fim
+    return paineis
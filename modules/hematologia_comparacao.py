@@ -0,0 +1,130 @@
+"""
+COMPARAÇÃO DE PAINÉIS
+Alinhamento de dois ou mais painéis por id canônico de marcador e cálculo
+vetorizado de deltas, transições de status e direção das mudanças
+"""
+
+import numpy as np
+
+from modules.hematologia_codificacao import obter_registro_marcadores
+from modules.hematologia_derivados import PainelLaboratorial
+from modules.hematologia_referencias import CAMPOS_LIMITE, STATUS_ORDEM
+
+# Distância de cada status (na ordem de STATUS_ORDEM) até a faixa ideal, com sinal
+POSICAO_STATUS = np.array([-2, 2, -1, 1, 0])
+
+# Variações percentuais abaixo deste limite são consideradas estáveis
+TOLERANCIA_ESTAVEL = 2.0
+
+
+def _para_lista(matriz, casas=2):
+    """Matriz numpy -> listas JSON com None no lugar de NaN e ±inf (variação sobre valor zero)"""
+    arredondada = np.round(matriz, casas)
+    return np.where(np.isfinite(arredondada), arredondada, None).tolist()
+
+
+def _alinhar(paineis):
+    """Matriz (painéis x marcadores) alinhada pelo id canônico do registro"""
+    registro = obter_registro_marcadores()
+    valores_paineis = [dict(PainelLaboratorial(exames).items()) for exames in paineis]
+
+    presentes = set().union(*valores_paineis)
+    registrados = sorted((m for m in presentes if m in registro), key=registro.id_marcador.get)
+    marcadores = registrados + sorted(presentes - set(registrados))
+    coluna = {marcador: posicao for posicao, marcador in enumerate(marcadores)}
+
+    matriz = np.full((len(paineis), len(marcadores)), np.nan)
+    for linha, valores in enumerate(valores_paineis):
+        if valores:
+            colunas = [coluna[marcador] for marcador in valores]
+            matriz[linha, colunas] = list(valores.values())
+
+    return marcadores, matriz
+
+
+def comparar_paineis(paineis, sexo, idade, tabelas):
+    """
+    Compara painéis (lista de dicts marcador -> valor, em ordem cronológica).
+    Retorna tabela compacta: uma coluna por marcador, uma linha por painel.
+    """
+    marcadores, valores = _alinhar(paineis)
+
+    # Limites de referência por marcador (n_marcadores x 4), NaN quando sem referência
+    referencias = [tabelas.resolver(marcador, sexo, idade) for marcador in marcadores]
+    limites = np.array([
+        [referencia[campo] for campo in CAMPOS_LIMITE] if referencia else [np.nan] * len(CAMPOS_LIMITE)
+        for referencia in referencias
+    ], dtype=np.float64).reshape(len(marcadores), len(CAMPOS_LIMITE))
+    minimo, maximo, ideal_min, ideal_max = limites.T
+
+    # Status de todas as células de uma vez
+    indice_status = np.select(
+        [valores < minimo, valores > maximo, valores < ideal_min, valores > ideal_max],
+        [0, 1, 2, 3],
+        default=4
+    )
+    sem_status = np.isnan(valores) | np.isnan(minimo)
+    status = np.where(sem_status, None, STATUS_ORDEM[indice_status].astype(object))
+
+    # Deltas entre painéis consecutivos e do primeiro ao último valor de cada marcador
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_absoluto = np.diff(valores, axis=0)
+        delta_percentual = delta_absoluto / np.abs(valores[:-1]) * 100
+
+        presentes = ~np.isnan(valores)
+        primeira = np.argmax(presentes, axis=0)
+        ultima = len(valores) - 1 - np.argmax(presentes[::-1], axis=0)
+        colunas = np.arange(len(marcadores))
+        inicial, final = valores[primeira, colunas], valores[ultima, colunas]
+        variacao_absoluta = np.where(ultima > primeira, final - inicial, np.nan)
+        variacao_percentual = variacao_absoluta / np.abs(inicial) * 100
+
+    direcao = np.select(
+        [np.isnan(variacao_absoluta),
+         np.abs(np.nan_to_num(variacao_percentual)) < TOLERANCIA_ESTAVEL,
+         variacao_absoluta > 0],
+        ['SEM_COMPARACAO', 'ESTÁVEL', 'SUBIU'],
+        default='CAIU'
+    )
+
+    # Transições de status entre a primeira e a última medida de cada marcador
+    status_inicial = indice_status[primeira, colunas]
+    status_final = indice_status[ultima, colunas]
+    comparavel = (ultima > primeira) & ~np.isnan(minimo)
+    mudou = comparavel & (status_inicial != status_final)
+    distancia_inicial = np.abs(POSICAO_STATUS[status_inicial])
+    distancia_final = np.abs(POSICAO_STATUS[status_final])
+
+    transicoes = [
+        {
+            'marcador': marcadores[coluna],
+            'de': STATUS_ORDEM[status_inicial[coluna]],
+            'para': STATUS_ORDEM[status_final[coluna]],
+            'tendencia': (
+                'MELHORA' if distancia_final[coluna] < distancia_inicial[coluna]
+                else 'PIORA' if distancia_final[coluna] > distancia_inicial[coluna]
+                else 'LATERAL'
+            )
+        }
+        for coluna in np.flatnonzero(mudou)
+    ]
+
+    return {
+        'marcadores': marcadores,
+        'unidades': [referencia['unidade'] if referencia else '' for referencia in referencias],
+        'valores': _para_lista(valores),
+        'status': status.tolist(),
+        'delta_absoluto': _para_lista(delta_absoluto),
+        'delta_percentual': _para_lista(delta_percentual, 1),
+        'variacao_total': {
+            'absoluta': _para_lista(variacao_absoluta),
+            'percentual': _para_lista(variacao_percentual, 1)
+        },
+        'direcao': direcao.tolist(),
+        'transicoes': transicoes,
+        'resumo': {
+            'marcadores_comparados': int(comparavel.sum()),
+            'melhoras': sum(1 for transicao in transicoes if transicao['tendencia'] == 'MELHORA'),
+            'pioras': sum(1 for transicao in transicoes if transicao['tendencia'] == 'PIORA')
+        }
+    }
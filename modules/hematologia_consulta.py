@@ -0,0 +1,106 @@
+"""
+CONSULTA NO ROSTER
+Filtros por marcador (limiar ou status) sobre o índice de valores armazenados,
+classificados em lote sem reanalisar os painéis
+"""
+
+import operator
+
+import numpy as np
+
+from modules.hematologia_referencias import CAMPOS_LIMITE, STATUS_ORDEM
+
+OPERADORES_CONSULTA = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal
+}
+
+# Os mesmos operadores sobre colunas SQLAlchemy (limiar aplicado na própria consulta ao índice)
+OPERADORES_SQL = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+# Atalhos de status aceitos na consulta, além dos status individuais
+GRUPOS_STATUS = {
+    'abaixo_ideal': ('BAIXO', 'SUBÓTIMO_BAIXO'),
+    'acima_ideal': ('ELEVADO', 'SUBÓTIMO_ALTO'),
+    'fora_referencia': ('BAIXO', 'ELEVADO'),
+    'fora_ideal': ('BAIXO', 'ELEVADO', 'SUBÓTIMO_BAIXO', 'SUBÓTIMO_ALTO')
+}
+
+
+def _limites_por_linha(marcador, laboratorios, sexos, idades, referencias_laboratorio):
+    """
+    Limites (linhas x 4) resolvendo cada combinação (laboratório, sexo, idade) distinta uma
+    única vez, com as referências em camadas do laboratório de cada linha
+    """
+    combinacoes = {}
+    inversos = np.empty(len(sexos), dtype=np.int64)
+    for posicao, chave in enumerate(zip(laboratorios, sexos, idades)):
+        inversos[posicao] = combinacoes.setdefault(chave, len(combinacoes))
+
+    limites = np.full((len(combinacoes), len(CAMPOS_LIMITE)), np.nan)
+    for (laboratorio, sexo, idade), linha in combinacoes.items():
+        referencia = referencias_laboratorio(laboratorio).resolver(marcador, sexo or 'masculino', idade)
+        if referencia:
+            limites[linha] = [referencia[campo] for campo in CAMPOS_LIMITE]
+    return limites[inversos]
+
+
+def consultar_marcador(linhas, marcador, referencias_laboratorio, status=None, operador=None, limite=None,
+                       apenas_ultimo=True):
+    """
+    Filtra valores de um marcador.
+    linhas: dict colunar com cliente_id, exame_id, valor, data_coleta, sexo, idade e laboratorio,
+    ordenado por cliente e data de coleta decrescente.
+    referencias_laboratorio: laboratório -> referências em camadas usadas para o status da linha.
+    Com apenas_ultimo, considera só a medida mais recente de cada cliente.
+    Retorna lista de {cliente_id, exame_id, data_coleta, valor, status}.
+    """
+    clientes = np.asarray(linhas['cliente_id'], dtype=np.int64)
+    valores = np.asarray(linhas['valor'], dtype=np.float64)
+    selecao = np.arange(len(clientes))
+
+    if apenas_ultimo and len(clientes):
+        # Primeira linha de cada cliente (ordem decrescente de data)
+        selecao = selecao[np.concatenate(([True], clientes[1:] != clientes[:-1]))]
+
+    laboratorios = [linhas['laboratorio'][posicao] for posicao in selecao]
+    sexos = [linhas['sexo'][posicao] for posicao in selecao]
+    idades = [linhas['idade'][posicao] for posicao in selecao]
+    minimo, maximo, ideal_min, ideal_max = \
+        _limites_por_linha(marcador, laboratorios, sexos, idades, referencias_laboratorio).T \
+        if len(selecao) else np.empty((len(CAMPOS_LIMITE), 0))
+    valores_selecionados = valores[selecao]
+
+    indice_status = np.select(
+        [valores_selecionados < minimo, valores_selecionados > maximo,
+         valores_selecionados < ideal_min, valores_selecionados > ideal_max],
+        [0, 1, 2, 3],
+        default=4
+    )
+    sem_referencia = np.isnan(minimo)
+
+    mascara = np.ones(len(selecao), dtype=bool)
+    if status:
+        aceitos = GRUPOS_STATUS.get(status, (status,))
+        mascara &= np.isin(STATUS_ORDEM[indice_status], aceitos) & ~sem_referencia
+    if operador:
+        mascara &= OPERADORES_CONSULTA[operador](valores_selecionados, limite)
+
+    return [
+        {
+            'cliente_id': int(clientes[posicao]),
+            'exame_id': linhas['exame_id'][posicao],
+            'data_coleta': linhas['data_coleta'][posicao].isoformat(),
+            'valor': round(float(valores[posicao]), 2),
+            'status': None if sem_referencia[indice] else str(STATUS_ORDEM[indice_status[indice]])
+        }
+        for indice, posicao in enumerate(selecao)
+        if mascara[indice]
+    ]
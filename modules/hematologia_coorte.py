@@ -0,0 +1,166 @@
+"""
+COORTE HEMATOLÓGICA
+Percentis e z-scores de cada marcador em relação aos demais atletas do coach
+"""
+
+import math
+import threading
+
+import numpy as np
+
+# Abaixo deste tamanho de amostra percentis não são reportados
+AMOSTRA_MINIMA = 5
+
+
+class DistribuicaoMarcador:
+    """
+    Valores ordenados de um (marcador, sexo) com inserção incremental:
+    novos valores ficam pendentes e são intercalados no array ordenado
+    na próxima consulta; média e variância via Welford. Valores em float32,
+    a mesma precisão dos painéis armazenados, para que empates sejam exatos.
+    """
+
+    __slots__ = ('valores', 'pendentes', 'n', 'media', 'm2')
+
+    def __init__(self):
+        self.valores = np.empty(0, dtype=np.float32)
+        self.pendentes = []
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def adicionar(self, valor):
+        self.pendentes.append(valor)
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+
+    def _consolidar(self):
+        if not self.pendentes:
+            return
+        novos = np.sort(np.asarray(self.pendentes, dtype=np.float32))
+        self.valores = np.insert(self.valores, np.searchsorted(self.valores, novos), novos)
+        self.pendentes = []
+
+    @property
+    def desvio_padrao(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def posicionar(self, valor, excluir=()):
+        """
+        Percentil (empates contam pela metade) e z-score do valor na distribuição, sem os
+        valores em 'excluir' (os do próprio atleta); None com amostra pequena demais
+        """
+        self._consolidar()
+        chave = np.float32(valor)
+        excluidos = np.asarray(excluir, dtype=np.float64)
+        n = self.n - len(excluidos)
+        if n < AMOSTRA_MINIMA:
+            return None
+
+        abaixo = np.searchsorted(self.valores, chave, side='left')
+        ate = np.searchsorted(self.valores, chave, side='right')
+        media, m2 = self.media, self.m2
+        if len(excluidos):
+            proprios = excluidos.astype(np.float32)
+            abaixo -= np.count_nonzero(proprios < chave)
+            ate -= np.count_nonzero(proprios <= chave)
+            # Welford ao contrário: remove o subconjunto da média e da soma dos quadrados
+            media_excluidos = excluidos.mean()
+            media = (self.n * self.media - len(excluidos) * media_excluidos) / n
+            m2 = self.m2 - ((excluidos - media_excluidos) ** 2).sum() \
+                - (media_excluidos - media) ** 2 * n * len(excluidos) / self.n
+        percentil = 100.0 * (abaixo + (ate - abaixo) / 2) / n
+        desvio = math.sqrt(max(m2, 0.0) / (n - 1)) if n > 1 else 0.0
+        return {
+            'percentil': round(float(percentil), 1),
+            'z_score': round(float((valor - media) / desvio), 2) if desvio > 0 else 0.0,
+            'n': n
+        }
+
+
+class CoorteHematologica:
+    """
+    Distribuições por (marcador, sexo) de todos os painéis armazenados de um roster,
+    com os valores de cada atleta guardados à parte para tirá-lo da própria comparação
+    """
+
+    def __init__(self):
+        self.distribuicoes = {}
+        self.valores_cliente = {}
+        self.ultimo_exame_id = 0
+        self.impressao = None
+        self._lock = threading.Lock()
+        self._lock_sincronizacao = threading.Lock()
+
+    def _reiniciar(self):
+        with self._lock:
+            self.distribuicoes = {}
+            self.valores_cliente = {}
+            self.ultimo_exame_id = 0
+            self.impressao = None
+
+    def adicionar_painel(self, valores, sexo, exame_id=None, cliente_id=None):
+        """Inclui um painel (marcador -> valor) na coorte em O(marcadores)"""
+        with self._lock:
+            proprios = self.valores_cliente.setdefault(cliente_id, {}) if cliente_id is not None else None
+            for marcador, valor in valores.items():
+                chave = (marcador, sexo)
+                if chave not in self.distribuicoes:
+                    self.distribuicoes[chave] = DistribuicaoMarcador()
+                self.distribuicoes[chave].adicionar(valor)
+                if proprios is not None:
+                    proprios.setdefault(chave, []).append(valor)
+            if exame_id is not None:
+                self.ultimo_exame_id = max(self.ultimo_exame_id, exame_id)
+
+    def sincronizar(self, buscar_paineis, impressao):
+        """
+        Inclui os painéis armazenados após o último já visto. impressao(ate_id) devolve
+        (quantidade, maior id, última alteração) dos painéis com id <= ate_id (todos com None):
+        igual à gravada, nada mudou; diferente só por painéis novos, eles são incluídos; painéis
+        já incluídos alterados ou removidos mudam a impressão até o último id e a coorte é refeita.
+        Vale entre processos, pois a impressão vem do banco.
+        buscar_paineis(ultimo_id, ate_id) retorna [(exame_id, valores, sexo, cliente_id)] em ordem de id
+        """
+        with self._lock_sincronizacao:
+            atual = impressao(None)
+            if atual == self.impressao:
+                return self
+            if self.impressao is not None and impressao(self.ultimo_exame_id) != self.impressao:
+                self._reiniciar()
+            ate_id = atual[1] or 0
+            for exame_id, valores, sexo, cliente_id in buscar_paineis(self.ultimo_exame_id, ate_id):
+                self.adicionar_painel(valores, sexo, exame_id, cliente_id)
+            self.ultimo_exame_id = ate_id
+            self.impressao = atual
+        return self
+
+    def posicionar_painel(self, valores, sexo, cliente_id=None):
+        """Percentil e z-score de cada marcador do painel dentro da coorte (sem os painéis do próprio cliente)"""
+        posicoes = {}
+        with self._lock:
+            proprios = self.valores_cliente.get(cliente_id, {})
+            for marcador, valor in valores.items():
+                distribuicao = self.distribuicoes.get((marcador, sexo))
+                if distribuicao is None:
+                    continue
+                posicao = distribuicao.posicionar(valor, proprios.get((marcador, sexo), ()))
+                if posicao is not None:
+                    posicoes[marcador] = posicao
+        return posicoes
+
+
+class RegistroCoortes:
+    """Uma coorte por coach, mantida em memória pelo processo"""
+
+    def __init__(self):
+        self.coortes = {}
+        self._lock = threading.Lock()
+
+    def obter(self, coach_id):
+        with self._lock:
+            if coach_id not in self.coortes:
+                self.coortes[coach_id] = CoorteHematologica()
+            return self.coortes[coach_id]
@@ -0,0 +1,80 @@
+"""
+VALORES CRÍTICOS
+Checagem rápida de limites críticos, executada antes do relatório completo
+"""
+
+from modules.hematologia_regras import normalizar_marcador
+
+SEXOS = ('masculino', 'feminino')
+
+ACAO_CRITICA = 'Contato imediato com o atleta e encaminhamento médico'
+
+
+def _limite_por_sexo(limite, sexo):
+    if isinstance(limite, dict):
+        return limite.get(sexo)
+    return limite
+
+
+class LimitesCriticos:
+    """
+    Limites críticos pré-compilados por sexo: marcador -> (inferior, superior, definição).
+    Limites relativos (fator x limite superior da referência) são resolvidos na compilação.
+    """
+
+    def __init__(self, definicoes, referencias_por_sexo):
+        self.limites = {}
+        for sexo in SEXOS:
+            tabela = {}
+            for marcador, definicao in definicoes.items():
+                inferior = _limite_por_sexo(definicao.get('min'), sexo)
+                superior = _limite_por_sexo(definicao.get('max'), sexo)
+
+                if 'fator_limite_superior' in definicao:
+                    referencia = referencias_por_sexo[sexo].get(marcador)
+                    if referencia is None:
+                        raise ValueError(f'Limite crítico relativo sem referência: {marcador}')
+                    superior = definicao['fator_limite_superior'] * referencia['max']
+
+                if inferior is None and superior is None:
+                    continue
+                tabela[marcador] = (
+                    float('-inf') if inferior is None else inferior,
+                    float('inf') if superior is None else superior,
+                    definicao
+                )
+            self.limites[sexo] = tabela
+
+    def verificar(self, exames, sexo):
+        """Alertas críticos do painel (somente marcadores medidos)"""
+        limites = self.limites.get(sexo, self.limites['masculino'])
+        alertas = []
+
+        for marcador, valor in exames.items():
+            limite = limites.get(marcador)
+            if limite is None:
+                limite = limites.get(normalizar_marcador(marcador))
+                if limite is None:
+                    continue
+            if not isinstance(valor, (int, float)):
+                continue
+
+            inferior, superior, definicao = limite
+            if valor < inferior:
+                tipo, limite_violado = 'CRÍTICO_BAIXO', inferior
+            elif valor > superior:
+                tipo, limite_violado = 'CRÍTICO_ALTO', superior
+            else:
+                continue
+
+            alertas.append({
+                'marcador': marcador,
+                'valor': valor,
+                'unidade': definicao.get('unidade', ''),
+                'tipo': tipo,
+                'limite': round(limite_violado, 2),
+                'mensagem': definicao['mensagem'],
+                'acao': ACAO_CRITICA
+            })
+
+        return alertas
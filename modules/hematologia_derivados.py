@@ -0,0 +1,202 @@
+"""
+MARCADORES DERIVADOS
+Grafo de dependências de índices calculados a partir do painel laboratorial
+"""
+
+import math
+
+from modules.hematologia_regras import normalizar_marcador
+
+# Constantes de Vermeulen para testosterona livre calculada
+_KA_ALBUMINA = 3.6e4      # L/mol
+_KT_SHBG = 1e9            # L/mol
+_MM_TESTOSTERONA = 288.42  # g/mol
+_MM_ALBUMINA = 69000       # g/mol
+_ALBUMINA_PADRAO = 4.3     # g/dL
+
+
+def _homa_ir(glicemia, insulina):
+    return (glicemia * insulina) / 405
+
+
+def _ratio_t_c(testosterona_total, cortisol):
+    if cortisol <= 0:
+        return None
+    return testosterona_total / cortisol
+
+
+def _testosterona_livre_vermeulen(testosterona_total, shbg, albumina):
+    """Testosterona livre (pg/mL) a partir de TT (ng/dL), SHBG (nmol/L) e albumina (g/dL)"""
+    tt = testosterona_total * 10e-9 / _MM_TESTOSTERONA
+    shbg_mol = shbg * 1e-9
+    albumina_mol = albumina * 10 / _MM_ALBUMINA
+
+    n = 1 + _KA_ALBUMINA * albumina_mol
+    a = n * _KT_SHBG
+    b = n + _KT_SHBG * (shbg_mol - tt)
+    livre = (-b + math.sqrt(b * b + 4 * a * tt)) / (2 * a)
+    return livre * _MM_TESTOSTERONA * 1e9
+
+
+def _ldl_friedewald(colesterol_total, hdl, triglicerides):
+    # Friedewald não é válida com triglicérides >= 400 mg/dL
+    if triglicerides >= 400:
+        return None
+    return colesterol_total - hdl - triglicerides / 5
+
+
+def _colesterol_nao_hdl(colesterol_total, hdl):
+    return colesterol_total - hdl
+
+
+def _ratio_tg_hdl(triglicerides, hdl):
+    if hdl <= 0:
+        return None
+    return triglicerides / hdl
+
+
+DERIVADOS = {
+    'homa_ir': {
+        'dependencias': ('glicemia', 'insulina'),
+        'calculo': _homa_ir
+    },
+    'ratio_t_c': {
+        'dependencias': ('testosterona_total', 'cortisol'),
+        'calculo': _ratio_t_c
+    },
+    'testosterona_livre_calculada': {
+        'dependencias': ('testosterona_total', 'shbg'),
+        'opcionais': {'albumina': _ALBUMINA_PADRAO},
+        'calculo': _testosterona_livre_vermeulen
+    },
+    'ldl': {
+        'dependencias': ('colesterol_total', 'hdl', 'triglicerides'),
+        'calculo': _ldl_friedewald
+    },
+    'colesterol_nao_hdl': {
+        'dependencias': ('colesterol_total', 'hdl'),
+        'calculo': _colesterol_nao_hdl
+    },
+    'ratio_tg_hdl': {
+        'dependencias': ('triglicerides', 'hdl'),
+        'calculo': _ratio_tg_hdl
+    }
+}
+
+
+def _ordenar_derivados(derivados):
+    """Ordem topológica dos derivados (falha se houver ciclo)"""
+    ordem = []
+    visitando = set()
+    visitados = set()
+
+    def visitar(nome):
+        if nome in visitados:
+            return
+        if nome in visitando:
+            raise ValueError(f'Ciclo no grafo de marcadores derivados: {nome}')
+        visitando.add(nome)
+        definicao = derivados[nome]
+        for dependencia in (*definicao['dependencias'], *definicao.get('opcionais', {})):
+            if dependencia in derivados:
+                visitar(dependencia)
+        visitando.discard(nome)
+        visitados.add(nome)
+        ordem.append(nome)
+
+    for nome in derivados:
+        visitar(nome)
+    return tuple(ordem)
+
+
+ORDEM_DERIVADOS = _ordenar_derivados(DERIVADOS)
+
+_AUSENTE = object()
+
+
+class PainelLaboratorial:
+    """
+    Valores de um painel com marcadores derivados calculados sob demanda e
+    memoizados; regras clínicas e classificação leem a mesma instância.
+    Valores medidos têm precedência sobre os calculados.
+    """
+
+    def __init__(self, exames):
+        self.nomes_originais = {}
+        self.medidos = {}
+        for marcador, valor in exames.items():
+            if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+                continue
+            chave = normalizar_marcador(marcador)
+            self.medidos[chave] = valor
+            self.nomes_originais[chave] = marcador
+
+        self._calculados = {}
+        self._completo = False
+
+    def _resolver(self, marcador):
+        if marcador in self.medidos:
+            return self.medidos[marcador]
+        if marcador in self._calculados:
+            return self._calculados[marcador]
+        if marcador not in DERIVADOS:
+            return _AUSENTE
+
+        definicao = DERIVADOS[marcador]
+        argumentos = []
+        for dependencia in definicao['dependencias']:
+            valor = self._resolver(dependencia)
+            if valor is _AUSENTE:
+                self._calculados[marcador] = _AUSENTE
+                return _AUSENTE
+            argumentos.append(valor)
+
+        for dependencia, padrao in definicao.get('opcionais', {}).items():
+            valor = self._resolver(dependencia)
+            argumentos.append(padrao if valor is _AUSENTE else valor)
+
+        resultado = definicao['calculo'](*argumentos)
+        self._calculados[marcador] = _AUSENTE if resultado is None else resultado
+        return self._calculados[marcador]
+
+    def derivados(self):
+        """Todos os marcadores derivados calculáveis neste painel"""
+        if not self._completo:
+            for marcador in ORDEM_DERIVADOS:
+                self._resolver(marcador)
+            self._completo = True
+        return {
+            marcador: valor for marcador, valor in self._calculados.items()
+            if valor is not _AUSENTE
+        }
+
+    def calculado(self, marcador):
+        """Indica se o valor do marcador foi calculado (e não medido)"""
+        return marcador not in self.medidos and marcador in self
+
+    def nome_original(self, marcador):
+        return self.nomes_originais.get(marcador, marcador)
+
+    def __getitem__(self, marcador):
+        valor = self._resolver(marcador)
+        if valor is _AUSENTE:
+            raise KeyError(marcador)
+        return valor
+
+    def __contains__(self, marcador):
+        return self._resolver(marcador) is not _AUSENTE
+
+    def get(self, marcador, padrao=None):
+        valor = self._resolver(marcador)
+        return padrao if valor is _AUSENTE else valor
+
+    def items(self):
+        yield from self.medidos.items()
+        yield from self.derivados().items()
+
+    def __iter__(self):
+        for marcador, _ in self.items():
+            yield marcador
+
+    def __len__(self):
+        return len(self.medidos) + len(self.derivados())
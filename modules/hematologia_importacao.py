@@ -0,0 +1,281 @@
+"""
+IMPORTAÇÃO DE EXAMES EM LOTE
+Leitura em streaming de exportações CSV/XLSX dos laboratórios (uma linha por
+paciente, marcador, valor, unidade e data), com resolução de apelidos de
+marcadores e conversão de unidades para a unidade canônica do registro
+"""
+
+import csv
+import io
+import re
+import unicodedata
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import chain
+
+from modules.hematologia_codificacao import obter_registro_marcadores
+from modules.hematologia_referencias import normalizar_laboratorio
+
+# Linhas por lote (cada lote vira uma transação no banco)
+TAMANHO_LOTE = 5000
+
+# Erros de linha guardados para o relatório da importação
+MAXIMO_ERROS_REPORTADOS = 50
+
+# Nomes de coluna aceitos para cada campo (já normalizados)
+COLUNAS = {
+    'email': ('email', 'e_mail', 'email_paciente', 'paciente_email'),
+    'marcador': ('marcador', 'exame', 'analito', 'parametro'),
+    'valor': ('valor', 'resultado'),
+    'unidade': ('unidade', 'unidade_medida'),
+    'data_coleta': ('data_coleta', 'data', 'data_exame', 'coleta'),
+    'laboratorio': ('laboratorio', 'lab')
+}
+
+COLUNAS_OBRIGATORIAS = ('email', 'marcador', 'valor')
+
+FORMATOS_DATA = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y')
+
+# Nomes usados pelos laboratórios -> marcador do registro
+APELIDOS_MARCADORES = {
+    'tgo': 'ast', 'aspartato_aminotransferase': 'ast',
+    'tgp': 'alt', 'alanina_aminotransferase': 'alt',
+    'gama_gt': 'ggt', 'gama_glutamil_transferase': 'ggt',
+    'glicose': 'glicemia', 'glicose_jejum': 'glicemia', 'glicemia_jejum': 'glicemia',
+    'hemoglobina_glicada': 'hb_glicada', 'hba1c': 'hb_glicada', 'hb_a1c': 'hb_glicada',
+    'colesterol_hdl': 'hdl', 'hdl_colesterol': 'hdl',
+    'colesterol_ldl': 'ldl', 'ldl_colesterol': 'ldl',
+    'triglicerideos': 'triglicerides', 'trigliceridios': 'triglicerides',
+    'testosterona': 'testosterona_total',
+    't4l': 't4_livre', 't3l': 't3_livre', 't3r': 't3_reverso',
+    '25_oh_vitamina_d': 'vitamina_d', 'vitamina_d3': 'vitamina_d', '25_hidroxivitamina_d': 'vitamina_d',
+    'vitamina_d_25_oh': 'vitamina_d',
+    'vitamina_b12': 'b12', 'cianocobalamina': 'b12',
+    'folato': 'acido_folico',
+    'proteina_c_reativa': 'pcr', 'pcr_us': 'pcr', 'pcr_ultrassensivel': 'pcr',
+    'cpk': 'ck', 'ck_total': 'ck', 'creatinoquinase': 'ck',
+    'dhea_sulfato': 'dhea_s', 'sdhea': 'dhea_s',
+    'igf1': 'igf_1', 'somatomedina_c': 'igf_1',
+    'hb': 'hemoglobina', 'ht': 'hematocrito', 'hct': 'hematocrito',
+    'k': 'potassio', 'na': 'sodio', 'mg': 'magnesio', 'zn': 'zinco',
+    'tfg_estimada': 'tfg', 'egfr': 'tfg',
+    'globulina_ligadora_de_hormonios_sexuais': 'shbg'
+}
+
+# Grafias equivalentes de unidades (após normalização)
+APELIDOS_UNIDADES = {
+    'ug/l': 'ng/ml', 'mcg/l': 'ng/ml',
+    'ng/l': 'pg/ml',
+    'mcg/dl': 'ug/dl',
+    'ui/l': 'u/l', 'iu/l': 'u/l',
+    'mui/ml': 'miu/ml',
+    'uui/ml': 'uiu/ml', 'mui/l': 'uiu/ml', 'miu/l': 'uiu/ml',
+    'ml/min': 'ml/min/1.73m²', 'ml/min/1,73m²': 'ml/min/1.73m²', 'ml/min/1.73m2': 'ml/min/1.73m²'
+}
+
+# (marcador, unidade normalizada) -> (fator, deslocamento) para a unidade canônica
+CONVERSOES = {
+    ('glicemia', 'mmol/l'): (18.016, 0.0),
+    ('colesterol_total', 'mmol/l'): (38.67, 0.0),
+    ('hdl', 'mmol/l'): (38.67, 0.0),
+    ('ldl', 'mmol/l'): (38.67, 0.0),
+    ('triglicerides', 'mmol/l'): (88.57, 0.0),
+    ('hb_glicada', 'mmol/mol'): (0.0915, 2.15),
+    ('insulina', 'pmol/l'): (0.144, 0.0),
+    ('testosterona_total', 'nmol/l'): (28.84, 0.0),
+    ('testosterona_livre', 'pmol/l'): (0.2884, 0.0),
+    ('testosterona_livre', 'ng/dl'): (10.0, 0.0),
+    ('estradiol', 'pmol/l'): (0.2724, 0.0),
+    ('lh', 'u/l'): (1.0, 0.0),
+    ('fsh', 'u/l'): (1.0, 0.0),
+    ('t4_livre', 'pmol/l'): (0.0777, 0.0),
+    ('t3_livre', 'pmol/l'): (0.651, 0.0),
+    ('cortisol', 'nmol/l'): (0.03625, 0.0),
+    ('dhea_s', 'umol/l'): (36.85, 0.0),
+    ('igf_1', 'nmol/l'): (7.649, 0.0),
+    ('creatinina', 'umol/l'): (1 / 88.4, 0.0),
+    ('ureia', 'mmol/l'): (6.006, 0.0),
+    ('pcr', 'mg/dl'): (10.0, 0.0),
+    ('vitamina_d', 'nmol/l'): (0.4006, 0.0),
+    ('b12', 'pmol/l'): (1.355, 0.0),
+    ('acido_folico', 'nmol/l'): (0.4413, 0.0),
+    ('zinco', 'umol/l'): (6.54, 0.0),
+    ('magnesio', 'mmol/l'): (2.431, 0.0),
+    ('magnesio', 'meq/l'): (1.2155, 0.0),
+    ('albumina', 'g/l'): (0.1, 0.0),
+    ('hemoglobina', 'g/l'): (0.1, 0.0),
+    ('hemoglobina', 'mmol/l'): (1.611, 0.0),
+    ('hematocrito', 'l/l'): (100.0, 0.0),
+    ('potassio', 'mmol/l'): (1.0, 0.0),
+    ('sodio', 'mmol/l'): (1.0, 0.0)
+}
+
+
+def remover_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_nome(texto):
+    return re.sub(r'[^a-z0-9]+', '_', remover_acentos(str(texto)).lower()).strip('_')
+
+
+@lru_cache(maxsize=1024)
+def _normalizar_unidade(unidade):
+    unidade = str(unidade or '').strip().lower().replace('µ', 'u').replace('μ', 'u').replace(' ', '')
+    return APELIDOS_UNIDADES.get(unidade, unidade)
+
+
+def _converter_numero(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    texto = str(valor or '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return float(texto)
+
+
+def _converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return _converter_texto_data(str(valor or '').strip()[:10])
+
+
+@lru_cache(maxsize=4096)
+def _converter_texto_data(texto):
+    # Exportações repetem a mesma data em todas as linhas do painel; strptime é caro
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'data inválida: {texto}')
+
+
+class ImportadorExames:
+    """
+    Lê exportações de laboratório linha a linha e entrega lotes de painéis
+    (email, data_coleta, laboratório normalizado) -> {'laboratorio', 'exames'}, com memória
+    limitada ao lote.
+    Um mesmo painel pode aparecer em mais de um lote; quem grava faz o upsert.
+    """
+
+    def __init__(self, mapeamento=None, laboratorio=None, tamanho_lote=TAMANHO_LOTE):
+        # mapeamento: campo -> nome da coluna no arquivo, para exportações fora do padrão
+        self.mapeamento = {campo: _normalizar_nome(coluna) for campo, coluna in (mapeamento or {}).items()}
+        self.laboratorio = laboratorio
+        self.tamanho_lote = tamanho_lote
+        self.registro = obter_registro_marcadores()
+        self.unidades_canonicas = {
+            marcador: _normalizar_unidade(self.registro.unidades[unidade])
+            for marcador, unidade in zip(self.registro.marcadores, self.registro.unidade_canonica.tolist())
+        }
+        self.linhas_lidas = 0
+        self.linhas_invalidas = 0
+        self.erros = []
+
+    def _linhas_csv(self, arquivo, codificacao):
+        texto = io.TextIOWrapper(arquivo, encoding=codificacao, newline='')
+        cabecalho = texto.readline()
+        delimitador = max((';', ',', '\t'), key=cabecalho.count)
+        return csv.reader(chain([cabecalho], texto), delimiter=delimitador)
+
+    def _linhas_xlsx(self, arquivo):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('Importação de XLSX requer o pacote openpyxl')
+        planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+        return planilha.iter_rows(values_only=True)
+
+    def _indices_colunas(self, cabecalho):
+        nomes = [_normalizar_nome(coluna) if coluna is not None else '' for coluna in cabecalho]
+        indices = {}
+        for campo, aceitos in COLUNAS.items():
+            aceitos = (self.mapeamento[campo],) if campo in self.mapeamento else aceitos
+            for posicao, nome in enumerate(nomes):
+                if nome in aceitos:
+                    indices[campo] = posicao
+                    break
+        faltando = [campo for campo in COLUNAS_OBRIGATORIAS if campo not in indices]
+        if faltando:
+            raise ValueError(f'Colunas obrigatórias ausentes: {", ".join(faltando)}')
+        return indices
+
+    def resolver_marcador(self, nome):
+        marcador = _normalizar_nome(nome)
+        return APELIDOS_MARCADORES.get(marcador, marcador)
+
+    def converter_unidade(self, marcador, valor, unidade):
+        """Valor na unidade canônica do registro; marcadores fora do registro passam sem conversão"""
+        canonica = self.unidades_canonicas.get(marcador)
+        unidade = _normalizar_unidade(unidade)
+        if canonica is None or not unidade or unidade == canonica:
+            return valor
+        conversao = CONVERSOES.get((marcador, unidade))
+        if conversao is None:
+            raise ValueError(f'unidade {unidade} não suportada para {marcador}')
+        fator, deslocamento = conversao
+        return valor * fator + deslocamento
+
+    def _registrar_erro(self, linha, mensagem):
+        self.linhas_invalidas += 1
+        if len(self.erros) < MAXIMO_ERROS_REPORTADOS:
+            self.erros.append({'linha': linha, 'erro': mensagem})
+
+    def lotes(self, arquivo, nome_arquivo, codificacao='utf-8-sig'):
+        """Gera lotes de painéis a partir de um arquivo .csv ou .xlsx"""
+        if nome_arquivo.lower().endswith(('.xlsx', '.xlsm')):
+            linhas = self._linhas_xlsx(arquivo)
+        else:
+            linhas = self._linhas_csv(arquivo, codificacao)
+
+        linhas = iter(linhas)
+        indices = self._indices_colunas(next(linhas, ()))
+        hoje = date.today()
+
+        paineis = {}
+        linhas_no_lote = 0
+        for numero, linha in enumerate(linhas, start=2):
+            if not any(campo not in (None, '') for campo in linha):
+                continue
+            self.linhas_lidas += 1
+            campos = {campo: linha[posicao] if posicao < len(linha) else None for campo, posicao in indices.items()}
+
+            try:
+                email = str(campos['email'] or '').strip().lower()
+                if not email:
+                    raise ValueError('email vazio')
+                marcador = self.resolver_marcador(campos['marcador'])
+                if not marcador:
+                    raise ValueError('marcador vazio')
+                valor = self.converter_unidade(marcador, _converter_numero(campos['valor']), campos.get('unidade'))
+                data_coleta = _converter_data(campos['data_coleta']) if campos.get('data_coleta') else hoje
+            except (ValueError, TypeError) as erro:
+                self._registrar_erro(numero, str(erro))
+                continue
+
+            laboratorio = campos.get('laboratorio') or self.laboratorio
+            chave = (email, data_coleta, normalizar_laboratorio(laboratorio))
+            painel = paineis.get(chave)
+            if painel is None:
+                painel = paineis[chave] = {'laboratorio': laboratorio, 'exames': {}}
+            painel['exames'][marcador] = valor
+
+            linhas_no_lote += 1
+            if linhas_no_lote >= self.tamanho_lote:
+                yield paineis
+                paineis = {}
+                linhas_no_lote = 0
+
+        if paineis:
+            yield paineis
+
+    def relatorio(self):
+        return {
+            'linhas_lidas': self.linhas_lidas,
+            'linhas_invalidas': self.linhas_invalidas,
+            'erros': self.erros
+        }
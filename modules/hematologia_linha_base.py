@@ -0,0 +1,78 @@
+"""
+LINHA DE BASE INDIVIDUAL
+Média e desvio padrão recentes de cada marcador do próprio atleta, mantidos
+incrementalmente a cada novo painel por médias móveis exponenciais: painéis
+antigos perdem peso e a linha de base acompanha mudanças de fase do atleta
+"""
+
+import math
+
+# Painéis anteriores necessários antes de reportar desvios individuais
+AMOSTRA_MINIMA = 3
+
+# |z| a partir do qual a mudança individual é considerada significativa
+LIMIAR_Z = 2.0
+
+# Peso do painel novo na média e na variância exponenciais: memória equivalente a uma
+# janela de 2 / ALFA - 1 = 9 painéis (os primeiros painéis entram com peso 1/n, como
+# numa média simples, até o peso cair a ALFA)
+ALFA_LINHA_BASE = 0.2
+JANELA_EQUIVALENTE = 2 / ALFA_LINHA_BASE - 1
+
+# Piso do desvio padrão (fração da média): variação analítica + biológica mínima,
+# evita z-scores explosivos quando os painéis anteriores são quase idênticos
+CV_MINIMO = 0.05
+
+
+def atualizar_ewma(estado, valor):
+    """
+    Inclui um valor no estado (n, media, variancia) em O(1). Média e variância exponenciais
+    (West, 1979): enquanto 1/n > ALFA_LINHA_BASE o resultado é o da média simples do histórico.
+    """
+    n, media, variancia = estado if estado else (0, 0.0, 0.0)
+    n += 1
+    alfa = max(ALFA_LINHA_BASE, 1 / n)
+    delta = valor - media
+    media += alfa * delta
+    variancia = (1 - alfa) * (variancia + alfa * delta ** 2)
+    return n, media, variancia
+
+
+def atualizar_linha_base(estados, valores):
+    """Novo dicionário marcador -> (n, media, variancia) com o painel incluído, em O(marcadores)"""
+    atualizados = dict(estados)
+    for marcador, valor in valores.items():
+        atualizados[marcador] = atualizar_ewma(estados.get(marcador), valor)
+    return atualizados
+
+
+def desvio_padrao(estado):
+    """Desvio padrão amostral da linha de base (correção n / (n - 1) sobre a janela equivalente)"""
+    n, _, variancia = estado
+    efetivo = min(n, JANELA_EQUIVALENTE)
+    return math.sqrt(variancia * efetivo / (efetivo - 1)) if efetivo > 1 else 0.0
+
+
+def avaliar_desvios(valores, estados):
+    """Compara cada marcador do painel com a linha de base do atleta (antes deste painel)"""
+    desvios = {}
+    for marcador, valor in valores.items():
+        estado = estados.get(marcador)
+        if not estado or estado[0] < AMOSTRA_MINIMA:
+            continue
+
+        n, media, _ = estado
+        desvio = desvio_padrao(estado)
+        desvio_efetivo = max(desvio, abs(media) * CV_MINIMO)
+        z_score = (valor - media) / desvio_efetivo if desvio_efetivo > 0 else 0.0
+
+        desvios[marcador] = {
+            'media_individual': round(media, 2),
+            'desvio_padrao_individual': round(desvio, 2),
+            'paineis_anteriores': n,
+            'variacao_percentual': round((valor - media) / media * 100, 1) if media else None,
+            'z_score_individual': round(z_score, 2),
+            'significativo': abs(z_score) >= LIMIAR_Z
+        }
+
+    return desvios
@@ -0,0 +1,337 @@
+"""
+REFERÊNCIAS HEMATOLÓGICAS
+Tabelas de referência versionadas (modules/dados/referencias_hematologicas.json),
+com intervalos por marcador, sexo e faixa etária resolvidos por busca binária
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from modules.arquivo_versionado import ArquivoVersionado, INTERVALO_VERIFICACAO
+from modules.hematologia_criticos import LimitesCriticos
+
+ARQUIVO_REFERENCIAS = os.path.join(os.path.dirname(__file__), 'dados', 'referencias_hematologicas.json')
+
+# Marcadores cuja referência geral é separada por sexo (ferritina_m/ferritina_f...)
+SUFIXOS_SEXO = {'masculino': '_m', 'feminino': '_f'}
+MARCADORES_SUFIXO_SEXO = ('ferritina', 'hdl')
+
+CAMPOS_LIMITE = ('min', 'max', 'ideal_min', 'ideal_max')
+
+STATUS_ORDEM = np.array(['BAIXO', 'ELEVADO', 'SUBÓTIMO_BAIXO', 'SUBÓTIMO_ALTO', 'IDEAL'])
+
+
+def normalizar_laboratorio(laboratorio):
+    """Nome do laboratório como chave (referências por laboratório, painel por coleta): 'Fleury ' -> 'fleury'"""
+    return (laboratorio or '').strip().lower() or None
+
+
+def converter_idade(idade):
+    """Idade recebida (número ou texto, ex.: '35') -> float; None se inválida (usa a referência não estratificada)"""
+    try:
+        idade = float(idade)
+    except (TypeError, ValueError):
+        return None
+    return idade if 0 <= idade < 150 else None
+
+
+def _rotulo_faixa(inicio, proximo):
+    return f'{inicio}-{proximo - 1}' if proximo is not None else f'{inicio}+'
+
+
+class _FaixasMarcador:
+    """Faixas etárias de um (marcador, sexo): limites ordenados + matriz de limites"""
+
+    __slots__ = ('idades', 'referencias', 'rotulos', 'limites')
+
+    def __init__(self, faixas):
+        faixas = sorted(faixas, key=lambda faixa: faixa['idade_inicial'])
+        self.idades = [faixa['idade_inicial'] for faixa in faixas]
+        self.referencias = [
+            {campo: valor for campo, valor in faixa.items() if campo != 'idade_inicial'}
+            for faixa in faixas
+        ]
+        proximos = self.idades[1:] + [None]
+        self.rotulos = [_rotulo_faixa(inicio, proximo) for inicio, proximo in zip(self.idades, proximos)]
+        for referencia, rotulo in zip(self.referencias, self.rotulos):
+            referencia['faixa_etaria'] = rotulo
+
+        # Uma linha por faixa: min, max, ideal_min, ideal_max
+        self.limites = np.array(
+            [[referencia[campo] for campo in CAMPOS_LIMITE] for referencia in self.referencias],
+            dtype=np.float64
+        )
+
+    def posicao(self, idade):
+        # Idades abaixo da primeira faixa usam a primeira faixa
+        return max(bisect_right(self.idades, idade) - 1, 0)
+
+    def posicoes(self, idades):
+        return np.maximum(np.searchsorted(self.idades, idades, side='right') - 1, 0)
+
+
+class TabelaReferenciasEstratificadas:
+    """
+    Resolve (marcador, sexo, idade) -> intervalo de referência em O(log n)
+    por busca binária nas faixas etárias; oferece caminho vetorizado para lotes
+    """
+
+    def __init__(self, faixas_etarias):
+        self.tabela = {
+            (marcador, sexo): _FaixasMarcador(faixas)
+            for marcador, por_sexo in faixas_etarias.items()
+            for sexo, faixas in por_sexo.items()
+        }
+        self.marcadores = {marcador for marcador, _ in self.tabela}
+
+    def _faixas(self, marcador, sexo):
+        return self.tabela.get((marcador, sexo)) or self.tabela.get((marcador, 'geral'))
+
+    def __contains__(self, marcador):
+        return marcador in self.marcadores
+
+    def resolver(self, marcador, sexo, idade):
+        """Referência da faixa etária correspondente ou None se não estratificado"""
+        faixas = self._faixas(marcador, sexo)
+        if faixas is None or idade is None:
+            return None
+        return faixas.referencias[faixas.posicao(idade)]
+
+    def resolver_lote(self, marcador, sexos, idades):
+        """
+        Limites (n x 4: min, max, ideal_min, ideal_max) para arrays de sexo e idade;
+        linhas sem referência estratificada ficam com NaN
+        """
+        sexos = np.asarray(sexos)
+        idades = np.asarray(idades, dtype=np.float64)
+        limites = np.full((len(idades), len(CAMPOS_LIMITE)), np.nan)
+
+        for sexo in np.unique(sexos):
+            faixas = self._faixas(marcador, sexo)
+            if faixas is None:
+                continue
+            mascara = sexos == sexo
+            limites[mascara] = faixas.limites[faixas.posicoes(idades[mascara])]
+
+        return limites
+
+    def classificar_lote(self, marcador, valores, sexos, idades):
+        """Status (BAIXO...IDEAL) para um lote de valores; None quando sem referência"""
+        valores = np.asarray(valores, dtype=np.float64)
+        limites = self.resolver_lote(marcador, sexos, idades)
+        minimo, maximo, ideal_min, ideal_max = limites.T
+
+        indice = np.select(
+            [valores < minimo, valores > maximo, valores < ideal_min, valores > ideal_max],
+            [0, 1, 2, 3],
+            default=4
+        )
+        status = STATUS_ORDEM[indice].astype(object)
+        status[np.isnan(minimo)] = None
+        return status
+
+
+class TabelasReferencia:
+    """Versão compilada e imutável das tabelas de referência"""
+
+    def __init__(self, conteudo):
+        self.versao = conteudo['versao']
+        self.valores_referencia = conteudo['valores_referencia']
+        self.interpretacoes_clinicas = conteudo['interpretacoes_clinicas']
+        self.estratificadas = TabelaReferenciasEstratificadas(conteudo.get('faixas_etarias', {}))
+
+        # Referência fixa achatada por sexo: sexo -> marcador -> referência (consulta O(1))
+        geral = self.valores_referencia['geral']
+        self.por_sexo = {}
+        for sexo, sufixo in SUFIXOS_SEXO.items():
+            tabela = dict(geral)
+            for marcador in MARCADORES_SUFIXO_SEXO:
+                if marcador + sufixo in geral:
+                    tabela.setdefault(marcador, geral[marcador + sufixo])
+            tabela.update(self.valores_referencia.get(sexo, {}))
+            self.por_sexo[sexo] = tabela
+
+        self.definicoes_criticas = conteudo.get('valores_criticos', {})
+        self.criticos = LimitesCriticos(self.definicoes_criticas, self.por_sexo)
+        self.plano = self.achatar()
+
+    def achatar(self, sobreposicoes=()):
+        """
+        Tabela única por sexo: marcador -> referência fixa ou (faixas etárias, referência fixa).
+        Sobreposições (laboratório, depois coach) substituem a entrada inteira do marcador.
+        """
+        plano = {}
+        for sexo in (*SUFIXOS_SEXO, 'geral'):
+            fixas = self.por_sexo.get(sexo, self.valores_referencia['geral'])
+            tabela = dict(fixas)
+            for marcador in self.estratificadas.marcadores:
+                faixas = self.estratificadas._faixas(marcador, sexo)
+                if faixas is not None:
+                    tabela[marcador] = (faixas, fixas.get(marcador))
+            for sobreposicao in sobreposicoes:
+                if sobreposicao.get('sexo') in (None, sexo):
+                    marcador = sobreposicao['marcador']
+                    referencia = _mesclar_sobreposicao(fixas.get(marcador), sobreposicao)
+                    # Sem referência fixa para completar, a sobreposição precisa trazer min e max
+                    if referencia.get('min') is not None and referencia.get('max') is not None:
+                        tabela[marcador] = referencia
+            plano[sexo] = tabela
+        return plano
+
+    def referencia_fixa(self, marcador, sexo):
+        """Referência por sexo ou geral, sem estratificação etária"""
+        return self.por_sexo.get(sexo, self.valores_referencia['geral']).get(marcador)
+
+    def resolver(self, marcador, sexo, idade):
+        """Faixa etária, depois tabela por sexo e por fim a geral"""
+        return _resolver_no_plano(self.plano, marcador, sexo, idade)
+
+
+def _mesclar_sobreposicao(base, sobreposicao):
+    """
+    Referência sobreposta; campos não informados vêm da referência fixa. A faixa ideal
+    herdada é limitada à faixa sobreposta (ex.: laboratório com limite superior menor)
+    """
+    referencia = dict(base or {'unidade': ''})
+    for campo in (*CAMPOS_LIMITE, 'unidade'):
+        if sobreposicao.get(campo) is not None:
+            referencia[campo] = sobreposicao[campo]
+    if 'ideal_min' not in referencia:
+        referencia['ideal_min'] = referencia.get('min')
+    if 'ideal_max' not in referencia:
+        referencia['ideal_max'] = referencia.get('max')
+    minimo, maximo = referencia.get('min'), referencia.get('max')
+    for campo in ('ideal_min', 'ideal_max'):
+        if sobreposicao.get(campo) is None and referencia[campo] is not None:
+            if minimo is not None and referencia[campo] < minimo:
+                referencia[campo] = minimo
+            if maximo is not None and referencia[campo] > maximo:
+                referencia[campo] = maximo
+    referencia['origem'] = sobreposicao['escopo']
+    return referencia
+
+
+def validar_sobreposicao(tabelas, sobreposicao):
+    """
+    Mensagem de erro quando a referência resultante (sobreposição completada pela referência
+    fixa de cada sexo a que se aplica) não respeita min <= ideal_min <= ideal_max <= max
+    """
+    for sexo in ([sobreposicao['sexo']] if sobreposicao.get('sexo') else SUFIXOS_SEXO):
+        referencia = _mesclar_sobreposicao(tabelas.referencia_fixa(sobreposicao['marcador'], sexo), sobreposicao)
+        limites = [referencia.get(campo) for campo in CAMPOS_LIMITE]
+        ordenados = [limites[0], limites[2], limites[3], limites[1]]
+        presentes = [valor for valor in ordenados if valor is not None]
+        if any(anterior > seguinte for anterior, seguinte in zip(presentes, presentes[1:])):
+            return (f"Limites inconsistentes para {sobreposicao['marcador']} ({sexo}): "
+                    f"min={limites[0]}, ideal_min={limites[2]}, ideal_max={limites[3]}, max={limites[1]} "
+                    f"(esperado min <= ideal_min <= ideal_max <= max)")
+    return None
+
+
+def _fixas_do_plano(plano):
+    """Referência fixa por sexo a partir da tabela achatada (sobreposições já aplicadas)"""
+    return {
+        sexo: {marcador: entrada[1] if type(entrada) is tuple else entrada
+               for marcador, entrada in plano[sexo].items()
+               if (entrada[1] if type(entrada) is tuple else entrada) is not None}
+        for sexo in SUFIXOS_SEXO
+    }
+
+
+def _resolver_no_plano(plano, marcador, sexo, idade):
+    entrada = plano.get(sexo, plano['geral']).get(marcador)
+    if type(entrada) is tuple:
+        faixas, fixa = entrada
+        if idade is None:
+            return fixa
+        return faixas.referencias[faixas.posicao(idade)]
+    return entrada
+
+
+class ReferenciasEmCamadas:
+    """
+    Resolução em camadas para um (coach, laboratório):
+    coach -> laboratório -> sexo/faixa etária -> geral, achatada em uma única tabela.
+    Limites críticos relativos (fator x limite superior) usam o limite superior sobreposto;
+    os absolutos (ex.: potássio, sódio) são clínicos e valem para todos.
+    """
+
+    def __init__(self, tabelas, sobreposicoes_laboratorio=(), sobreposicoes_coach=()):
+        self.tabelas = tabelas
+        self.versao = tabelas.versao
+        self.total_sobreposicoes = len(sobreposicoes_laboratorio) + len(sobreposicoes_coach)
+        # A camada do coach é aplicada por último e prevalece
+        self.plano = tabelas.achatar([*sobreposicoes_laboratorio, *sobreposicoes_coach])
+        self.criticos = LimitesCriticos(tabelas.definicoes_criticas, _fixas_do_plano(self.plano)) \
+            if self.total_sobreposicoes else tabelas.criticos
+
+    def referencia_fixa(self, marcador, sexo):
+        return self.tabelas.referencia_fixa(marcador, sexo)
+
+    def resolver(self, marcador, sexo, idade):
+        return _resolver_no_plano(self.plano, marcador, sexo, idade)
+
+
+class _EntradaCache:
+    __slots__ = ('camadas', 'tabelas', 'impressao', 'valida_ate')
+
+    def __init__(self, camadas, impressao, valida_ate):
+        self.camadas = camadas
+        # Tabelas base usadas: o arquivo recarregado gera outro objeto mesmo sem mudar 'versao'
+        self.tabelas = camadas.tabelas
+        self.impressao = impressao
+        self.valida_ate = valida_ate
+
+
+class CacheReferenciasCamadas:
+    """
+    Tabelas em camadas por (coach, laboratório), reconstruídas apenas quando uma
+    sobreposição muda (impressão diferente, invalidação explícita) ou quando as
+    tabelas base são recarregadas. A impressão é conferida no máximo uma vez por intervalo.
+    """
+
+    def __init__(self, intervalo=INTERVALO_VERIFICACAO):
+        self.intervalo = intervalo
+        self.entradas = {}
+        self._lock = threading.Lock()
+
+    def obter(self, coach_id, laboratorio, tabelas, impressao, carregar):
+        """
+        impressao() devolve um valor que muda quando as sobreposições mudam;
+        carregar() devolve (sobreposicoes_laboratorio, sobreposicoes_coach)
+        """
+        chave = (coach_id, laboratorio)
+        agora = time.monotonic()
+        entrada = self.entradas.get(chave)
+        if entrada is not None and entrada.tabelas is tabelas and agora < entrada.valida_ate:
+            return entrada.camadas
+
+        marca = impressao()
+        if entrada is not None and entrada.tabelas is tabelas and entrada.impressao == marca:
+            entrada.valida_ate = agora + self.intervalo
+            return entrada.camadas
+
+        camadas = ReferenciasEmCamadas(tabelas, *carregar())
+        with self._lock:
+            self.entradas[chave] = _EntradaCache(camadas, marca, agora + self.intervalo)
+        return camadas
+
+    def invalidar(self, coach_id=None, laboratorio=None):
+        """Descarta as combinações afetadas pela alteração de uma sobreposição"""
+        with self._lock:
+            for chave in list(self.entradas):
+                if (coach_id is not None and chave[0] == coach_id) or \
+                   (laboratorio is not None and chave[1] == laboratorio):
+                    del self.entradas[chave]
+
+
+_arquivo_referencias = ArquivoVersionado(ARQUIVO_REFERENCIAS, TabelasReferencia)
+
+
+def obter_tabelas_referencia():
+    """Tabelas vigentes (recarregadas automaticamente quando o arquivo muda)"""
+    return _arquivo_referencias.obter()
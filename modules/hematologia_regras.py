@@ -0,0 +1,147 @@
+"""
+MOTOR DE REGRAS CLÍNICAS
+Correlações e padrões patológicos declarados em tabela e compilados uma única vez
+"""
+
+import operator
+import os
+
+from modules.arquivo_versionado import ArquivoVersionado
+
+ARQUIVO_REGRAS = os.path.join(os.path.dirname(__file__), 'dados', 'regras_clinicas.json')
+
+OPERADORES = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+CATEGORIAS = ('correlacao', 'padrao')
+
+
+def normalizar_marcador(marcador):
+    """Normaliza o nome do marcador para a chave canônica usada nas tabelas"""
+    return marcador.lower().replace(' ', '_').replace('-', '_')
+
+
+def _compilar_condicao(marcador, simbolo, limiar):
+    """Compila uma condição declarativa em closure (valores, sexo) -> bool"""
+    if simbolo not in OPERADORES:
+        raise ValueError(f'Operador desconhecido na regra: {simbolo}')
+    comparar = OPERADORES[simbolo]
+
+    # Limiares por sexo: condição é falsa quando o sexo não tem limiar definido
+    if isinstance(limiar, dict):
+        def condicao(valores, sexo):
+            return sexo in limiar and comparar(valores[marcador], limiar[sexo])
+    else:
+        def condicao(valores, sexo):
+            return comparar(valores[marcador], limiar)
+
+    return condicao
+
+
+class RegraCompilada:
+    """Regra clínica com condições já compiladas em closures"""
+
+    __slots__ = ('id', 'categoria', 'marcadores', 'condicoes', 'minimo_criterios', 'necessarios', 'definicao')
+
+    def __init__(self, definicao):
+        self.id = definicao['id']
+        self.categoria = definicao['categoria']
+        if self.categoria not in CATEGORIAS:
+            raise ValueError(f'Categoria inválida na regra {self.id}: {self.categoria}')
+
+        self.marcadores = tuple(normalizar_marcador(m) for m in definicao['marcadores'])
+        self.condicoes = tuple(
+            (normalizar_marcador(marcador), _compilar_condicao(normalizar_marcador(marcador), simbolo, limiar))
+            for marcador, simbolo, limiar in definicao['condicoes']
+        )
+        self.minimo_criterios = definicao.get('minimo_criterios')
+
+        fora_da_regra = {marcador for marcador, _ in self.condicoes} - set(self.marcadores)
+        if fora_da_regra:
+            raise ValueError(f'Regra {self.id} usa marcadores não declarados: {sorted(fora_da_regra)}')
+
+        # Quantos marcadores da regra precisam estar no painel para valer avaliá-la
+        self.necessarios = self.minimo_criterios or len(self.marcadores)
+        self.definicao = definicao
+
+    def avaliar(self, valores, sexo):
+        """Avalia a regra; retorna o achado formatado ou None"""
+        if self.minimo_criterios:
+            criterios = sum(
+                1 for marcador, condicao in self.condicoes
+                if marcador in valores and condicao(valores, sexo)
+            )
+            if criterios < self.minimo_criterios:
+                return None
+        else:
+            if not all(condicao(valores, sexo) for _, condicao in self.condicoes):
+                return None
+            criterios = len(self.condicoes)
+
+        if self.categoria == 'correlacao':
+            return {
+                'tipo': self.definicao['nome'],
+                'marcadores': list(self.definicao['marcadores']),
+                'interpretacao': self.definicao['interpretacao'],
+                'severidade': self.definicao['severidade']
+            }
+
+        return {
+            'padrao': self.definicao['nome'],
+            'criterios_presentes': self.definicao.get('criterios_presentes', criterios),
+            'risco': self.definicao['severidade'],
+            'recomendacao': self.definicao['recomendacao']
+        }
+
+
+class MotorRegrasClinicas:
+    """
+    Avalia regras clínicas usando um índice invertido marcador -> regras,
+    de modo que apenas regras cujos marcadores estão no painel sejam avaliadas
+    """
+
+    def __init__(self, definicoes, versao=None):
+        self.versao = versao
+        self.regras = [RegraCompilada(definicao) for definicao in definicoes]
+
+        self.indice = {}
+        for posicao, regra in enumerate(self.regras):
+            for marcador in set(regra.marcadores):
+                self.indice.setdefault(marcador, []).append(posicao)
+
+    @classmethod
+    def compilar(cls, tabela):
+        """Compila a tabela de regras lida do arquivo de dados"""
+        return cls(tabela['regras'], versao=tabela.get('versao'))
+
+    def avaliar(self, valores, sexo):
+        """Retorna os achados agrupados por categoria, na ordem da tabela"""
+        contagem = {}
+        for marcador in valores:
+            for posicao in self.indice.get(marcador, ()):
+                contagem[posicao] = contagem.get(posicao, 0) + 1
+
+        achados = {categoria: [] for categoria in CATEGORIAS}
+        for posicao in sorted(contagem):
+            regra = self.regras[posicao]
+            if contagem[posicao] < regra.necessarios:
+                continue
+            achado = regra.avaliar(valores, sexo)
+            if achado:
+                achados[regra.categoria].append(achado)
+
+        return achados
+
+
+_arquivo_regras = ArquivoVersionado(ARQUIVO_REGRAS, MotorRegrasClinicas.compilar)
+
+
+def obter_motor_regras():
+    """Motor compilado vigente (recompilado apenas quando o arquivo de regras muda)"""
+    return _arquivo_regras.obter()
@@ -0,0 +1,313 @@
+"""
+BASE DE COMPOSIÇÃO DE ALIMENTOS
+Tabela de composição (formato TACO, por 100 g) compilada em arrays colunares
+float32 e mapeada em memória, compartilhada pelos workers
+"""
+
+import csv
+import hashlib
+import json
+import os
+import unicodedata
+
+import numpy as np
+
+DIRETORIO_DADOS = os.path.join(os.path.dirname(__file__), 'dados')
+ARQUIVO_ALIMENTOS = os.path.join(DIRETORIO_DADOS, 'alimentos_taco.csv')
+
+# Artefatos compilados (gerados na primeira execução, fora do controle de versão)
+DIRETORIO_COMPILADO = os.path.join(DIRETORIO_DADOS, 'compilado')
+
+COLUNAS_DESCRITIVAS = ('id', 'nome', 'categoria', 'refeicoes', 'contem', 'embalagem_g')
+
+# Refeições em que o alimento costuma aparecer (bits da coluna refeicoes)
+REFEICOES_ALIMENTOS = ('cafe', 'lanche', 'almoco', 'jantar', 'pre_treino', 'pos_treino', 'ceia')
+
+# Componentes relevantes para alergias e restrições (bits da coluna contem)
+COMPONENTES_RESTRICAO = (
+    'carne', 'peixe', 'frutos_mar', 'ovo', 'leite', 'lactose', 'gluten',
+    'amendoim', 'oleaginosas', 'soja', 'gergelim'
+)
+
+ATRIBUTOS = np.dtype([
+    ('categoria', 'u1'),
+    ('refeicoes', '<u2'),
+    ('contem', '<u2'),
+    ('embalagem_g', '<f4')
+])
+
+
+def normalizar_nome_alimento(nome):
+    """Minúsculas, sem acentos e com espaços simples"""
+    sem_acentos = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acentos.lower().replace('-', ' ').replace('_', ' ').split())
+
+
+def mascara_bits(nomes, vocabulario):
+    """Bits de um conjunto de nomes dentro do vocabulário; nomes desconhecidos são um erro"""
+    mascara = 0
+    for nome in nomes:
+        if nome not in vocabulario:
+            raise ValueError(f'Valor desconhecido: {nome}')
+        mascara |= 1 << vocabulario.index(nome)
+    return mascara
+
+
+def _gravar_atomico(caminho, gravar):
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        gravar(arquivo)
+    os.replace(temporario, caminho)
+
+
+def compilar_base(caminho_fonte, destino):
+    """
+    Converte o CSV em: matriz (nutrientes x alimentos) float32, atributos por alimento
+    e um índice JSON com ids, nomes e vocabulários. O JSON é gravado por último e marca
+    a compilação como completa.
+    """
+    with open(caminho_fonte, encoding='utf-8', newline='') as arquivo:
+        leitor = csv.reader(arquivo, delimiter=';')
+        cabecalho = next(leitor)
+        linhas = [linha for linha in leitor if linha]
+
+    if tuple(cabecalho[:len(COLUNAS_DESCRITIVAS)]) != COLUNAS_DESCRITIVAS:
+        raise ValueError('Cabeçalho da tabela de alimentos fora do formato esperado')
+    nutrientes = cabecalho[len(COLUNAS_DESCRITIVAS):]
+
+    ids = [linha[0] for linha in linhas]
+    if len(set(ids)) != len(ids):
+        raise ValueError('Ids de alimentos duplicados na tabela de composição')
+
+    categorias = sorted({linha[2] for linha in linhas})
+    atributos = np.empty(len(linhas), dtype=ATRIBUTOS)
+    atributos['categoria'] = [categorias.index(linha[2]) for linha in linhas]
+    atributos['refeicoes'] = [mascara_bits(filter(None, linha[3].split('|')), REFEICOES_ALIMENTOS) for linha in linhas]
+    atributos['contem'] = [mascara_bits(filter(None, linha[4].split('|')), COMPONENTES_RESTRICAO) for linha in linhas]
+    atributos['embalagem_g'] = [float(linha[5] or 0) for linha in linhas]
+
+    # Colunar: cada nutriente é uma linha contígua com todos os alimentos
+    matriz = np.array(
+        [[float(valor or 0) for valor in linha[len(COLUNAS_DESCRITIVAS):]] for linha in linhas],
+        dtype=np.float32
+    ).T.copy()
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    _gravar_atomico(f'{destino}.npy', lambda arquivo: np.save(arquivo, matriz))
+    _gravar_atomico(f'{destino}_atributos.npy', lambda arquivo: np.save(arquivo, atributos))
+    indice = {
+        'nutrientes': nutrientes,
+        'ids': ids,
+        'nomes': [linha[1] for linha in linhas],
+        'categorias': categorias
+    }
+    _gravar_atomico(f'{destino}.json', lambda arquivo: arquivo.write(json.dumps(indice, ensure_ascii=False).encode('utf-8')))
+
+
+class BaseAlimentos:
+    """
+    Composição por 100 g em memória mapeada. A compilação é identificada pelo hash do CSV:
+    workers e reinícios reaproveitam o mesmo arquivo e o sistema operacional compartilha as páginas.
+    """
+
+    def __init__(self, caminho_fonte=ARQUIVO_ALIMENTOS, diretorio=DIRETORIO_COMPILADO):
+        with open(caminho_fonte, 'rb') as arquivo:
+            self.versao = hashlib.sha1(arquivo.read()).hexdigest()[:16]
+        destino = os.path.join(diretorio, f'alimentos_{self.versao}')
+        if not os.path.exists(f'{destino}.json'):
+            compilar_base(caminho_fonte, destino)
+
+        with open(f'{destino}.json', encoding='utf-8') as arquivo:
+            indice = json.load(arquivo)
+        self.matriz = np.load(f'{destino}.npy', mmap_mode='r')
+        self.atributos = np.load(f'{destino}_atributos.npy', mmap_mode='r')
+
+        self.nutrientes = indice['nutrientes']
+        self.ids = indice['ids']
+        self.nomes = indice['nomes']
+        self.categorias = indice['categorias']
+        self.posicao_nutriente = {nutriente: posicao for posicao, nutriente in enumerate(self.nutrientes)}
+        self.posicao_categoria = {categoria: posicao for posicao, categoria in enumerate(self.categorias)}
+
+        self.indice = {id_alimento: posicao for posicao, id_alimento in enumerate(self.ids)}
+        for posicao, nome in enumerate(self.nomes):
+            self.indice.setdefault(normalizar_nome_alimento(nome), posicao)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, alimento):
+        return self.posicao(alimento) is not None
+
+    def posicao(self, alimento):
+        """Posição do alimento pelo id ('batata_doce') ou pelo nome ('Batata-doce cozida')"""
+        posicao = self.indice.get(alimento)
+        if posicao is None:
+            posicao = self.indice.get(normalizar_nome_alimento(alimento))
+        return posicao
+
+    def posicoes(self, alimentos):
+        posicoes = [self.posicao(alimento) for alimento in alimentos]
+        desconhecidos = [alimento for alimento, posicao in zip(alimentos, posicoes) if posicao is None]
+        if desconhecidos:
+            raise KeyError(f'Alimentos não encontrados: {", ".join(desconhecidos)}')
+        return np.array(posicoes, dtype=np.int64)
+
+    def coluna(self, nutriente):
+        """Valores por 100 g de um nutriente para todos os alimentos"""
+        return self.matriz[self.posicao_nutriente[nutriente]]
+
+    def _linhas_nutrientes(self, nutrientes):
+        if nutrientes is None:
+            return self.matriz
+        return self.matriz[[self.posicao_nutriente[nutriente] for nutriente in nutrientes]]
+
+    def composicao(self, posicoes, gramas=100.0, nutrientes=None):
+        """Matriz (alimentos x nutrientes) para as quantidades informadas"""
+        fator = np.asarray(gramas, dtype=np.float32) / 100
+        return self._linhas_nutrientes(nutrientes)[:, posicoes].T * np.reshape(fator, (-1, 1))
+
+    def totais(self, posicoes, gramas, nutrientes=None):
+        """Soma dos nutrientes de uma lista de (alimento, gramas), em um único produto matricial"""
+        return self._linhas_nutrientes(nutrientes)[:, posicoes] @ (np.asarray(gramas, dtype=np.float32) / 100)
+
+    def filtrar(self, categorias=None, refeicao=None, excluir_componentes=()):
+        """Posições dos alimentos por categoria, refeição e componentes a evitar"""
+        mascara = np.ones(len(self), dtype=bool)
+        if categorias:
+            codigos = [self.posicao_categoria[categoria] for categoria in categorias if categoria in self.posicao_categoria]
+            mascara &= np.isin(self.atributos['categoria'], codigos)
+        if refeicao:
+            mascara &= (self.atributos['refeicoes'] & mascara_bits([refeicao], REFEICOES_ALIMENTOS)) != 0
+        if excluir_componentes:
+            mascara &= (self.atributos['contem'] & mascara_bits(excluir_componentes, COMPONENTES_RESTRICAO)) == 0
+        return np.flatnonzero(mascara)
+
+    def alimento(self, posicao):
+        """Descrição e composição por 100 g de um alimento"""
+        atributos = self.atributos[posicao]
+        return {
+            'id': self.ids[posicao],
+            'nome': self.nomes[posicao],
+            'categoria': self.categorias[atributos['categoria']],
+            'refeicoes': [nome for bit, nome in enumerate(REFEICOES_ALIMENTOS) if atributos['refeicoes'] >> bit & 1],
+            'contem': [nome for bit, nome in enumerate(COMPONENTES_RESTRICAO) if atributos['contem'] >> bit & 1],
+            'embalagem_g': float(atributos['embalagem_g']),
+            'por_100g': {
+                nutriente: round(float(valor), 2)
+                for nutriente, valor in zip(self.nutrientes, self.matriz[:, posicao])
+            }
+        }
+
+
+_base_padrao = None
+
+
+def obter_base_alimentos():
+    global _base_padrao
+    if _base_padrao is None:
+        _base_padrao = BaseAlimentos()
+    return _base_padrao
+
+
+# Restrições declaradas no perfil (alergias_restricoes) -> componentes a evitar
+COMPONENTES_POR_RESTRICAO = {
+    'vegetariano': ('carne', 'peixe', 'frutos_mar'),
+    'vegano': ('carne', 'peixe', 'frutos_mar', 'ovo', 'leite', 'lactose'),
+    'pescetariano': ('carne',),
+    'carne': ('carne',),
+    'lactose': ('lactose',),
+    'intolerancia_lactose': ('lactose',),
+    'leite': ('leite', 'lactose'),
+    'aplv': ('leite', 'lactose'),
+    'laticinios': ('leite', 'lactose'),
+    'gluten': ('gluten',),
+    'trigo': ('gluten',),
+    'celiaco': ('gluten',),
+    'doenca_celiaca': ('gluten',),
+    'amendoim': ('amendoim',),
+    'oleaginosas': ('oleaginosas',),
+    'castanhas': ('oleaginosas',),
+    'nozes': ('oleaginosas',),
+    'soja': ('soja',),
+    'ovo': ('ovo',),
+    'peixe': ('peixe',),
+    'frutos_mar': ('frutos_mar',),
+    'crustaceos': ('frutos_mar',),
+    'mariscos': ('frutos_mar',),
+    'camarao': ('frutos_mar',),
+    'gergelim': ('gergelim',)
+}
+
+# Grafias alternativas, plurais e femininos -> chave de COMPONENTES_POR_RESTRICAO
+SINONIMOS_RESTRICAO = {
+    'vegetariana': 'vegetariano',
+    'vegana': 'vegano',
+    'vegan': 'vegano',
+    'pescetariana': 'pescetariano',
+    'pescatariano': 'pescetariano',
+    'pescatariana': 'pescetariano',
+    'carnes': 'carne',
+    'lacteos': 'laticinios',
+    'derivados_leite': 'laticinios',
+    'proteina_leite': 'aplv',
+    'leite_vaca': 'aplv',
+    'celiaca': 'celiaco',
+    'amendoins': 'amendoim',
+    'castanha': 'castanhas',
+    'oleaginosa': 'oleaginosas',
+    'noz': 'nozes',
+    'ovos': 'ovo',
+    'peixes': 'peixe',
+    'crustaceo': 'crustaceos',
+    'marisco': 'mariscos',
+    'camaroes': 'camarao',
+    'sesamo': 'gergelim'
+}
+
+# Prefixos em texto livre ('alergia a ovo', 'sem glúten', 'intolerância à lactose'), já sem as preposições
+PREFIXOS_RESTRICAO = ('alergia_', 'alergico_', 'alergica_', 'intolerancia_', 'intolerante_', 'sem_')
+
+PREPOSICOES = {'a', 'ao', 'de', 'do', 'da'}
+
+# Entradas que significam 'nenhuma restrição'
+SEM_RESTRICAO = {'', 'nenhuma', 'nenhum', 'nada', 'nao', 'n/a', 'na'}
+
+
+def _chave_restricao(chave):
+    """Chave de COMPONENTES_POR_RESTRICAO para uma restrição normalizada (None se desconhecida)"""
+    if chave in COMPONENTES_POR_RESTRICAO:
+        return chave
+    if chave in SINONIMOS_RESTRICAO:
+        return SINONIMOS_RESTRICAO[chave]
+    for prefixo in PREFIXOS_RESTRICAO:
+        if chave.startswith(prefixo):
+            encontrada = _chave_restricao(chave[len(prefixo):])
+            if encontrada:
+                return encontrada
+    return None
+
+
+def interpretar_restricoes(restricoes):
+    """
+    Alergias/restrições em texto livre (lista ou 'a, b') -> (componentes a evitar,
+    restrições não reconhecidas). As não reconhecidas não excluem nada e devem ser sinalizadas.
+    """
+    if isinstance(restricoes, str):
+        restricoes = restricoes.split(',')
+    componentes, nao_reconhecidas = set(), []
+    for restricao in restricoes or ():
+        chave = '_'.join(parte for parte in normalizar_nome_alimento(restricao).split() if parte not in PREPOSICOES)
+        if chave in SEM_RESTRICAO:
+            continue
+        encontrada = _chave_restricao(chave)
+        if encontrada is None:
+            nao_reconhecidas.append(restricao.strip())
+        else:
+            componentes.update(COMPONENTES_POR_RESTRICAO[encontrada])
+    return tuple(sorted(componentes)), nao_reconhecidas
+
+
+def componentes_excluidos(restricoes):
+    """Componentes a evitar a partir de alergias/restrições em texto livre (lista ou 'a, b')"""
+    return interpretar_restricoes(restricoes)[0]
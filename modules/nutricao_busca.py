@@ -0,0 +1,159 @@
+"""
+BUSCA DE ALIMENTOS
+Índice de trigramas em memória sobre os nomes da base de alimentos (sem acentos):
+tolera grafias alternativas e erros de digitação ("bata doce" -> "Batata-doce cozida")
+e atende tanto o autocompletar quanto a resolução de nomes em importações
+"""
+
+import numpy as np
+
+from modules.nutricao_alimentos import normalizar_nome_alimento, obter_base_alimentos
+
+LIMITE_PADRAO = 10
+
+# Similaridade mínima para aceitar um nome como o alimento importado
+SIMILARIDADE_MINIMA_RESOLUCAO = 0.6
+
+# Nome aproximado que passa do mínimo por menos que isso, ou quase empatado com o segundo
+# alimento, é ambíguo ("frango", "banana"): a resolução exige o id ou o nome exato
+MARGEM_CONFIRMACAO = 0.1
+MARGEM_AMBIGUIDADE = 0.05
+
+# Bônus de similaridade quando as palavras digitadas iniciam palavras do nome
+BONUS_PREFIXO = 0.15
+
+# Candidatos reordenados pelo bônus de prefixo, por resultado pedido
+FATOR_CANDIDATOS = 4
+
+
+def trigramas(texto, prefixo=False):
+    """
+    Trigramas das palavras com bordas marcadas por espaço. Com prefixo, a última
+    palavra fica sem a borda final (ainda está sendo digitada).
+    """
+    palavras = texto.split()
+    resultado = set()
+    for posicao, palavra in enumerate(palavras):
+        marcada = f' {palavra}' if prefixo and posicao == len(palavras) - 1 else f' {palavra} '
+        resultado.update(marcada[inicio:inicio + 3] for inicio in range(len(marcada) - 2))
+    return resultado
+
+
+class IndiceBuscaAlimentos:
+    """Listas invertidas trigrama -> alimentos em arrays contíguos (formato CSR)"""
+
+    def __init__(self, base=None):
+        self.base = base or obter_base_alimentos()
+        self.nomes_normalizados = [normalizar_nome_alimento(nome) for nome in self.base.nomes]
+        self.palavras = [nome.split() for nome in self.nomes_normalizados]
+
+        listas = {}
+        for posicao, nome in enumerate(self.nomes_normalizados):
+            for trigrama in trigramas(nome):
+                listas.setdefault(trigrama, []).append(posicao)
+
+        self.vocabulario = {trigrama: indice for indice, trigrama in enumerate(listas)}
+        tamanhos = np.array([len(alimentos) for alimentos in listas.values()], dtype=np.int64)
+        self.inicios = np.concatenate(([0], np.cumsum(tamanhos)))
+        self.alimentos = np.fromiter(
+            (posicao for alimentos in listas.values() for posicao in alimentos),
+            dtype=np.int32, count=int(tamanhos.sum())
+        )
+        self.trigramas_por_alimento = np.bincount(self.alimentos, minlength=len(self.base)).astype(np.float64)
+
+    def _bonus_prefixo(self, palavras_busca, posicao):
+        """Fração das palavras digitadas que iniciam alguma palavra do nome"""
+        palavras_nome = self.palavras[posicao]
+        encontradas = sum(
+            any(palavra_nome.startswith(palavra) for palavra_nome in palavras_nome)
+            for palavra in palavras_busca
+        )
+        return BONUS_PREFIXO * encontradas / len(palavras_busca)
+
+    def buscar(self, texto, limite=LIMITE_PADRAO, categorias=None):
+        """
+        Alimentos mais parecidos com o texto (coeficiente de Dice entre os trigramas,
+        com bônus para prefixos de palavras). Retorna lista de (posição, similaridade).
+        """
+        consulta = normalizar_nome_alimento(texto or '')
+        if not consulta:
+            return []
+        indices = [self.vocabulario[trigrama] for trigrama in trigramas(consulta, prefixo=True)
+                   if trigrama in self.vocabulario]
+        if not indices:
+            return []
+
+        # Trigramas em comum com cada alimento: contagem das listas invertidas concatenadas
+        postagens = np.concatenate([self.alimentos[self.inicios[indice]:self.inicios[indice + 1]] for indice in indices])
+        comuns = np.bincount(postagens, minlength=len(self.base))
+        if categorias:
+            permitidos = np.zeros(len(self.base), dtype=bool)
+            permitidos[self.base.filtrar(categorias=categorias)] = True
+            comuns[~permitidos] = 0
+
+        candidatos = np.flatnonzero(comuns)
+        total_consulta = len(trigramas(consulta, prefixo=True))
+        similaridade = 2 * comuns[candidatos] / (total_consulta + self.trigramas_por_alimento[candidatos])
+
+        quantidade = min(len(candidatos), limite * FATOR_CANDIDATOS)
+        if quantidade < len(candidatos):
+            melhores = np.argpartition(-similaridade, quantidade - 1)[:quantidade]
+            candidatos, similaridade = candidatos[melhores], similaridade[melhores]
+
+        palavras_busca = consulta.split()
+        pontuados = [
+            (int(posicao), min(1.0, float(valor) + self._bonus_prefixo(palavras_busca, posicao)))
+            for posicao, valor in zip(candidatos, similaridade)
+        ]
+        pontuados.sort(key=lambda item: (-item[1], len(self.nomes_normalizados[item[0]])))
+        return pontuados[:limite]
+
+    def resolver(self, nome, similaridade_minima=SIMILARIDADE_MINIMA_RESOLUCAO):
+        """
+        Posição do alimento pelo id/nome exato ou, na falta dele, pelo nome mais parecido,
+        desde que folgadamente acima do mínimo e sem empate com outro alimento
+        """
+        posicao = self.base.posicao(nome)
+        if posicao is not None:
+            return posicao
+        encontrados = self.buscar(nome, limite=2)
+        if not encontrados or encontrados[0][1] < similaridade_minima + MARGEM_CONFIRMACAO:
+            return None
+        if len(encontrados) > 1 and encontrados[0][1] - encontrados[1][1] < MARGEM_AMBIGUIDADE:
+            return None
+        return encontrados[0][0]
+
+    def resolver_lista(self, nomes, similaridade_minima=SIMILARIDADE_MINIMA_RESOLUCAO):
+        """Posições de uma lista de nomes; nomes não resolvidos voltam com sugestões"""
+        posicoes = {}
+        nao_encontrados = {}
+        for nome in nomes:
+            posicao = self.resolver(nome, similaridade_minima)
+            if posicao is None:
+                nao_encontrados[nome] = [self.base.nomes[sugestao] for sugestao, _ in self.buscar(nome, limite=3)]
+            else:
+                posicoes[nome] = posicao
+        return posicoes, nao_encontrados
+
+    def sugestoes(self, texto, limite=LIMITE_PADRAO, categorias=None):
+        """Resultados da busca prontos para o autocompletar"""
+        return [
+            {
+                'id': self.base.ids[posicao],
+                'nome': self.base.nomes[posicao],
+                'categoria': self.base.categorias[self.base.atributos['categoria'][posicao]],
+                'similaridade': round(similaridade, 3)
+            }
+            for posicao, similaridade in self.buscar(texto, limite, categorias)
+        ]
+
+
+_indices = {}
+
+
+def obter_indice_busca(base=None):
+    """Índice de busca por versão da base de alimentos"""
+    base = base or obter_base_alimentos()
+    if base.versao not in _indices:
+        _indices[base.versao] = IndiceBuscaAlimentos(base)
+    return _indices[base.versao]
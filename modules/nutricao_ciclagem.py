@@ -0,0 +1,133 @@
+"""
+CICLAGEM DE CARBOIDRATOS
+Padrão semanal (ex.: 'B-B-M-B-A-B-M') e agenda de treinos convertidos em metas diárias
+de calorias e macros; os sete dias saem de uma única operação matricial que preserva
+os totais da semana
+"""
+
+import unicodedata
+
+import numpy as np
+
+from modules.nutricao_distribuicao import distribuir_macros
+
+DIAS_SEMANA = ('segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo')
+
+PADRAO_CICLAGEM = 'B-B-M-B-A-B-M'
+NIVEIS = ('B', 'M', 'A')
+NOMES_NIVEIS = {'B': 'baixo', 'M': 'medio', 'A': 'alto'}
+
+# Pesos relativos (proteína, carboidrato, gordura) de cada nível: a proteína é constante,
+# a gordura compensa parcialmente o carboidrato retirado nos dias baixos
+PESOS_NIVEL = np.array([
+    [1.0, 0.6, 1.15],  # B
+    [1.0, 1.0, 1.0],   # M
+    [1.0, 1.6, 0.7]    # A
+])
+
+# Demanda do treino de cada dia (agenda informada pelo coach)
+DEMANDA_TREINO = {
+    'descanso': 0,
+    'leve': 1,
+    'pequeno': 1,
+    'moderado': 2,
+    'grande': 3,
+    'intenso': 3
+}
+DEMANDA_TREINO_PADRAO = 2
+
+KCAL_POR_GRAMA = np.array([4.0, 4.0, 9.0])
+
+
+def interpretar_padrao(padrao):
+    """'B-B-M-B-A-B-M' -> códigos de nível dos 7 dias"""
+    niveis = [nivel.strip().upper() for nivel in (padrao or PADRAO_CICLAGEM).split('-')]
+    if len(niveis) != len(DIAS_SEMANA) or any(nivel not in NIVEIS for nivel in niveis):
+        raise ValueError(f'Padrão de ciclagem inválido: {padrao} (use 7 dias B/M/A, ex.: {PADRAO_CICLAGEM})')
+    return np.array([NIVEIS.index(nivel) for nivel in niveis])
+
+
+def _dia_semana(dia):
+    """'Terça', 'terca-feira', 'sábado' -> posição do dia na semana"""
+    nome = unicodedata.normalize('NFKD', str(dia)).encode('ascii', 'ignore').decode('ascii').lower()
+    nome = nome.replace('-feira', '').strip()
+    if nome not in DIAS_SEMANA:
+        raise ValueError(f'Dia da semana inválido: {dia}')
+    return DIAS_SEMANA.index(nome)
+
+
+def demanda_semanal(agenda):
+    """
+    Demanda de treino dos 7 dias a partir da agenda: dict dia -> tipo de treino
+    ('descanso', 'pequeno', 'grande', ...) ou lista dos dias com treino
+    """
+    demanda = np.zeros(len(DIAS_SEMANA))
+    if isinstance(agenda, dict):
+        for dia, treino in agenda.items():
+            demanda[_dia_semana(dia)] = DEMANDA_TREINO.get(treino, DEMANDA_TREINO_PADRAO)
+    else:
+        demanda[[_dia_semana(dia) for dia in agenda]] = DEMANDA_TREINO_PADRAO
+    return demanda
+
+
+def niveis_por_agenda(niveis, agenda):
+    """
+    Reordena os níveis do padrão conforme a agenda: a mesma quantidade de dias B/M/A,
+    com os mais altos nos dias de treino mais pesado (empates mantêm a ordem do padrão)
+    """
+    if not agenda:
+        return niveis
+    demanda = demanda_semanal(agenda)
+    ordem_dias = np.argsort(demanda, kind='stable')
+    reordenados = np.empty_like(niveis)
+    reordenados[ordem_dias] = np.sort(niveis, kind='stable')
+    return reordenados
+
+
+def plano_semanal(proteina_g, carboidrato_g, gordura_g, padrao=None, agenda=None):
+    """
+    Metas diárias (7 x [proteína, carboidrato, gordura] em gramas) para a média diária
+    informada. Cada macro é repartido pelos pesos do nível do dia, de modo que o total
+    semanal é exatamente 7x a média. Retorna (níveis, gramas, calorias).
+    """
+    niveis = niveis_por_agenda(interpretar_padrao(padrao), agenda)
+    pesos = PESOS_NIVEL[niveis]
+    gramas = pesos / pesos.sum(axis=0) * (np.array([proteina_g, carboidrato_g, gordura_g]) * len(DIAS_SEMANA))
+    return niveis, gramas, gramas @ KCAL_POR_GRAMA
+
+
+def gerar_ciclagem(distribuicao_macros, numero_refeicoes, objetivo, periodo, padrao=None, agenda=None):
+    """Plano semanal com as metas de cada dia e a distribuição por refeição de cada um"""
+    niveis, gramas, calorias = plano_semanal(
+        distribuicao_macros['proteina']['gramas'],
+        distribuicao_macros['carboidrato']['gramas'],
+        distribuicao_macros['gordura']['gramas'],
+        padrao, agenda
+    )
+    demanda = demanda_semanal(agenda) if agenda else None
+
+    dias = []
+    for posicao, dia in enumerate(DIAS_SEMANA):
+        proteina, carboidrato, gordura = gramas[posicao]
+        dias.append({
+            'dia': dia,
+            'nivel_carboidrato': NOMES_NIVEIS[NIVEIS[niveis[posicao]]],
+            'treino': None if demanda is None else bool(demanda[posicao] > 0),
+            'calorias': round(float(calorias[posicao])),
+            'proteina': round(float(proteina), 1),
+            'carboidrato': round(float(carboidrato), 1),
+            'gordura': round(float(gordura), 1),
+            'refeicoes': distribuir_macros(proteina, carboidrato, gordura, numero_refeicoes, objetivo, periodo)
+        })
+
+    totais = gramas.sum(axis=0)
+    return {
+        'padrao': '-'.join(NIVEIS[nivel] for nivel in niveis),
+        'dias': dias,
+        'totais_semanais': {
+            'calorias': round(float(calorias.sum())),
+            'proteina': round(float(totais[0]), 1),
+            'carboidrato': round(float(totais[1]), 1),
+            'gordura': round(float(totais[2]), 1)
+        }
+    }
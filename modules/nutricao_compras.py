@@ -0,0 +1,154 @@
+"""
+LISTA DE COMPRAS DO ROSTER
+Itens dos planos gravados em formato binário colunar (dia:uint16, alimento:uint16,
+gramas:float32) e agregados por alimento com um group-by (np.bincount) sobre todos os
+clientes e dias do período; totais arredondados às embalagens da base de alimentos
+"""
+
+import struct
+
+import numpy as np
+
+from modules.nutricao_alimentos import obter_base_alimentos
+
+MAGICO = b'PN'
+VERSAO_FORMATO = 1
+
+# Cabeçalho: mágico (2s), versão do formato (B), número de itens (I)
+CABECALHO = struct.Struct('<2sBI')
+
+ITEM_PLANO = np.dtype([('dia', '<u2'), ('alimento', '<u2'), ('gramas', '<f4')])
+
+# Alimentos sem embalagem na base (vendidos a granel) são comprados em múltiplos disso
+ARREDONDAMENTO_GRANEL_G = 100
+
+
+def codificar_itens_plano(dias):
+    """
+    Itens de um plano de vários dias (dias como em modules/nutricao_rotacao.py) em bytes.
+    Retorna (ids dos alimentos, bytes): cada item aponta para a posição do alimento nessa
+    lista, o que mantém o plano válido se a base mudar de versão.
+    """
+    alimentos, posicao_local = [], {}
+    linhas = []
+    for dia, conteudo in enumerate(dias):
+        for refeicao in conteudo['refeicoes'].values():
+            for item in refeicao['itens']:
+                id_alimento = item['id']
+                if id_alimento not in posicao_local:
+                    posicao_local[id_alimento] = len(alimentos)
+                    alimentos.append(id_alimento)
+                linhas.append((dia, posicao_local[id_alimento], item['gramas']))
+
+    itens = np.array(linhas, dtype=ITEM_PLANO)
+    return alimentos, CABECALHO.pack(MAGICO, VERSAO_FORMATO, len(itens)) + itens.tobytes()
+
+
+def decodificar_itens_plano(dados):
+    magico, versao, quantidade = CABECALHO.unpack_from(dados)
+    if magico != MAGICO or versao != VERSAO_FORMATO:
+        raise ValueError('Itens de plano codificados em formato desconhecido')
+    return np.frombuffer(dados, dtype=ITEM_PLANO, count=quantidade, offset=CABECALHO.size)
+
+
+def formatar_quantidade(gramas):
+    """350 -> '350 g'; 2350 -> '2.35 kg'"""
+    return f'{gramas / 1000:.2f} kg' if gramas >= 1000 else f'{round(gramas)} g'
+
+
+def colunas_planos(planos, base):
+    """
+    Representação plana de todos os itens: colunas (cliente, plano, data ordinal,
+    posição na base, gramas). planos: (cliente_id, plano_id, data_inicio, ids dos alimentos, bytes)
+    """
+    colunas = {'cliente': [], 'plano': [], 'data': [], 'posicao': [], 'gramas': []}
+    removidos = set()
+    for cliente_id, plano_id, data_inicio, alimentos, dados in planos:
+        itens = decodificar_itens_plano(dados)
+        posicoes = [base.posicao(alimento) for alimento in alimentos]
+        mapa = np.array([-1 if posicao is None else posicao for posicao in posicoes], dtype=np.int64)
+        removidos.update(alimento for alimento, posicao in zip(alimentos, mapa) if posicao < 0)
+        colunas['cliente'].append(np.full(len(itens), cliente_id, dtype=np.int64))
+        colunas['plano'].append(np.full(len(itens), plano_id, dtype=np.int64))
+        colunas['data'].append(data_inicio.toordinal() + itens['dia'].astype(np.int64))
+        colunas['posicao'].append(mapa[itens['alimento']] if len(mapa) else np.empty(0, dtype=np.int64))
+        colunas['gramas'].append(itens['gramas'].astype(np.float64))
+
+    tipos = {'cliente': np.int64, 'plano': np.int64, 'data': np.int64, 'posicao': np.int64, 'gramas': np.float64}
+    colunas = {nome: np.concatenate(valores) if valores else np.empty(0, dtype=tipos[nome])
+               for nome, valores in colunas.items()}
+    valido = colunas['posicao'] >= 0
+    return {nome: valores[valido] for nome, valores in colunas.items()}, sorted(removidos)
+
+
+def agregar_compras(planos, inicio, fim, clientes=(), base=None):
+    """
+    Lista de compras de [inicio, fim] para os planos informados. Quando mais de um plano
+    cobre o mesmo dia de um cliente, vale o mais recente (maior plano_id).
+    """
+    base = base or obter_base_alimentos()
+    colunas, removidos = colunas_planos(planos, base)
+
+    no_periodo = (colunas['data'] >= inicio.toordinal()) & (colunas['data'] <= fim.toordinal())
+    colunas = {nome: valores[no_periodo] for nome, valores in colunas.items()}
+
+    # Um plano por (cliente, dia): o de maior id entre os que cobrem o dia
+    clientes_ids, cliente = np.unique(colunas['cliente'], return_inverse=True)
+    dias_periodo = fim.toordinal() - inicio.toordinal() + 1
+    chave = cliente * dias_periodo + (colunas['data'] - inicio.toordinal())
+    vencedor = np.full(len(clientes_ids) * dias_periodo, -1, dtype=np.int64)
+    np.maximum.at(vencedor, chave, colunas['plano'])
+    escolhido = colunas['plano'] == vencedor[chave]
+    posicoes, gramas = colunas['posicao'][escolhido], colunas['gramas'][escolhido]
+    cliente, chave = cliente[escolhido], chave[escolhido]
+
+    # Group-by por alimento: total de gramas e clientes distintos
+    totais = np.bincount(posicoes, weights=gramas, minlength=len(base))
+    pares = np.unique(cliente * len(base) + posicoes)
+    clientes_por_alimento = np.bincount(pares % len(base), minlength=len(base))
+    dias_por_cliente = np.bincount(np.unique(chave) // dias_periodo, minlength=len(clientes_ids))
+
+    usados = np.flatnonzero(totais > 0)
+    embalagem = np.asarray(base.atributos['embalagem_g'], dtype=np.float64)[usados]
+    com_embalagem = embalagem > 0
+    unidade_compra = np.where(com_embalagem, embalagem, ARREDONDAMENTO_GRANEL_G)
+    unidades = np.ceil(totais[usados] / unidade_compra - 1e-9)
+    compra = unidades * unidade_compra
+
+    categorias = np.asarray(base.atributos['categoria'])[usados]
+    ordem = np.lexsort(([base.nomes[posicao] for posicao in usados.tolist()], categorias))
+    itens = []
+    for indice in ordem.tolist():
+        posicao = int(usados[indice])
+        itens.append({
+            'id': base.ids[posicao],
+            'alimento': base.nomes[posicao],
+            'categoria': base.categorias[categorias[indice]],
+            'total_g': round(float(totais[posicao])),
+            'total': formatar_quantidade(float(totais[posicao])),
+            'embalagem_g': float(embalagem[indice]) if com_embalagem[indice] else None,
+            'embalagens': int(unidades[indice]) if com_embalagem[indice] else None,
+            'compra_g': round(float(compra[indice])),
+            'compra': formatar_quantidade(float(compra[indice])),
+            'sobra_g': round(float(compra[indice] - totais[posicao])),
+            'clientes': int(clientes_por_alimento[posicao])
+        })
+
+    cobertos = set(clientes_ids.tolist())
+    return {
+        'periodo': {'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'dias': dias_periodo},
+        'itens': itens,
+        'resumo': {
+            'clientes': len(cobertos),
+            'clientes_sem_plano': sorted(set(clientes) - cobertos),
+            'clientes_com_dias_sem_plano': [
+                int(cliente_id) for cliente_id, dias in zip(clientes_ids.tolist(), dias_por_cliente.tolist())
+                if dias < dias_periodo
+            ],
+            'itens_plano': int(len(posicoes)),
+            'alimentos': len(itens),
+            'embalagens': int(unidades[com_embalagem].sum()),
+            'compra_total': formatar_quantidade(float(compra.sum()))
+        },
+        'alimentos_removidos': removidos
+    }
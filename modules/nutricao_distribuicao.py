@@ -0,0 +1,147 @@
+"""
+DISTRIBUIÇÃO POR REFEIÇÃO
+Modelos de 2 a 8 refeições por dia, com deslocamento de carboidratos para perto
+do treino; cada modelo é calculado uma vez por (refeições, objetivo, período de treino)
+e aplicado ao cliente com uma única multiplicação vetorial
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+MINIMO_REFEICOES = 2
+MAXIMO_REFEICOES = 8
+
+PERIODOS_TREINO = ('manha', 'tarde', 'noite')
+PERIODO_TREINO_PADRAO = 'tarde'
+
+# Horário de referência do treino em cada período (horas decimais)
+HORA_TREINO = {'manha': 9.0, 'tarde': 17.0, 'noite': 19.5}
+
+# Refeições possíveis em cada período, com horário
+HORARIOS_REFEICOES = {
+    'manha': {
+        'cafe_manha': 7.0, 'pre_treino': 8.0, 'pos_treino': 10.5, 'almoco': 13.0,
+        'lanche_tarde': 15.5, 'lanche_noite': 17.5, 'jantar': 20.0, 'ceia': 22.0
+    },
+    'tarde': {
+        'cafe_manha': 7.0, 'lanche_manha': 10.0, 'almoco': 12.5, 'lanche_tarde': 14.5,
+        'pre_treino': 15.5, 'pos_treino': 18.5, 'jantar': 20.5, 'ceia': 22.5
+    },
+    'noite': {
+        'cafe_manha': 7.0, 'lanche_manha': 10.0, 'almoco': 12.5, 'lanche_tarde': 15.5,
+        'lanche_noite': 17.0, 'pre_treino': 18.5, 'pos_treino': 21.0, 'jantar': 22.0
+    }
+}
+
+# Ordem em que as refeições entram no dia conforme o número de refeições aumenta
+PRIORIDADE_REFEICOES = (
+    'almoco', 'jantar', 'cafe_manha', 'pos_treino', 'pre_treino',
+    'lanche_tarde', 'lanche_manha', 'ceia', 'lanche_noite'
+)
+
+# Pesos relativos de carboidrato e gordura por refeição (a proteína é distribuída por igual)
+PESOS_REFEICAO = {
+    'cafe_manha': (20, 20),
+    'lanche_manha': (10, 12),
+    'almoco': (22, 25),
+    'lanche_tarde': (10, 12),
+    'lanche_noite': (8, 12),
+    'pre_treino': (18, 5),
+    'pos_treino': (25, 3),
+    'jantar': (15, 25),
+    'ceia': (5, 15)
+}
+
+# Ajustes por objetivo: multiplicador de carboidrato para refeições longe do treino
+CARBOIDRATO_LONGE_TREINO = {
+    'cutting': 0.6,
+    'manutencao': 0.85,
+    'bulking': 1.0,
+    'performance': 0.9
+}
+
+# Bônus de carboidrato nas horas seguintes ao treino (janela e intensidade)
+JANELA_POS_TREINO_H = 4.0
+BONUS_POS_TREINO = 0.5
+
+
+def periodo_treino(horario_treino):
+    """Período do treino a partir de 'manha'/'tarde'/'noite' ou de um horário 'HH:MM'"""
+    if not horario_treino:
+        return PERIODO_TREINO_PADRAO
+    horario = str(horario_treino).strip().lower().replace('ã', 'a')
+    if horario in PERIODOS_TREINO:
+        return horario
+    try:
+        hora = int(horario.split(':')[0].split('h')[0])
+    except ValueError:
+        return PERIODO_TREINO_PADRAO
+    return 'manha' if hora < 11 else 'tarde' if hora < 18 else 'noite'
+
+
+def converter_numero_refeicoes(numero_refeicoes):
+    """Número de refeições recebido (número ou texto, ex.: '5') -> int; None se inválido ou fora de 2 a 8"""
+    try:
+        numero = float(numero_refeicoes)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(numero_refeicoes, bool) or not numero.is_integer():
+        return None
+    numero = int(numero)
+    return numero if MINIMO_REFEICOES <= numero <= MAXIMO_REFEICOES else None
+
+
+def formatar_horario(hora):
+    """Horas decimais -> 'HH:MM'"""
+    return f'{int(hora):02d}:{round(hora % 1 * 60):02d}'
+
+
+@lru_cache(maxsize=256)
+def modelo_distribuicao(numero_refeicoes, objetivo, periodo):
+    """
+    Modelo imutável: (refeições em ordem cronológica, horários, matriz n x 3 com a
+    fração diária de proteína, carboidrato e gordura de cada refeição)
+    """
+    if not MINIMO_REFEICOES <= numero_refeicoes <= MAXIMO_REFEICOES:
+        raise ValueError(f'Número de refeições deve estar entre {MINIMO_REFEICOES} e {MAXIMO_REFEICOES}')
+
+    horarios = HORARIOS_REFEICOES[periodo]
+    disponiveis = [refeicao for refeicao in PRIORIDADE_REFEICOES if refeicao in horarios]
+    refeicoes = sorted(disponiveis[:numero_refeicoes], key=horarios.get)
+    horas = np.array([horarios[refeicao] for refeicao in refeicoes])
+
+    pesos = np.array([PESOS_REFEICAO[refeicao] for refeicao in refeicoes], dtype=np.float64)
+    carboidrato, gordura = pesos.T
+
+    # Carboidrato deslocado para o treino: reduzido longe dele, reforçado nas horas seguintes
+    perto_treino = np.isin(refeicoes, ('pre_treino', 'pos_treino'))
+    carboidrato = np.where(perto_treino, carboidrato, carboidrato * CARBOIDRATO_LONGE_TREINO[objetivo])
+    apos_treino = horas - HORA_TREINO[periodo]
+    janela = (apos_treino > 0) & (apos_treino <= JANELA_POS_TREINO_H)
+    carboidrato = carboidrato * (1 + BONUS_POS_TREINO * janela * (1 - apos_treino / JANELA_POS_TREINO_H))
+
+    fracoes = np.column_stack([
+        np.full(len(refeicoes), 1 / len(refeicoes)),
+        carboidrato / carboidrato.sum(),
+        gordura / gordura.sum()
+    ])
+    fracoes.setflags(write=False)
+    return tuple(refeicoes), tuple(formatar_horario(hora) for hora in horas), fracoes
+
+
+def distribuir_macros(proteina_g, carboidrato_g, gordura_g, numero_refeicoes, objetivo, periodo):
+    """Metas por refeição: o modelo em cache multiplicado pelos totais diários do cliente"""
+    refeicoes, _, fracoes = modelo_distribuicao(numero_refeicoes, objetivo, periodo)
+    gramas = fracoes * np.array([proteina_g, carboidrato_g, gordura_g])
+    calorias = gramas @ np.array([4.0, 4.0, 9.0])
+
+    return {
+        refeicao: {
+            'calorias': round(float(kcal)),
+            'proteina': round(float(proteina), 1),
+            'carboidrato': round(float(carbo), 1),
+            'gordura': round(float(gord), 1)
+        }
+        for refeicao, kcal, (proteina, carbo, gord) in zip(refeicoes, calorias, gramas)
+    }
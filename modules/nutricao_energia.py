@@ -0,0 +1,164 @@
+"""
+GASTO ENERGÉTICO EM LOTE
+Equações de TMB (Mifflin-St Jeor, Katch-McArdle, Cunningham), fator de atividade,
+ajuste por objetivo e metas de macronutrientes calculados sobre arrays: um cliente
+ou o roster inteiro na mesma passada vetorizada
+"""
+
+import numpy as np
+
+FATORES_ATIVIDADE = {
+    'sedentario': 1.2,
+    'levemente_ativo': 1.375,
+    'moderadamente_ativo': 1.55,
+    'muito_ativo': 1.725,
+    'extremamente_ativo': 1.9,
+    'atleta_profissional': 2.2
+}
+FATOR_ATIVIDADE_PADRAO = 1.55
+
+# Abaixo deste % de gordura a TMB pela massa magra (Katch-McArdle) é a utilizada
+LIMITE_GORDURA_KATCH = 15
+
+MACROS_POR_OBJETIVO = {
+    'cutting': {
+        'proteina': {'min': 2.2, 'max': 3.1},  # g/kg
+        'gordura': {'min': 0.8, 'max': 1.2},   # g/kg
+        'carboidrato_resto': True
+    },
+    'bulking': {
+        'proteina': {'min': 1.8, 'max': 2.5},  # g/kg
+        'gordura': {'min': 1.0, 'max': 1.5},   # g/kg
+        'carboidrato_resto': True
+    },
+    'manutencao': {
+        'proteina': {'min': 1.6, 'max': 2.2},  # g/kg
+        'gordura': {'min': 1.0, 'max': 1.3},   # g/kg
+        'carboidrato_resto': True
+    },
+    'performance': {
+        'proteina': {'min': 1.8, 'max': 2.3},  # g/kg
+        'gordura': {'min': 1.2, 'max': 1.8},   # g/kg
+        'carboidrato': {'min': 5.0, 'max': 8.0}  # g/kg
+    }
+}
+OBJETIVOS = tuple(MACROS_POR_OBJETIVO)
+
+# Ajuste calórico por objetivo: (kcal por kg de peso, limite absoluto em kcal), com sinal
+AJUSTES_OBJETIVO = {
+    'cutting': (-7, 500),       # déficit moderado
+    'bulking': (5, 400),        # superávit conservador
+    'recomposicao': (-2, 200),  # manutenção ou déficit muito leve
+    'manutencao': (0, 0)
+}
+TIPOS_AJUSTE = tuple(AJUSTES_OBJETIVO)
+
+# Piso de carboidrato fora do cutting: abaixo de 2 g/kg, sobe para 3 g/kg às custas da gordura
+CARBOIDRATO_MINIMO_G_KG = 2
+CARBOIDRATO_AJUSTADO_G_KG = 3
+
+
+def chave_objetivo(objetivo):
+    """Objetivo em texto livre -> cutting, bulking, performance ou manutencao"""
+    objetivo = (objetivo or '').lower()
+    return 'cutting' if 'cutting' in objetivo or 'emagrecimento' in objetivo else \
+           'bulking' if 'bulking' in objetivo or 'hipertrofia' in objetivo else \
+           'performance' if 'performance' in objetivo else 'manutencao'
+
+
+def tipo_ajuste(objetivo):
+    """Objetivo em texto livre -> tipo de ajuste calórico"""
+    objetivo = (objetivo or '').lower()
+    return 'cutting' if 'cutting' in objetivo or 'emagrecimento' in objetivo else \
+           'bulking' if 'bulking' in objetivo or 'hipertrofia' in objetivo else \
+           'recomposicao' if 'recomposicao' in objetivo else 'manutencao'
+
+
+def _codificar(valores, classificar, vocabulario, quantidade):
+    """Códigos inteiros de uma coluna de textos, classificando cada texto distinto uma vez"""
+    if valores is None or isinstance(valores, str):
+        valores = [valores] * quantidade
+    codigos = {valor: vocabulario.index(classificar(valor)) for valor in set(valores)}
+    return np.array([codigos[valor] for valor in valores], dtype=np.int64)
+
+
+def _feminino(sexos, quantidade):
+    if isinstance(sexos, str):
+        sexos = [sexos] * quantidade
+    normalizados = [str(sexo or '').strip().lower() for sexo in sexos]
+    invalidos = sorted(set(normalizados) - {'masculino', 'feminino'})
+    if invalidos:
+        raise ValueError(f'Sexo inválido: {", ".join(invalidos) or "não informado"}')
+    return np.array([sexo == 'feminino' for sexo in normalizados])
+
+
+def calcular_metas_macros(peso, calorias_totais, objetivos):
+    """Gramas de proteína, carboidrato e gordura por cliente (arrays) a partir das calorias-alvo"""
+    peso = np.atleast_1d(np.asarray(peso, dtype=np.float64))
+    calorias_totais = np.atleast_1d(np.asarray(calorias_totais, dtype=np.float64))
+    chaves = _codificar(objetivos, chave_objetivo, OBJETIVOS, len(peso))
+
+    proteina_g_kg = np.array([MACROS_POR_OBJETIVO[chave]['proteina']['max'] for chave in OBJETIVOS])[chaves]
+    gordura_g_kg = np.array([MACROS_POR_OBJETIVO[chave]['gordura']['max'] for chave in OBJETIVOS])[chaves]
+
+    proteina_g = peso * proteina_g_kg
+    gordura_g = peso * gordura_g_kg
+    carboidrato_g = (calorias_totais - proteina_g * 4 - gordura_g * 9) / 4
+
+    ajustar = (carboidrato_g < peso * CARBOIDRATO_MINIMO_G_KG) & (chaves != OBJETIVOS.index('cutting'))
+    carboidrato_g = np.where(ajustar, peso * CARBOIDRATO_AJUSTADO_G_KG, carboidrato_g)
+    gordura_g = np.where(ajustar, (calorias_totais - proteina_g * 4 - carboidrato_g * 4) / 9, gordura_g)
+
+    return {'proteina_g': proteina_g, 'carboidrato_g': carboidrato_g, 'gordura_g': gordura_g}
+
+
+def calcular_gasto_energetico(peso, altura, idade, sexo, percentual_gordura=None, nivel_atividade=None,
+                              objetivo=None):
+    """
+    Gasto energético de N clientes de uma vez. peso (kg), altura (m), idade e
+    percentual_gordura são arrays (gordura ausente = None/NaN); sexo, nivel_atividade
+    e objetivo são listas de textos ou um único texto para todos.
+    Retorna dict de arrays: TMB por equação, TMB utilizada, fator de atividade, GET,
+    ajuste do objetivo, calorias-alvo e metas de macronutrientes.
+    """
+    peso = np.atleast_1d(np.asarray(peso, dtype=np.float64))
+    altura_cm = np.asarray(altura, dtype=np.float64) * 100
+    idade = np.asarray(idade, dtype=np.float64)
+    quantidade = len(peso)
+
+    if percentual_gordura is None:
+        gordura = np.full(quantidade, np.nan)
+    else:
+        gordura = np.array(percentual_gordura, dtype=np.float64).reshape(-1)
+        gordura = np.broadcast_to(gordura, (quantidade,)) if len(gordura) == 1 else gordura
+
+    tmb_mifflin = 10 * peso + 6.25 * altura_cm - 5 * idade + np.where(_feminino(sexo, quantidade), -161, 5)
+
+    com_gordura = gordura > 0
+    massa_magra = np.where(com_gordura, peso * (1 - gordura / 100), np.nan)
+    tmb_katch = 370 + 21.6 * massa_magra
+    tmb_cunningham = 500 + 22 * massa_magra
+    tmb_utilizada = np.where(com_gordura & (gordura < LIMITE_GORDURA_KATCH), tmb_katch, tmb_mifflin)
+
+    if nivel_atividade is None or isinstance(nivel_atividade, str):
+        nivel_atividade = [nivel_atividade] * quantidade
+    fator_atividade = np.array([FATORES_ATIVIDADE.get(nivel, FATOR_ATIVIDADE_PADRAO) for nivel in nivel_atividade])
+    gasto_total = tmb_utilizada * fator_atividade
+
+    tipos = _codificar(objetivo, tipo_ajuste, TIPOS_AJUSTE, quantidade)
+    kcal_por_kg, limite = np.array([AJUSTES_OBJETIVO[tipo] for tipo in TIPOS_AJUSTE], dtype=np.float64)[tipos].T
+    ajuste = np.sign(kcal_por_kg) * np.minimum(limite, np.abs(kcal_por_kg) * peso)
+    calorias_alvo = gasto_total + ajuste
+
+    resultado = {
+        'tmb_mifflin': tmb_mifflin,
+        'tmb_katch': tmb_katch,
+        'tmb_cunningham': tmb_cunningham,
+        'tmb_utilizada': tmb_utilizada,
+        'fator_atividade': fator_atividade,
+        'get': gasto_total,
+        'ajuste_objetivo': ajuste,
+        'total': calorias_alvo
+    }
+    resultado.update(calcular_metas_macros(peso, calorias_alvo, objetivo))
+    return resultado
@@ -7,126 +7,58 @@ from flask import jsonify
 import json
 from datetime import datetime
 import math
+from modules.hematologia_referencias import obter_tabelas_referencia
+from modules.nutricao_alimentos import componentes_excluidos, interpretar_restricoes, obter_base_alimentos
+from modules.nutricao_ciclagem import gerar_ciclagem
+from modules.nutricao_distribuicao import (
+    MAXIMO_REFEICOES, MINIMO_REFEICOES, PERIODO_TREINO_PADRAO, converter_numero_refeicoes, distribuir_macros,
+    modelo_distribuicao, periodo_treino
+)
+from modules.nutricao_energia import (
+    FATORES_ATIVIDADE, MACROS_POR_OBJETIVO, calcular_gasto_energetico, calcular_metas_macros, chave_objetivo
+)
+from modules.nutricao_incremental import (
+    CAMPOS_PLANO, ENTRADAS_EXTERNAS, SECOES_PLANO, calcular_secoes, campos_alterados, entradas_plano
+)
+from modules.nutricao_micronutrientes import obter_cobertura
+from modules.nutricao_otimizador import obter_otimizador
+from modules.nutricao_receitas import obter_livro_receitas
+from modules.nutricao_rotacao import REPETICAO_MAXIMA_PADRAO, gerar_rotacao
 
 class NutricaoEstrategicaModule:
     def __init__(self):
-        self.equacoes_tmb = {
-            'mifflin_st_jeor': {
-                'masculino': lambda peso, altura, idade: (10 * peso) + (6.25 * altura) - (5 * idade) + 5,
-                'feminino': lambda peso, altura, idade: (10 * peso) + (6.25 * altura) - (5 * idade) - 161
-            },
-            'katch_mcardle': lambda massa_magra: 370 + (21.6 * massa_magra),
-            'cunningham': lambda massa_magra: 500 + (22 * massa_magra)
-        }
-        
-        self.fatores_atividade = {
-            'sedentario': 1.2,
-            'levemente_ativo': 1.375,
-            'moderadamente_ativo': 1.55,
-            'muito_ativo': 1.725,
-            'extremamente_ativo': 1.9,
-            'atleta_profissional': 2.2
-        }
-        
-        self.macros_por_objetivo = {
-            'cutting': {
-                'proteina': {'min': 2.2, 'max': 3.1},  # g/kg
-                'gordura': {'min': 0.8, 'max': 1.2},   # g/kg
-                'carboidrato_resto': True
-            },
-            'bulking': {
-                'proteina': {'min': 1.8, 'max': 2.5},  # g/kg
-                'gordura': {'min': 1.0, 'max': 1.5},   # g/kg
-                'carboidrato_resto': True
-            },
-            'manutencao': {
-                'proteina': {'min': 1.6, 'max': 2.2},  # g/kg
-                'gordura': {'min': 1.0, 'max': 1.3},   # g/kg
-                'carboidrato_resto': True
-            },
-            'performance': {
-                'proteina': {'min': 1.8, 'max': 2.3},  # g/kg
-                'gordura': {'min': 1.2, 'max': 1.8},   # g/kg
-                'carboidrato': {'min': 5.0, 'max': 8.0}  # g/kg
-            }
-        }
-        
-        self.alimentos_database = {
-            'proteinas_magras': {
-                'frango_peito': {'proteina': 23, 'gordura': 1.2, 'carboidrato': 0, 'calorias': 100},
-                'tilapia': {'proteina': 20, 'gordura': 1.7, 'carboidrato': 0, 'calorias': 96},
-                'ovo_inteiro': {'proteina': 6, 'gordura': 5, 'carboidrato': 0.6, 'calorias': 70},
-                'clara_ovo': {'proteina': 3.6, 'gordura': 0, 'carboidrato': 0.2, 'calorias': 17},
-                'whey_protein': {'proteina': 24, 'gordura': 1, 'carboidrato': 3, 'calorias': 120}
-            },
-            'carboidratos_complexos': {
-                'aveia': {'proteina': 13.2, 'gordura': 6.5, 'carboidrato': 67, 'calorias': 389},
-                'batata_doce': {'proteina': 2, 'gordura': 0.1, 'carboidrato': 20, 'calorias': 86},
-                'arroz_integral': {'proteina': 7.9, 'gordura': 2.9, 'carboidrato': 77.2, 'calorias': 370},
-                'quinoa': {'proteina': 14.1, 'gordura': 6.1, 'carboidrato': 64.2, 'calorias': 368}
-            },
-            'gorduras_saudaveis': {
-                'oleo_coco': {'proteina': 0, 'gordura': 100, 'carboidrato': 0, 'calorias': 862},
-                'abacate': {'proteina': 2, 'gordura': 14.7, 'carboidrato': 8.5, 'calorias': 160},
-                'amêndoas': {'proteina': 21.2, 'gordura': 49.9, 'carboidrato': 21.6, 'calorias': 579},
-                'azeite_oliva': {'proteina': 0, 'gordura': 100, 'carboidrato': 0, 'calorias': 884}
-            }
-        }
+        # Equações de TMB e metas por objetivo vetorizadas em modules/nutricao_energia.py
+        self.fatores_atividade = FATORES_ATIVIDADE
+        self.macros_por_objetivo = MACROS_POR_OBJETIVO
+        
+        # Tabela de composição (modules/dados/alimentos_taco.csv) compilada e mapeada em memória
+        self.base_alimentos = obter_base_alimentos()
+        self.otimizador = obter_otimizador(self.base_alimentos)
+        self.micronutrientes = obter_cobertura(self.base_alimentos)
+        self.receitas = obter_livro_receitas(self.base_alimentos)
     
-    def gerar_plano_alimentar(self, dados):
+    def gerar_plano_alimentar(self, dados, gasto_adaptativo=None, referencias=None, receitas=None):
         """
-        Gera plano alimentar personalizado baseado no perfil e objetivos
+        Gera plano alimentar personalizado baseado no perfil e objetivos.
+        gasto_adaptativo: estimativa do histórico de peso e ingestão (modules/nutricao_gasto_adaptativo.py),
+        usada no lugar das equações quando confiável.
+        referencias: referências laboratoriais (do coach) para classificar dados['exames_recentes']
+        receitas: receitas do coach sugeridas junto com as padrão (modules/nutricao_receitas.py)
         """
         try:
-            # Validar dados obrigatórios
-            campos_obrigatorios = ['peso', 'altura', 'idade', 'sexo', 'objetivo', 'nivel_atividade']
-            for campo in campos_obrigatorios:
-                if campo not in dados:
-                    return jsonify({
-                        'success': False,
-                        'message': f'Campo obrigatório não preenchido: {campo}'
-                    })
-            
-            # Calcular necessidades calóricas
-            necessidades_caloricas = self._calcular_necessidades_caloricas(dados)
-            
-            # Calcular distribuição de macronutrientes
-            distribuicao_macros = self._calcular_distribuicao_macros(dados, necessidades_caloricas)
-            
-            # Gerar estratégias nutricionais específicas
-            estrategias = self._definir_estrategias_nutricionais(dados)
-            
-            # Gerar plano de refeições
-            plano_refeicoes = self._gerar_plano_refeicoes(dados, distribuicao_macros)
-            
-            # Timing nutricional
-            timing_nutricional = self._definir_timing_nutricional(dados)
+            erro = self._validar_dados(dados)
+            if erro:
+                return jsonify({
+                    'success': False,
+                    'message': erro
+                })
             
-            # Periodização nutricional
-            periodizacao = self._gerar_periodizacao_nutricional(dados)
-            
-            # Suplementação nutricional básica
-            suplementacao_nutricional = self._sugerir_suplementacao_nutricional(dados, distribuicao_macros)
+            # Seções calculadas na ordem declarada em modules/nutricao_incremental.py
+            secoes, _, _ = calcular_secoes(self._construtores_secoes(dados, gasto_adaptativo, referencias, receitas))
             
             resultado = {
                 'success': True,
-                'plano_nutricional': {
-                    'resumo_executivo': {
-                        'calorias_totais': necessidades_caloricas['total'],
-                        'deficit_superavit': necessidades_caloricas.get('deficit_superavit', 0),
-                        'distribuicao_macros': distribuicao_macros,
-                        'estrategia_principal': estrategias['estrategia_principal'],
-                        'numero_refeicoes': dados.get('numero_refeicoes', 5)
-                    },
-                    'calculos_detalhados': necessidades_caloricas,
-                    'macronutrientes': distribuicao_macros,
-                    'estrategias_nutricionais': estrategias,
-                    'plano_refeicoes': plano_refeicoes,
-                    'timing_nutricional': timing_nutricional,
-                    'periodizacao': periodizacao,
-                    'suplementacao_nutricional': suplementacao_nutricional,
-                    'monitoramento': self._definir_protocolo_monitoramento(dados)
-                },
+                'plano_nutricional': self._montar_plano(dados, secoes),
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -138,62 +70,184 @@ class NutricaoEstrategicaModule:
                 'message': f'Erro ao gerar plano alimentar: {str(e)}'
             })
     
-    def _calcular_necessidades_caloricas(self, dados):
-        """Calcula necessidades calóricas usando múltiplas equações"""
-        peso = dados['peso']
-        altura = dados['altura'] * 100  # converter para cm
-        idade = dados['idade']
-        sexo = dados['sexo'].lower()
-        nivel_atividade = dados['nivel_atividade']
-        objetivo = dados['objetivo'].lower()
-        percentual_gordura = dados.get('percentual_gordura')
-        
-        # TMB usando Mifflin-St Jeor (padrão)
-        tmb_mifflin = self.equacoes_tmb['mifflin_st_jeor'][sexo](peso, altura, idade)
-        
-        # TMB usando Katch-McArdle se tiver % gordura
-        tmb_katch = None
-        if percentual_gordura:
-            massa_magra = peso * (1 - percentual_gordura / 100)
-            tmb_katch = self.equacoes_tmb['katch_mcardle'](massa_magra)
-        
-        # Escolher TMB mais apropriada
-        tmb_final = tmb_katch if (tmb_katch and percentual_gordura < 15) else tmb_mifflin
+    def recalcular_plano(self, plano_anterior, alteracoes, dados_anteriores=None, gasto_adaptativo=None,
+                         referencias=None, receitas=None, forcar=()):
+        """
+        Refaz só as seções afetadas pelos campos alterados de um plano gerado antes
+        (plano_anterior: o 'plano_nutricional' devolvido, com as entradas usadas).
+        O gasto adaptativo conta como alterado quando difere do gravado no plano;
+        forcar: seções ou entradas (ex.: 'receitas') a refazer mesmo sem alteração.
+        Retorna (plano, resumo do recálculo); erros de validação levantam ValueError.
+        """
+        anteriores = plano_anterior.get('entradas') or dados_anteriores
+        if anteriores is None:
+            raise ValueError('Plano sem as entradas usadas no cálculo: informe os dados anteriores')
+        dados = dict(anteriores, **alteracoes)
+        erro = self._validar_dados(dados)
+        if erro:
+            raise ValueError(erro)
+        
+        alterados = campos_alterados(anteriores, dados)
+        if gasto_adaptativo != (plano_anterior.get('calculos_detalhados') or {}).get('gasto_adaptativo'):
+            alterados.add('gasto_adaptativo')
+        alterados.update(campo for campo in forcar if campo in CAMPOS_PLANO or campo in ENTRADAS_EXTERNAS)
+        
+        secoes, recalculadas, modificadas = calcular_secoes(
+            self._construtores_secoes(dados, gasto_adaptativo, referencias, receitas),
+            anterior=plano_anterior, alterados=alterados, forcar=[secao for secao in forcar if secao in SECOES_PLANO]
+        )
+        return self._montar_plano(dados, secoes), {
+            'campos_alterados': sorted(alterados),
+            'secoes_recalculadas': recalculadas,
+            'secoes_modificadas': [secao for secao in SECOES_PLANO if secao in modificadas],
+            'sem_alteracao': not modificadas
+        }
+    
+    def _validar_dados(self, dados):
+        """
+        Mensagem do primeiro problema nos dados do plano (None quando válidos).
+        numero_refeicoes enviado como texto ('5') é convertido em dados.
+        """
+        campos_obrigatorios = ['peso', 'altura', 'idade', 'sexo', 'objetivo', 'nivel_atividade']
+        for campo in campos_obrigatorios:
+            if campo not in dados:
+                return f'Campo obrigatório não preenchido: {campo}'
+        
+        if 'numero_refeicoes' in dados:
+            numero_refeicoes = converter_numero_refeicoes(dados['numero_refeicoes'])
+            if numero_refeicoes is None:
+                return f'Número de refeições deve estar entre {MINIMO_REFEICOES} e {MAXIMO_REFEICOES}'
+            dados['numero_refeicoes'] = numero_refeicoes
+        return None
+    
+    def _construtores_secoes(self, dados, gasto_adaptativo=None, referencias=None, receitas=None):
+        """Função de cada seção do plano a partir das seções já calculadas"""
+        return {
+            # Necessidades calóricas e distribuição de macronutrientes
+            'calculos_detalhados': lambda secoes: self._calcular_necessidades_caloricas(dados, gasto_adaptativo),
+            'macronutrientes': lambda secoes: self._calcular_distribuicao_macros(dados, secoes['calculos_detalhados']),
+            
+            # Estratégias nutricionais específicas
+            'estrategias_nutricionais': lambda secoes: self._definir_estrategias_nutricionais(dados),
+            
+            # Plano de refeições
+            'plano_refeicoes': lambda secoes: self._gerar_plano_refeicoes(dados, secoes['macronutrientes'], receitas),
+            
+            # Cobertura de micronutrientes dos alimentos do plano, cruzada com os exames
+            'micronutrientes': lambda secoes: self._avaliar_micronutrientes(dados, secoes['plano_refeicoes'], referencias),
+            
+            # Ciclagem de carboidratos: metas de cada dia da semana
+            'ciclagem_semanal': lambda secoes: self._gerar_ciclagem_semanal(
+                dados, secoes['macronutrientes'], secoes['estrategias_nutricionais']
+            ) if secoes['estrategias_nutricionais']['ciclagem_carboidratos'] or dados.get('ciclagem_carboidratos') else None,
+            
+            # Timing, periodização, suplementação básica e monitoramento
+            'timing_nutricional': lambda secoes: self._definir_timing_nutricional(dados),
+            'periodizacao': lambda secoes: self._gerar_periodizacao_nutricional(dados),
+            'suplementacao_nutricional': lambda secoes: self._sugerir_suplementacao_nutricional(
+                dados, secoes['macronutrientes']
+            ),
+            'monitoramento': lambda secoes: self._definir_protocolo_monitoramento(dados),
+            
+            'resumo_executivo': lambda secoes: {
+                # Calorias das metas de macros em vigor: ajustes dentro da tolerância mantêm
+                # os macros gravados, e a estimativa recalculada aparece à parte
+                'calorias_totais': secoes['macronutrientes']['calorias_totais'],
+                'calorias_calculadas': secoes['calculos_detalhados']['total'],
+                'deficit_superavit': secoes['calculos_detalhados'].get('deficit_superavit', 0),
+                'distribuicao_macros': secoes['macronutrientes'],
+                'estrategia_principal': secoes['estrategias_nutricionais']['estrategia_principal'],
+                'numero_refeicoes': dados.get('numero_refeicoes', 5),
+                # Restrições que não excluíram nenhum alimento: o coach precisa revisá-las
+                'restricoes_nao_reconhecidas': interpretar_restricoes(dados.get('alergias_restricoes', []))[1]
+            }
+        }
+    
+    def _montar_plano(self, dados, secoes):
+        """Plano na ordem de apresentação, com as entradas usadas (base do recálculo incremental)"""
+        return {
+            'resumo_executivo': secoes['resumo_executivo'],
+            'calculos_detalhados': secoes['calculos_detalhados'],
+            'macronutrientes': secoes['macronutrientes'],
+            'estrategias_nutricionais': secoes['estrategias_nutricionais'],
+            'plano_refeicoes': secoes['plano_refeicoes'],
+            'ciclagem_semanal': secoes['ciclagem_semanal'],
+            'micronutrientes': secoes['micronutrientes'],
+            'timing_nutricional': secoes['timing_nutricional'],
+            'periodizacao': secoes['periodizacao'],
+            'suplementacao_nutricional': secoes['suplementacao_nutricional'],
+            'monitoramento': secoes['monitoramento'],
+            'entradas': entradas_plano(dados)
+        }
+    
+    def calcular_rotacao(self, dados, dias, repeticao_maxima=REPETICAO_MAXIMA_PADRAO, semente=0, inicio=None,
+                         gasto_adaptativo=None, receitas=None):
+        """
+        Cardápio rotativo de vários dias (modules/nutricao_rotacao.py) com as metas diárias do plano.
+        As receitas escolhidas (dados['receitas_refeicoes']) se repetem todos os dias na refeição.
+        Retorna o dicionário do plano (a rota grava e serializa); erros de validação levantam ValueError.
+        """
+        erro = self._validar_dados(dados)
+        if erro:
+            raise ValueError(erro)
+        numero_refeicoes = dados.get('numero_refeicoes', 5)
         
-        # GET (Gasto Energético Total)
-        fator_atividade = self.fatores_atividade.get(nivel_atividade, 1.55)
-        get = tmb_final * fator_atividade
+        necessidades_caloricas = self._calcular_necessidades_caloricas(dados, gasto_adaptativo)
+        distribuicao_macros = self._calcular_distribuicao_macros(dados, necessidades_caloricas)
+        distribuicao_refeicoes = self._calcular_distribuicao_por_refeicao(
+            distribuicao_macros, numero_refeicoes, dados['objetivo'].lower(), periodo_treino(dados.get('horario_treino'))
+        )
+        escolhidas, fixos = self._receitas_escolhidas(
+            dados, distribuicao_refeicoes, self.receitas.com_receitas(receitas),
+            componentes_excluidos(dados.get('alergias_restricoes', []))
+        )
+        rotacao = gerar_rotacao(
+            self.otimizador, distribuicao_refeicoes, dados.get('alergias_restricoes', []),
+            dias, repeticao_maxima, semente, inicio, fixos
+        )
+        rotacao['receitas'] = escolhidas
+        rotacao['metas_diarias'] = {
+            'calorias': necessidades_caloricas['total'],
+            'macronutrientes': distribuicao_macros,
+            'refeicoes': distribuicao_refeicoes
+        }
+        return rotacao
+    
+    def _calcular_necessidades_caloricas(self, dados, gasto_adaptativo=None):
+        """Calcula necessidades calóricas usando múltiplas equações (cálculo em lote com um cliente)"""
+        calculo = calcular_gasto_energetico(
+            [dados['peso']], [dados['altura']], [dados['idade']], [dados['sexo']],
+            [dados.get('percentual_gordura')], [dados['nivel_atividade']], [dados['objetivo']]
+        )
+        valores = {campo: float(valores[0]) for campo, valores in calculo.items()}
+        ajuste_calorico = round(valores['ajuste_objetivo'], 1)
         
-        # Ajustar baseado no objetivo
-        ajuste_calorico = self._calcular_ajuste_por_objetivo(objetivo, dados)
-        calorias_alvo = get + ajuste_calorico
+        # Gasto medido pelo balanço energético substitui o das equações quando há histórico suficiente
+        metodo_get = 'equacoes'
+        get_equacoes = valores['get']
+        if gasto_adaptativo and gasto_adaptativo.get('confiavel'):
+            metodo_get = 'adaptativo'
+            valores['get'] = gasto_adaptativo['gasto']
+            valores['total'] = valores['get'] + valores['ajuste_objetivo']
         
         return {
-            'tmb_mifflin': round(tmb_mifflin),
-            'tmb_katch': round(tmb_katch) if tmb_katch else None,
-            'tmb_utilizada': round(tmb_final),
-            'fator_atividade': fator_atividade,
-            'get': round(get),
+            'metodo_get': metodo_get,
+            'get_equacoes': round(get_equacoes),
+            'gasto_adaptativo': gasto_adaptativo,
+            'tmb_mifflin': round(valores['tmb_mifflin']),
+            'tmb_katch': None if math.isnan(valores['tmb_katch']) else round(valores['tmb_katch']),
+            'tmb_cunningham': None if math.isnan(valores['tmb_cunningham']) else round(valores['tmb_cunningham']),
+            'tmb_utilizada': round(valores['tmb_utilizada']),
+            'fator_atividade': valores['fator_atividade'],
+            'get': round(valores['get']),
             'ajuste_objetivo': ajuste_calorico,
-            'total': round(calorias_alvo),
+            'total': round(valores['total']),
             'deficit_superavit': ajuste_calorico
         }
     
-    def _calcular_ajuste_por_objetivo(self, objetivo, dados):
-        """Calcula ajuste calórico baseado no objetivo"""
-        peso = dados['peso']
-        
-        if 'cutting' in objetivo or 'emagrecimento' in objetivo:
-            # Déficit de 300-500 kcal ou 20-25% do GET
-            return -min(500, peso * 7)  # ~7 kcal/kg para déficit moderado
-        elif 'bulking' in objetivo or 'hipertrofia' in objetivo:
-            # Superávit de 200-400 kcal
-            return min(400, peso * 5)  # ~5 kcal/kg para superávit conservador
-        elif 'recomposicao' in objetivo:
-            # Manutenção ou déficit muito leve
-            return -min(200, peso * 2)
-        else:
-            return 0  # manutenção
+    def _chave_objetivo(self, objetivo):
+        """Objetivo em texto livre -> cutting, bulking, performance ou manutencao"""
+        return chave_objetivo(objetivo)
     
     def _calcular_distribuicao_macros(self, dados, necessidades_caloricas):
         """Calcula distribuição de macronutrientes"""
@@ -201,33 +255,14 @@ class NutricaoEstrategicaModule:
         objetivo = dados['objetivo'].lower()
         calorias_totais = necessidades_caloricas['total']
         
-        # Definir objetivo nutricional
-        obj_key = 'cutting' if 'cutting' in objetivo or 'emagrecimento' in objetivo else \
-                  'bulking' if 'bulking' in objetivo or 'hipertrofia' in objetivo else \
-                  'performance' if 'performance' in objetivo else 'manutencao'
-        
-        macros_ref = self.macros_por_objetivo[obj_key]
-        
-        # Calcular proteína
-        proteina_g = peso * macros_ref['proteina']['max']
+        metas = calcular_metas_macros([peso], [calorias_totais], [objetivo])
+        proteina_g, carboidrato_g, gordura_g = (
+            float(metas[campo][0]) for campo in ('proteina_g', 'carboidrato_g', 'gordura_g')
+        )
         proteina_kcal = proteina_g * 4
-        
-        # Calcular gordura
-        gordura_g = peso * macros_ref['gordura']['max']
+        carboidrato_kcal = carboidrato_g * 4
         gordura_kcal = gordura_g * 9
         
-        # Calcular carboidrato (resto das calorias)
-        carboidrato_kcal = calorias_totais - proteina_kcal - gordura_kcal
-        carboidrato_g = carboidrato_kcal / 4
-        
-        # Ajustar se carboidrato ficar muito baixo
-        if carboidrato_g < peso * 2 and obj_key != 'cutting':
-            carboidrato_g = peso * 3
-            carboidrato_kcal = carboidrato_g * 4
-            # Reajustar gordura
-            gordura_kcal = calorias_totais - proteina_kcal - carboidrato_kcal
-            gordura_g = gordura_kcal / 9
-        
         return {
             'calorias_totais': round(calorias_totais),
             'proteina': {
@@ -311,101 +346,106 @@ class NutricaoEstrategicaModule:
         
         return estrategias
     
-    def _gerar_plano_refeicoes(self, dados, distribuicao_macros):
+    def _gerar_plano_refeicoes(self, dados, distribuicao_macros, receitas=None):
         """Gera plano de refeições detalhado"""
         numero_refeicoes = dados.get('numero_refeicoes', 5)
         objetivo = dados['objetivo'].lower()
+        periodo = periodo_treino(dados.get('horario_treino'))
         
         # Distribuição de macros por refeição
         distribuicao_refeicoes = self._calcular_distribuicao_por_refeicao(
-            distribuicao_macros, numero_refeicoes, objetivo
+            distribuicao_macros, numero_refeicoes, objetivo, periodo
         )
         
+        # Receitas (padrão + do coach) escaladas para as metas de cada refeição
+        livro_receitas = self.receitas.com_receitas(receitas)
+        excluir = componentes_excluidos(dados.get('alergias_restricoes', []))
+        escolhidas, fixos = self._receitas_escolhidas(dados, distribuicao_refeicoes, livro_receitas, excluir)
+        
+        # Alimentos e gramagens de todas as refeições do dia, otimizados em conjunto
+        # (os ingredientes das receitas escolhidas entram como itens fixos)
+        otimizacao = self.otimizador.otimizar_dia(distribuicao_refeicoes, dados.get('alergias_restricoes', []),
+                                                  fixos=fixos)
+        
         # Sugestões de alimentos por refeição
         refeicoes = {}
         
         for refeicao, macros in distribuicao_refeicoes.items():
             refeicoes[refeicao] = {
                 'macronutrientes': macros,
-                'sugestoes_alimentos': self._sugerir_alimentos_refeicao(refeicao, macros, objetivo),
-                'timing': self._definir_timing_refeicao(refeicao, numero_refeicoes),
+                'sugestoes_alimentos': self._sugerir_alimentos_refeicao(refeicao, otimizacao[refeicao]),
+                'receitas_sugeridas': livro_receitas.sugerir(refeicao, macros, excluir),
+                'timing': self._definir_timing_refeicao(refeicao, numero_refeicoes, objetivo, periodo),
                 'observacoes': self._gerar_observacoes_refeicao(refeicao, objetivo)
             }
+            if refeicao in escolhidas:
+                refeicoes[refeicao]['receita'] = escolhidas[refeicao]
         
         return refeicoes
     
-    def _calcular_distribuicao_por_refeicao(self, distribuicao_macros, numero_refeicoes, objetivo):
-        """Calcula distribuição de macros por refeição"""
-        distribuicao = {}
-        
-        if numero_refeicoes == 5:
-            # Distribuição padrão para 5 refeições
-            refeicoes_base = ['cafe_manha', 'lanche_manha', 'almoco', 'pre_treino', 'pos_treino', 'jantar', 'ceia']
-            
-            # Percentuais por refeição
-            percentuais = {
-                'cafe_manha': 0.20,
-                'lanche_manha': 0.10,
-                'almoco': 0.25,
-                'pre_treino': 0.15,
-                'pos_treino': 0.15,
-                'jantar': 0.20,
-                'ceia': 0.10
-            }
-            
-            # Ajustar proteína para distribuição uniforme
-            proteina_por_refeicao = distribuicao_macros['proteina']['gramas'] / numero_refeicoes
-            
-            for refeicao, percentual in list(percentuais.items())[:numero_refeicoes]:
-                distribuicao[refeicao] = {
-                    'calorias': round(distribuicao_macros['calorias_totais'] * percentual),
-                    'proteina': round(proteina_por_refeicao, 1),
-                    'carboidrato': round(distribuicao_macros['carboidrato']['gramas'] * percentual, 1),
-                    'gordura': round(distribuicao_macros['gordura']['gramas'] * percentual, 1)
-                }
-        
-        return distribuicao
+    def _receitas_escolhidas(self, dados, distribuicao_refeicoes, livro_receitas, excluir):
+        """
+        Receitas escolhidas em dados['receitas_refeicoes'] (refeição -> id ou {'id', 'porcoes'}).
+        Retorna (refeição -> receita e porções, refeição -> ingredientes como itens fixos do otimizador).
+        """
+        escolhidas, fixos = {}, {}
+        for refeicao, escolha in (dados.get('receitas_refeicoes') or {}).items():
+            if refeicao not in distribuicao_refeicoes:
+                raise ValueError(f'Refeição inexistente no plano: {refeicao} '
+                                 f'(refeições: {", ".join(distribuicao_refeicoes)})')
+            indice, porcoes = livro_receitas.escolher(escolha, distribuicao_refeicoes[refeicao], excluir)
+            receita = livro_receitas.receitas[indice]
+            escolhidas[refeicao] = {'id': receita['id'], 'nome': receita['nome'], 'porcoes': porcoes}
+            fixos[refeicao] = livro_receitas.ingredientes(indice, porcoes)
+        return escolhidas, fixos
+    
+    def _avaliar_micronutrientes(self, dados, plano_refeicoes, referencias=None):
+        """Cobertura de micronutrientes (RDA por sexo e idade) dos itens de todas as refeições"""
+        itens = [item for refeicao in plano_refeicoes.values() for item in refeicao['sugestoes_alimentos']['itens']]
+        return self.micronutrientes.avaliar(
+            [self.base_alimentos.posicao(item['id']) for item in itens],
+            [item['gramas'] for item in itens],
+            dados['sexo'], dados.get('idade'),
+            exames=dados.get('exames_recentes'),
+            referencias=referencias or obter_tabelas_referencia()
+        )
     
-    def _sugerir_alimentos_refeicao(self, refeicao, macros, objetivo):
-        """Sugere alimentos específicos para cada refeição"""
-        sugestoes = {
-            'proteinas': [],
-            'carboidratos': [],
-            'gorduras': [],
-            'exemplo_refeicao': ''
+    def _gerar_ciclagem_semanal(self, dados, distribuicao_macros, estrategias):
+        """Padrão de ciclagem + agenda de treinos -> calorias, macros e refeições de cada dia"""
+        padrao = dados.get('padrao_ciclagem') or \
+            estrategias['detalhes'].get('ciclagem', {}).get('distribuicao_semanal')
+        return gerar_ciclagem(
+            distribuicao_macros,
+            dados.get('numero_refeicoes', 5),
+            self._chave_objetivo(dados['objetivo'].lower()),
+            periodo_treino(dados.get('horario_treino')),
+            padrao,
+            dados.get('agenda_treinos')
+        )
+    
+    def _calcular_distribuicao_por_refeicao(self, distribuicao_macros, numero_refeicoes, objetivo,
+                                            periodo=PERIODO_TREINO_PADRAO):
+        """Calcula distribuição de macros por refeição (2 a 8 refeições, carboidrato concentrado no treino)"""
+        return distribuir_macros(
+            distribuicao_macros['proteina']['gramas'],
+            distribuicao_macros['carboidrato']['gramas'],
+            distribuicao_macros['gordura']['gramas'],
+            numero_refeicoes, self._chave_objetivo(objetivo), periodo
+        )
+    
+    def _sugerir_alimentos_refeicao(self, refeicao, otimizacao):
+        """Sugere alimentos e quantidades para a refeição a partir da otimização de macros"""
+        itens = otimizacao['itens']
+        return {
+            'proteinas': otimizacao['candidatos'].get('proteina', []),
+            'carboidratos': otimizacao['candidatos'].get('carboidrato', []),
+            'gorduras': otimizacao['candidatos'].get('gordura', []),
+            'itens': itens,
+            'totais': otimizacao['totais'],
+            'desvio_meta': otimizacao['desvio'],
+            'dentro_tolerancia': otimizacao['dentro_tolerancia'],
+            'exemplo_refeicao': ' + '.join(f"{item['gramas']}g {item['alimento'].lower()}" for item in itens)
         }
-        
-        if refeicao == 'cafe_manha':
-            sugestoes['proteinas'] = ['Ovos inteiros', 'Clara de ovos', 'Whey protein', 'Iogurte grego']
-            sugestoes['carboidratos'] = ['Aveia', 'Frutas', 'Pão integral', 'Tapioca']
-            sugestoes['gorduras'] = ['Abacate', 'Oleaginosas', 'Azeite', 'Pasta de amendoim']
-            sugestoes['exemplo_refeicao'] = f'3 ovos inteiros + 50g aveia + 1/2 abacate'
-        
-        elif refeicao == 'pre_treino':
-            sugestoes['proteinas'] = ['Whey protein', 'BCAA']
-            sugestoes['carboidratos'] = ['Banana', 'Aveia', 'Dextrose', 'Batata doce']
-            sugestoes['gorduras'] = ['MCT oil (mínimo)']
-            sugestoes['exemplo_refeicao'] = f'1 banana + 30g whey protein + 30g aveia'
-        
-        elif refeicao == 'pos_treino':
-            sugestoes['proteinas'] = ['Whey protein', 'Albumina']
-            sugestoes['carboidratos'] = ['Dextrose', 'Maltodextrina', 'Banana', 'Arroz branco']
-            sugestoes['gorduras'] = ['Evitar por 1-2h pós-treino']
-            sugestoes['exemplo_refeicao'] = f'40g whey + 30g dextrose + 1 banana'
-        
-        elif refeicao in ['almoco', 'jantar']:
-            sugestoes['proteinas'] = ['Frango', 'Peixe', 'Carne vermelha magra', 'Ovos']
-            sugestoes['carboidratos'] = ['Arroz integral', 'Batata doce', 'Quinoa', 'Legumes']
-            sugestoes['gorduras'] = ['Azeite', 'Abacate', 'Oleaginosas']
-            sugestoes['exemplo_refeicao'] = f'150g frango + 100g batata doce + salada + azeite'
-        
-        elif refeicao == 'ceia':
-            sugestoes['proteinas'] = ['Caseína', 'Iogurte grego', 'Cottage', 'Ovos']
-            sugestoes['carboidratos'] = ['Aveia', 'Frutas vermelhas (mínimo se cutting)']
-            sugestoes['gorduras'] = ['Oleaginosas', 'Pasta de amendoim']
-            sugestoes['exemplo_refeicao'] = f'30g caseína + 10 amêndoas'
-        
-        return sugestoes
     
     def _definir_timing_nutricional(self, dados):
         """Define timing nutricional otimizado"""
@@ -604,21 +644,10 @@ class NutricaoEstrategicaModule:
             ]
         }
     
-    def _definir_timing_refeicao(self, refeicao, numero_refeicoes):
+    def _definir_timing_refeicao(self, refeicao, numero_refeicoes, objetivo, periodo=PERIODO_TREINO_PADRAO):
         """Define horários sugeridos para cada refeição"""
-        horarios = {
-            5: {
-                'cafe_manha': '07:00',
-                'lanche_manha': '10:00',
-                'almoco': '13:00',
-                'pre_treino': '16:00',
-                'pos_treino': '18:00',
-                'jantar': '20:00',
-                'ceia': '22:00'
-            }
-        }
-        
-        return horarios.get(numero_refeicoes, {}).get(refeicao, 'A definir')
+        refeicoes, horarios, _ = modelo_distribuicao(numero_refeicoes, self._chave_objetivo(objetivo), periodo)
+        return dict(zip(refeicoes, horarios)).get(refeicao, 'A definir')
     
     def _gerar_observacoes_refeicao(self, refeicao, objetivo):
         """Gera observações específicas por refeição"""
@@ -0,0 +1,123 @@
+"""
+GASTO ENERGÉTICO ADAPTATIVO
+Estimativa do gasto real a partir das pesagens e da ingestão registradas: o peso é
+suavizado por um filtro de Kalman (com a ingestão como entrada de controle) e o gasto
+sai do balanço energético, atualizado em O(1) por dia a partir do estado armazenado
+"""
+
+import math
+from datetime import date
+
+# Energia armazenada por kg de variação de peso corporal (kcal)
+KCAL_POR_KG = 7700
+
+# Variância de uma pesagem isolada (água, glicogênio, conteúdo intestinal): ~0,6 kg de desvio
+RUIDO_PESAGEM = 0.36
+
+# Variância da mudança real de peso por dia, além do previsto pelo balanço
+RUIDO_PROCESSO = 0.0025
+
+# Peso de cada dia de balanço na média exponencial do gasto (meia-vida de ~2 semanas)
+ALFA_GASTO = 0.05
+
+# Peso de cada dia registrado na média exponencial da ingestão (usada nos dias sem registro)
+ALFA_INGESTAO = 0.1
+
+# Dias de balanço completo (peso + ingestão) antes de a estimativa substituir as equações
+DIAS_MINIMOS = 14
+
+# Sem pesagem há mais que isso, a estimativa deixa de ser usada
+VALIDADE_DIAS = 14
+
+# Gasto inicial quando não há perfil para as equações (kcal por kg)
+KCAL_POR_KG_INICIAL = 30
+
+CAMPOS_ESTADO = (
+    'ultimo_registro', 'data_peso', 'peso', 'variancia', 'gasto',
+    'dias_balanco', 'ingestao_pendente', 'dias_pendentes', 'ingestao_media'
+)
+
+
+def iniciar_estado(data, peso, gasto_inicial=None):
+    """Estado a partir da primeira pesagem; o gasto parte das equações (ou de 30 kcal/kg)"""
+    return {
+        'ultimo_registro': data,
+        'data_peso': data,
+        'peso': float(peso),
+        'variancia': RUIDO_PESAGEM,
+        'gasto': float(gasto_inicial or peso * KCAL_POR_KG_INICIAL),
+        'dias_balanco': 0,
+        'ingestao_pendente': 0.0,
+        'dias_pendentes': 0,
+        'ingestao_media': None
+    }
+
+
+def atualizar_gasto(estado, data, peso=None, calorias=None, gasto_inicial=None):
+    """
+    Inclui o registro de um dia (pesagem em jejum e/ou calorias ingeridas no dia) e
+    devolve o novo estado. Os dias devem chegar em ordem; a ingestão de um dia só entra
+    no balanço na pesagem seguinte. Sem estado, a primeira pesagem inicia o filtro.
+    """
+    if estado is None:
+        if peso is None:
+            return None
+        estado = iniciar_estado(data, peso, gasto_inicial)
+        peso = None
+    elif data <= estado['ultimo_registro']:
+        raise ValueError(f'Registro de {data.isoformat()} não é posterior ao último processado')
+
+    estado = dict(estado)
+    if peso is not None:
+        dias = (data - estado['data_peso']).days
+        balanco_completo = estado['dias_pendentes'] == dias
+
+        # Previsão: peso anterior + balanço energético do intervalo. Dias sem ingestão registrada
+        # entram com a média recente da ingestão, para a tendência acompanhar o balanço real
+        # (prevista parada, ela ficaria para trás e o próximo intervalo completo atribuiria ao
+        # gasto a perda acumulada)
+        media = estado.get('ingestao_media')
+        ingestao = estado['ingestao_pendente'] + \
+            (estado['gasto'] if media is None else media) * (dias - estado['dias_pendentes'])
+        previsto = estado['peso'] + (ingestao - estado['gasto'] * dias) / KCAL_POR_KG
+        variancia = estado['variancia'] + RUIDO_PROCESSO * dias
+        ganho = variancia / (variancia + RUIDO_PESAGEM)
+        tendencia = previsto + ganho * (float(peso) - previsto)
+
+        if balanco_completo:
+            gasto_intervalo = (estado['ingestao_pendente'] - KCAL_POR_KG * (tendencia - estado['peso'])) / dias
+            alfa = 1 - (1 - ALFA_GASTO) ** dias
+            estado['gasto'] += alfa * (gasto_intervalo - estado['gasto'])
+            estado['dias_balanco'] += dias
+
+        estado.update({
+            'data_peso': data,
+            'peso': tendencia,
+            'variancia': (1 - ganho) * variancia,
+            'ingestao_pendente': 0.0,
+            'dias_pendentes': 0
+        })
+
+    if calorias is not None:
+        estado['ingestao_pendente'] += float(calorias)
+        estado['dias_pendentes'] += 1
+        media = estado.get('ingestao_media')
+        estado['ingestao_media'] = float(calorias) if media is None else media + ALFA_INGESTAO * (calorias - media)
+    estado['ultimo_registro'] = data
+    return estado
+
+
+def estimativa_gasto(estado, hoje=None):
+    """Gasto estimado, peso de tendência e se a estimativa já pode substituir as equações"""
+    if not estado:
+        return None
+    hoje = hoje or date.today()
+    dias_sem_pesagem = (hoje - estado['data_peso']).days
+    return {
+        'gasto': round(estado['gasto']),
+        'peso_tendencia': round(estado['peso'], 2),
+        'incerteza_peso': round(math.sqrt(estado['variancia']), 2),
+        'dias_balanco': estado['dias_balanco'],
+        'ultima_pesagem': estado['data_peso'].isoformat(),
+        'confiavel': estado['dias_balanco'] >= DIAS_MINIMOS and dias_sem_pesagem <= VALIDADE_DIAS
+    }
@@ -0,0 +1,98 @@
+"""
+RECÁLCULO INCREMENTAL DO PLANO NUTRICIONAL
+Cada seção do plano declara os campos de entrada e as seções de que depende; a partir
+de um plano gravado e dos campos alterados, só as seções afetadas são refeitas. Uma
+seção refeita que não mudou (ou mudou dentro da tolerância) não propaga o recálculo.
+"""
+
+# Seções na ordem de cálculo: (campos de entrada, seções das quais depende)
+SECOES_PLANO = {
+    'calculos_detalhados': (
+        ('peso', 'altura', 'idade', 'sexo', 'percentual_gordura', 'nivel_atividade', 'objetivo', 'gasto_adaptativo'),
+        ()
+    ),
+    'macronutrientes': (('peso', 'objetivo'), ('calculos_detalhados',)),
+    'estrategias_nutricionais': (('objetivo', 'nivel_atividade'), ()),
+    'plano_refeicoes': (
+        ('numero_refeicoes', 'objetivo', 'horario_treino', 'alergias_restricoes', 'receitas_refeicoes', 'receitas'),
+        ('macronutrientes',)
+    ),
+    'micronutrientes': (('sexo', 'idade', 'exames_recentes'), ('plano_refeicoes',)),
+    'ciclagem_semanal': (
+        ('padrao_ciclagem', 'agenda_treinos', 'ciclagem_carboidratos', 'numero_refeicoes', 'objetivo', 'horario_treino'),
+        ('macronutrientes', 'estrategias_nutricionais')
+    ),
+    'timing_nutricional': (('objetivo', 'horario_treino', 'duracao_treino'), ()),
+    'periodizacao': (('objetivo',), ()),
+    'suplementacao_nutricional': (('objetivo',), ('macronutrientes',)),
+    'monitoramento': ((), ()),
+    'resumo_executivo': (
+        ('numero_refeicoes', 'alergias_restricoes'),
+        ('calculos_detalhados', 'macronutrientes', 'estrategias_nutricionais')
+    )
+}
+
+# Entradas que não vêm dos dados do plano (histórico de peso/ingestão e receitas do coach)
+ENTRADAS_EXTERNAS = ('gasto_adaptativo', 'receitas')
+
+CAMPOS_PLANO = tuple(sorted(
+    {campo for campos, _ in SECOES_PLANO.values() for campo in campos} - set(ENTRADAS_EXTERNAS)
+))
+
+# Metas novas dentro disso mantêm os macros gravados (e tudo o que depende deles):
+# a pesagem semanal só muda o plano quando a diferença é relevante na prática
+TOLERANCIA_AJUSTE_KCAL = 50
+TOLERANCIA_AJUSTE_MACRO_G = 5
+
+
+def entradas_plano(dados):
+    """Campos dos dados usados pelas seções (gravados junto com o plano)"""
+    return {campo: dados[campo] for campo in CAMPOS_PLANO if campo in dados}
+
+
+def campos_alterados(anteriores, novos):
+    """Campos declarados cujo valor mudou (inclusive os adicionados ou removidos)"""
+    return {campo for campo in CAMPOS_PLANO if anteriores.get(campo) != novos.get(campo)}
+
+
+def macros_equivalentes(anterior, novo):
+    """Metas de macros que diferem menos que a tolerância de ajuste"""
+    return abs(anterior['calorias_totais'] - novo['calorias_totais']) < TOLERANCIA_AJUSTE_KCAL and all(
+        abs(anterior[macro]['gramas'] - novo[macro]['gramas']) < TOLERANCIA_AJUSTE_MACRO_G
+        for macro in ('proteina', 'carboidrato', 'gordura')
+    )
+
+
+EQUIVALENCIAS = {'macronutrientes': macros_equivalentes}
+
+
+def calcular_secoes(construtores, anterior=None, alterados=(), forcar=()):
+    """
+    Calcula as seções na ordem declarada. construtores: seção -> função(seções já
+    calculadas). Sem plano anterior tudo é calculado; com ele, só as seções cujos campos
+    mudaram, que dependem de uma seção modificada, que faltam no plano ou forçadas.
+    Retorna (seções, recalculadas, modificadas).
+    """
+    alterados = set(alterados)
+    secoes, recalculadas, modificadas = {}, [], set()
+    for secao, (campos, dependencias) in SECOES_PLANO.items():
+        refazer = (
+            anterior is None or secao not in anterior or secao in forcar
+            or alterados.intersection(campos) or modificadas.intersection(dependencias)
+        )
+        if not refazer:
+            secoes[secao] = anterior[secao]
+            continue
+
+        secoes[secao] = construtores[secao](secoes)
+        recalculadas.append(secao)
+        if anterior is not None and secao in anterior:
+            equivalente = EQUIVALENCIAS.get(secao)
+            if equivalente and anterior[secao] is not None and secoes[secao] is not None \
+                    and equivalente(anterior[secao], secoes[secao]):
+                secoes[secao] = anterior[secao]
+                continue
+            if secoes[secao] == anterior[secao]:
+                continue
+        modificadas.add(secao)
+    return secoes, recalculadas, modificadas
@@ -0,0 +1,177 @@
+"""
+COBERTURA DE MICRONUTRIENTES
+Totais de micronutrientes do plano (composição dos alimentos usados x gramas) comparados
+com as RDAs por sexo e idade; lacunas ligadas aos marcadores laboratoriais correspondentes
+"""
+
+import numpy as np
+
+from modules.nutricao_alimentos import obter_base_alimentos
+
+# Micronutriente -> (coluna na tabela de composição, unidade)
+MICRONUTRIENTES = {
+    'ferro': ('ferro_mg', 'mg'),
+    'calcio': ('calcio_mg', 'mg'),
+    'magnesio': ('magnesio_mg', 'mg'),
+    'zinco': ('zinco_mg', 'mg'),
+    'vitamina_d': ('vitamina_d_mcg', 'mcg'),
+    'b12': ('b12_mcg', 'mcg'),
+    'folato': ('folato_mcg', 'mcg')
+}
+NOMES_MICRONUTRIENTES = tuple(MICRONUTRIENTES)
+
+# RDA (IOM/DRI) na ordem de MICRONUTRIENTES, por sexo e idade máxima da faixa
+RDA = {
+    'masculino': (
+        (18, (11, 1300, 410, 11, 15, 2.4, 400)),
+        (30, (8, 1000, 400, 11, 15, 2.4, 400)),
+        (70, (8, 1000, 420, 11, 15, 2.4, 400)),
+        (200, (8, 1200, 420, 11, 20, 2.4, 400))
+    ),
+    'feminino': (
+        (18, (15, 1300, 360, 9, 15, 2.4, 400)),
+        (30, (18, 1000, 310, 8, 15, 2.4, 400)),
+        (50, (18, 1000, 320, 8, 15, 2.4, 400)),
+        (70, (8, 1200, 320, 8, 15, 2.4, 400)),
+        (200, (8, 1200, 320, 8, 20, 2.4, 400))
+    )
+}
+IDADE_PADRAO = 30
+
+# Marcador laboratorial que reflete cada micronutriente
+MARCADORES_RELACIONADOS = {
+    'ferro': 'ferritina',
+    'magnesio': 'magnesio',
+    'zinco': 'zinco',
+    'vitamina_d': 'vitamina_d',
+    'b12': 'b12',
+    'folato': 'acido_folico'
+}
+STATUS_MARCADOR_BAIXO = ('BAIXO', 'SUBÓTIMO_BAIXO')
+
+# Cobertura da RDA: abaixo de 70% é baixa, abaixo de 100% é parcial
+COBERTURA_BAIXA = 0.7
+
+FONTES_POR_NUTRIENTE = 2
+
+
+def metas_rda(sexo, idade=None):
+    """RDAs (na ordem de MICRONUTRIENTES) para o sexo e a idade"""
+    faixas = RDA['feminino' if (sexo or '').lower() == 'feminino' else 'masculino']
+    idade = IDADE_PADRAO if idade is None else idade
+    for idade_maxima, valores in faixas:
+        if idade <= idade_maxima:
+            return np.array(valores, dtype=np.float64)
+    return np.array(faixas[-1][1], dtype=np.float64)
+
+
+def _status_marcador(valor, referencia):
+    if valor < referencia['min']:
+        return 'BAIXO'
+    if valor > referencia['max']:
+        return 'ELEVADO'
+    if valor < referencia['ideal_min']:
+        return 'SUBÓTIMO_BAIXO'
+    if valor > referencia['ideal_max']:
+        return 'SUBÓTIMO_ALTO'
+    return 'IDEAL'
+
+
+class CoberturaMicronutrientes:
+    """Linhas de micronutrientes da base em um bloco contíguo (micronutrientes x alimentos)"""
+
+    def __init__(self, base=None):
+        self.base = base or obter_base_alimentos()
+        self.matriz = np.ascontiguousarray(
+            self.base.matriz[[self.base.posicao_nutriente[coluna] for coluna, _ in MICRONUTRIENTES.values()]],
+            dtype=np.float64
+        )
+
+    def totais(self, posicoes, gramas):
+        """
+        Composição por alimento (micronutrientes x alimentos do plano) e totais do dia:
+        só as colunas dos alimentos usados entram no produto com o vetor de gramas
+        """
+        contribuicao = self.matriz[:, posicoes] * (np.asarray(gramas, dtype=np.float64) / 100)
+        return contribuicao, contribuicao.sum(axis=1)
+
+    def avaliar(self, posicoes, gramas, sexo, idade=None, exames=None, referencias=None):
+        """
+        Cobertura de cada micronutriente e lacunas. exames: marcador -> valor mais recente,
+        classificado com as referências informadas (as do coach, quando houver).
+        """
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        contribuicao, totais = self.totais(posicoes, gramas)
+        metas = metas_rda(sexo, idade)
+        cobertura = totais / metas
+
+        nutrientes = {}
+        lacunas = []
+        for indice, nome in enumerate(NOMES_MICRONUTRIENTES):
+            status = 'baixa' if cobertura[indice] < COBERTURA_BAIXA else \
+                     'parcial' if cobertura[indice] < 1 else 'adequada'
+            fontes = np.argsort(-contribuicao[indice], kind='stable')[:FONTES_POR_NUTRIENTE]
+            nutrientes[nome] = {
+                'total': round(float(totais[indice]), 1),
+                'meta_rda': float(metas[indice]),
+                'unidade': MICRONUTRIENTES[nome][1],
+                'cobertura_percentual': round(float(cobertura[indice]) * 100),
+                'status': status,
+                'principais_fontes': [
+                    self.base.nomes[posicoes[fonte]] for fonte in fontes if contribuicao[indice, fonte] > 0
+                ]
+            }
+
+            lacuna = self._lacuna(nome, status, exames, referencias, sexo, idade)
+            if lacuna:
+                lacuna['cobertura_percentual'] = nutrientes[nome]['cobertura_percentual']
+                lacunas.append(lacuna)
+
+        ordem_prioridade = {'alta': 0, 'moderada': 1, 'baixa': 2}
+        lacunas.sort(key=lambda lacuna: (ordem_prioridade[lacuna['prioridade']], lacuna['cobertura_percentual']))
+        return {'nutrientes': nutrientes, 'lacunas': lacunas}
+
+    def _lacuna(self, nome, status, exames, referencias, sexo, idade):
+        """Cruza a cobertura da dieta com o marcador laboratorial do micronutriente"""
+        marcador = MARCADORES_RELACIONADOS.get(nome)
+        valor = (exames or {}).get(marcador) if marcador else None
+        referencia = referencias.resolver(marcador, sexo, idade) if valor is not None and referencias else None
+        status_marcador = _status_marcador(valor, referencia) if referencia else None
+        marcador_baixo = status_marcador in STATUS_MARCADOR_BAIXO
+
+        if status == 'adequada' and not marcador_baixo:
+            return None
+        if status == 'adequada':
+            prioridade = 'moderada'
+            observacao = 'Ingestão adequada com marcador baixo: investigar absorção, perdas ou demanda aumentada'
+        elif marcador_baixo:
+            prioridade = 'alta'
+            observacao = 'Ingestão abaixo da RDA confirmada pelo exame: ajustar dieta e considerar suplementação'
+        elif status_marcador:
+            prioridade = 'baixa'
+            observacao = 'Ingestão abaixo da RDA com marcador adequado: reforçar fontes alimentares'
+        else:
+            prioridade = 'moderada' if status == 'baixa' else 'baixa'
+            observacao = f'Ingestão abaixo da RDA; dosar {marcador} para confirmar' if marcador else \
+                'Ingestão abaixo da RDA: reforçar fontes alimentares'
+
+        return {
+            'nutriente': nome,
+            'status_ingestao': status,
+            'marcador': marcador,
+            'valor_marcador': None if valor is None else round(float(valor), 2),
+            'status_marcador': status_marcador,
+            'prioridade': prioridade,
+            'observacao': observacao
+        }
+
+
+_coberturas = {}
+
+
+def obter_cobertura(base=None):
+    """Calculadora de cobertura por versão da base de alimentos"""
+    base = base or obter_base_alimentos()
+    if base.versao not in _coberturas:
+        _coberturas[base.versao] = CoberturaMicronutrientes(base)
+    return _coberturas[base.versao]
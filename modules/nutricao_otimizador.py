@@ -0,0 +1,332 @@
+"""
+OTIMIZADOR DE REFEIÇÕES
+Escolha de alimentos e gramagens para atingir as metas de macronutrientes de cada
+refeição: mínimos quadrados ponderados resolvidos em lote (NumPy) sobre todas as
+combinações proteína x carboidrato x gordura dos candidatos da refeição
+"""
+
+import time
+from itertools import product
+
+import numpy as np
+
+from modules.nutricao_alimentos import componentes_excluidos, obter_base_alimentos
+
+MACROS = ('energia_kcal', 'proteina_g', 'carboidrato_g', 'gordura_g')
+CHAVES_META = ('calorias', 'proteina', 'carboidrato', 'gordura')
+PAPEIS = ('proteina', 'carboidrato', 'gordura')
+
+# Nome da refeição no plano -> marcação de refeições da tabela de alimentos
+TIPO_REFEICAO = {
+    'cafe_manha': 'cafe',
+    'lanche_manha': 'lanche',
+    'lanche_tarde': 'lanche',
+    'lanche_noite': 'lanche',
+    'lanche': 'lanche',
+    'almoco': 'almoco',
+    'jantar': 'jantar',
+    'pre_treino': 'pre_treino',
+    'pos_treino': 'pos_treino',
+    'ceia': 'ceia'
+}
+
+# Refeições principais recebem uma porção fixa de vegetais
+REFEICOES_COM_VEGETAIS = ('almoco', 'jantar')
+PORCAO_VEGETAIS_G = 100
+
+# Porção (mín, máx) em gramas por categoria
+LIMITES_PORCAO = {
+    'gorduras_saudaveis': (5, 40),
+    'suplementos': (10, 60),
+    'frutas': (50, 300),
+    'laticinios': (50, 400)
+}
+LIMITES_PORCAO_PADRAO = (30, 350)
+LIMITES_PORCAO_OLEOS = (3, 15)
+
+ARREDONDAMENTO_G = 5
+
+# Candidatos por papel (10 x 10 x 10 = 1000 combinações por refeição);
+# depois de estourado o orçamento de tempo, as refeições restantes usam o mínimo
+CANDIDATOS_POR_PAPEL = 10
+CANDIDATOS_MINIMOS = 4
+
+# Desvio aceito por macro: o maior entre 10% e 5 g (50 kcal para calorias)
+TOLERANCIA_RELATIVA = 0.10
+TOLERANCIA_ABSOLUTA = np.array([50.0, 5.0, 5.0, 5.0])
+
+# Penalidade por repetir na mesma refeição do dia um alimento já usado
+PENALIDADE_REPETICAO = 0.05
+
+# Orçamento de tempo por plano diário (segundos)
+ORCAMENTO_PADRAO = 0.05
+
+# Tamanho dos blocos de combinações avaliados entre checagens do prazo
+BLOCO_COMBINACOES = 250
+
+
+class OtimizadorRefeicoes:
+    """Candidatos e limites pré-calculados a partir da base de alimentos"""
+
+    def __init__(self, base=None):
+        self.base = base or obter_base_alimentos()
+        # Macros por grama (4 x alimentos)
+        self.macros = np.array([self.base.coluna(macro) for macro in MACROS], dtype=np.float64) / 100
+
+        energia_macros = self.macros[1:] * np.array([[4.0], [4.0], [9.0]])
+        total = energia_macros.sum(axis=0)
+        participacao = np.divide(energia_macros, total, out=np.zeros_like(energia_macros), where=total > 0)
+        self.papel = participacao.argmax(axis=0)
+        self.pureza = participacao.max(axis=0)
+
+        categorias = [self.base.categorias[codigo] for codigo in self.base.atributos['categoria']]
+        limites = np.array([LIMITES_PORCAO.get(categoria, LIMITES_PORCAO_PADRAO) for categoria in categorias], dtype=np.float64)
+        oleos = self.macros[3] > 0.9
+        limites[oleos] = LIMITES_PORCAO_OLEOS
+        self.minimo, self.maximo = limites.T
+
+        self.vegetais = set(self.base.filtrar(categorias=['vegetais']).tolist())
+
+    def candidatos(self, refeicao, excluir=(), quantidade=CANDIDATOS_POR_PAPEL, permitidos=None, tipo=None):
+        """
+        Candidatos de cada papel para a refeição, do mais 'puro' para o menos. tipo: marcação
+        de refeição da base a usar no lugar da própria. Com 'permitidos' (rotação), só eles
+        entram e a marcação não é aplicada: a rotação já os tirou da refeição ou de vizinhas.
+        """
+        tipo = None if permitidos is not None else tipo or TIPO_REFEICAO.get(refeicao)
+        posicoes = np.array([
+            posicao for posicao in self.base.filtrar(refeicao=tipo, excluir_componentes=excluir).tolist()
+            if posicao not in self.vegetais and (permitidos is None or posicao in permitidos)
+        ], dtype=np.int64)
+        candidatos = {}
+        for indice, papel in enumerate(PAPEIS):
+            do_papel = posicoes[self.papel[posicoes] == indice] if len(posicoes) else posicoes
+            ordem = np.argsort(-self.pureza[do_papel], kind='stable')
+            candidatos[papel] = do_papel[ordem][:quantidade]
+        return candidatos
+
+    def _resolver_bloco(self, combinacoes, alvo, pesos, penalidade, com_gordura):
+        """
+        Gramagens e erro de cada combinação (n x papéis) em um único passo vetorizado.
+        alvo e pesos: um vetor de 4 macros para todas as linhas ou um por linha (n x 4);
+        penalidade: já somada por combinação (n)
+        """
+        papeis = combinacoes.shape[1]
+        alvo = np.broadcast_to(alvo, (len(combinacoes), len(MACROS)))
+        pesos = np.broadcast_to(pesos, (len(combinacoes), len(MACROS)))
+        A = self.macros[:, combinacoes].transpose(1, 0, 2)  # (n, 4 macros, papéis)
+        Aw = A * pesos[:, :, None]
+        normal = Aw.transpose(0, 2, 1) @ Aw + np.eye(papeis) * 1e-9
+        lado_direito = (Aw.transpose(0, 2, 1) @ (alvo * pesos)[..., None])[..., 0]
+        gramas = np.linalg.solve(normal, lado_direito[..., None])[..., 0]
+
+        limite_inferior = self.minimo[combinacoes]
+        if com_gordura:
+            # Gordura dispensável quando a solução pede quase nada dela
+            gramas[:, -1] = np.where(gramas[:, -1] < limite_inferior[:, -1] / 2, 0, gramas[:, -1])
+            limite_inferior[:, -1] = np.where(gramas[:, -1] == 0, 0, limite_inferior[:, -1])
+        gramas = np.clip(gramas, limite_inferior, self.maximo[combinacoes])
+        gramas = np.round(gramas / ARREDONDAMENTO_G) * ARREDONDAMENTO_G
+        gramas = np.where(gramas == 0, 0, np.maximum(gramas, limite_inferior))
+
+        obtido = (A @ gramas[..., None])[..., 0]
+        erro = (((obtido - alvo) * pesos) ** 2).sum(axis=1) + penalidade
+        return gramas, erro
+
+    def _preparar_refeicao(self, refeicao, metas, excluir, usados, permitidos=None, fixos=()):
+        """
+        Itens fixos (ex.: ingredientes de uma receita escolhida, (posição, gramas)) e porção de
+        vegetais (refeições principais), alvo restante e pesos de cada macro
+        """
+        alvo = np.array([float(metas.get(chave, 0)) for chave in CHAVES_META])
+        itens_fixos = list(fixos)
+        posicoes_fixas = {posicao for posicao, _ in itens_fixos}
+        for posicao, gramas in itens_fixos:
+            alvo = alvo - self.macros[:, posicao] * gramas
+        if refeicao in REFEICOES_COM_VEGETAIS:
+            vegetais = [posicao for posicao in self.base.filtrar(categorias=['vegetais'], excluir_componentes=excluir).tolist()
+                        if posicao not in usados and posicao not in posicoes_fixas
+                        and (permitidos is None or posicao in permitidos)] \
+                or sorted(self.vegetais)
+            if vegetais:
+                itens_fixos.append((vegetais[0], PORCAO_VEGETAIS_G))
+                alvo = alvo - self.macros[:, vegetais[0]] * PORCAO_VEGETAIS_G
+
+        # Erros relativos: cada macro pesa pelo inverso da própria meta
+        pesos = 1 / np.maximum(np.abs(alvo), TOLERANCIA_ABSOLUTA)
+        return itens_fixos, alvo, pesos
+
+    def _sem_fixos(self, candidatos, fixos):
+        """Candidatos sem os alimentos que já entram como itens fixos (não repetem na refeição)"""
+        if not fixos:
+            return candidatos
+        posicoes = np.array([posicao for posicao, _ in fixos], dtype=np.int64)
+        return {papel: posicoes_papel[~np.isin(posicoes_papel, posicoes)] for papel, posicoes_papel in candidatos.items()}
+
+    def _papeis_cobertos(self, fixos, alvo, metas):
+        """
+        Papéis cujo macro os itens fixos (receita escolhida) já atendem: o que falta está
+        dentro da tolerância ou foi ultrapassado, então o papel fica fora da combinação
+        """
+        if not fixos:
+            return set()
+        meta = np.array([float(metas.get(chave, 0)) for chave in CHAVES_META])
+        tolerancia = np.maximum(np.abs(meta) * TOLERANCIA_RELATIVA, TOLERANCIA_ABSOLUTA)
+        return {papel for papel in PAPEIS if alvo[CHAVES_META.index(papel)] <= tolerancia[CHAVES_META.index(papel)]}
+
+    def _penalidade(self, usados):
+        penalidade = np.zeros(len(self.base))
+        if usados:
+            penalidade[list(usados)] = PENALIDADE_REPETICAO
+        return penalidade
+
+    def otimizar_refeicao(self, refeicao, metas, excluir=(), usados=(), prazo=None, permitidos=None, fixos=()):
+        """Itens (alimento, gramas) que aproximam as metas da refeição, completando os fixos"""
+        sem_tempo = prazo is not None and time.perf_counter() > prazo
+        candidatos = self._sem_fixos(
+            self.candidatos(refeicao, excluir, CANDIDATOS_MINIMOS if sem_tempo else CANDIDATOS_POR_PAPEL, permitidos),
+            fixos
+        )
+        itens_fixos, alvo, pesos = self._preparar_refeicao(refeicao, metas, excluir, usados, permitidos, fixos)
+        cobertos = self._papeis_cobertos(fixos, alvo, metas)
+        penalidade = self._penalidade(usados)
+
+        # Papéis sem candidato (ex.: proteína vegana no café) ficam de fora da combinação
+        papeis = [papel for papel in PAPEIS if len(candidatos[papel]) and papel not in cobertos]
+        if not papeis:
+            return self._montar_resultado(itens_fixos, metas)
+
+        combinacoes = np.array(list(product(*(candidatos[papel] for papel in papeis))), dtype=np.int64)
+        melhor = None
+        for inicio in range(0, len(combinacoes), BLOCO_COMBINACOES):
+            bloco = combinacoes[inicio:inicio + BLOCO_COMBINACOES]
+            gramas, erro = self._resolver_bloco(bloco, alvo, pesos, penalidade[bloco].sum(axis=1),
+                                                papeis[-1] == 'gordura')
+            posicao = int(np.argmin(erro))
+            if melhor is None or erro[posicao] < melhor[0]:
+                melhor = (erro[posicao], bloco[posicao], gramas[posicao])
+            if prazo is not None and time.perf_counter() > prazo:
+                break
+
+        _, alimentos, gramas = melhor
+        itens = itens_fixos + [(int(alimento), float(grama)) for alimento, grama in zip(alimentos, gramas) if grama > 0]
+        return self._montar_resultado(itens, metas, candidatos)
+
+    def _montar_resultado(self, itens, metas, candidatos=None):
+        posicoes = np.array([posicao for posicao, _ in itens], dtype=np.int64)
+        gramas = np.array([grama for _, grama in itens], dtype=np.float64)
+        composicao = self.macros[:, posicoes].T * gramas[:, None] if len(itens) else np.zeros((0, len(MACROS)))
+        totais = composicao.sum(axis=0)
+        alvo = np.array([float(metas.get(chave, 0)) for chave in CHAVES_META])
+        tolerancia = np.maximum(np.abs(alvo) * TOLERANCIA_RELATIVA, TOLERANCIA_ABSOLUTA)
+
+        return {
+            'itens': [
+                {
+                    'id': self.base.ids[posicao],
+                    'alimento': self.base.nomes[posicao],
+                    'gramas': round(grama),
+                    'calorias': round(float(linha[0])),
+                    'proteina': round(float(linha[1]), 1),
+                    'carboidrato': round(float(linha[2]), 1),
+                    'gordura': round(float(linha[3]), 1)
+                }
+                for (posicao, grama), linha in zip(itens, composicao)
+            ],
+            'totais': {chave: round(float(valor), 1) for chave, valor in zip(CHAVES_META, totais)},
+            'desvio': {chave: round(float(valor), 1) for chave, valor in zip(CHAVES_META, totais - alvo)},
+            'dentro_tolerancia': bool(np.all(np.abs(totais - alvo) <= tolerancia)),
+            'candidatos': {
+                papel: [self.base.nomes[posicao] for posicao in posicoes_papel[:4]]
+                for papel, posicoes_papel in (candidatos or {}).items()
+            }
+        }
+
+    def otimizar_dia(self, refeicoes, restricoes=(), orcamento=ORCAMENTO_PADRAO, permitidos=None, fixos=None):
+        """
+        Otimiza todas as refeições do dia (nome -> metas de macros), evitando repetir
+        alimentos entre refeições. Refeições além do orçamento usam o melhor bloco já avaliado.
+        permitidos: refeição -> conjunto de alimentos liberados no dia (rotação de cardápios)
+        fixos: refeição -> itens (posição, gramas) que entram sempre, como os de uma receita
+        """
+        excluir = componentes_excluidos(restricoes)
+        prazo = time.perf_counter() + orcamento
+        usados = set()
+        resultado = {}
+        for refeicao, metas in refeicoes.items():
+            resultado[refeicao] = self.otimizar_refeicao(refeicao, metas, excluir, usados, prazo,
+                                                         (permitidos or {}).get(refeicao),
+                                                         (fixos or {}).get(refeicao, ()))
+            usados.update(self.base.posicao(item['id']) for item in resultado[refeicao]['itens'])
+        return resultado
+
+    def otimizar_dias(self, refeicoes, restricoes=(), permitidos_por_dia=(), fixos=None):
+        """
+        Vários dias com as mesmas metas e alimentos liberados diferentes em cada um (rotação).
+        Cada refeição é resolvida para todos os dias em um único lote vetorizado: as combinações
+        dos dias são concatenadas e o melhor de cada dia sai de um argmin por segmento.
+        fixos: refeição -> itens (posição, gramas) presentes em todos os dias.
+        Retorna a lista de resultados diários no formato de otimizar_dia.
+        """
+        fixos = fixos or {}
+        excluir = componentes_excluidos(restricoes)
+        dias = len(permitidos_por_dia)
+        usados = [set() for _ in range(dias)]
+        resultados = [{} for _ in range(dias)]
+
+        for refeicao, metas in refeicoes.items():
+            preparados = []
+            grupos = {}
+            for dia, permitidos in enumerate(permitidos_por_dia):
+                liberados = permitidos.get(refeicao)
+                candidatos = self._sem_fixos(self.candidatos(refeicao, excluir, CANDIDATOS_POR_PAPEL, liberados),
+                                             fixos.get(refeicao))
+                itens_fixos, alvo, pesos = self._preparar_refeicao(refeicao, metas, excluir, usados[dia], liberados,
+                                                                   fixos.get(refeicao, ()))
+                cobertos = self._papeis_cobertos(fixos.get(refeicao), alvo, metas)
+                papeis = tuple(papel for papel in PAPEIS if len(candidatos[papel]) and papel not in cobertos)
+                preparados.append((candidatos, itens_fixos, alvo, pesos))
+                if papeis:
+                    grupos.setdefault(papeis, []).append(dia)
+                else:
+                    resultados[dia][refeicao] = self._montar_resultado(itens_fixos, metas)
+
+            # Dias com os mesmos papéis disponíveis compartilham o lote
+            for papeis, dias_grupo in grupos.items():
+                combinacoes = [
+                    np.array(list(product(*(preparados[dia][0][papel] for papel in papeis))), dtype=np.int64)
+                    for dia in dias_grupo
+                ]
+                tamanhos = np.array([len(bloco) for bloco in combinacoes])
+                dia_linha = np.repeat(np.arange(len(dias_grupo)), tamanhos)
+                combinacoes = np.concatenate(combinacoes)
+                alvos = np.array([preparados[dia][2] for dia in dias_grupo])[dia_linha]
+                pesos = np.array([preparados[dia][3] for dia in dias_grupo])[dia_linha]
+                penalidades = np.array([self._penalidade(usados[dia]) for dia in dias_grupo])
+                penalidade = penalidades[dia_linha[:, None], combinacoes].sum(axis=1)
+
+                gramas, erro = self._resolver_bloco(combinacoes, alvos, pesos, penalidade, papeis[-1] == 'gordura')
+
+                inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+                for indice, dia in enumerate(dias_grupo):
+                    segmento = slice(inicios[indice], inicios[indice] + tamanhos[indice])
+                    melhor = inicios[indice] + int(np.argmin(erro[segmento]))
+                    candidatos, itens_fixos = preparados[dia][0], preparados[dia][1]
+                    itens = itens_fixos + [(int(alimento), float(grama))
+                                           for alimento, grama in zip(combinacoes[melhor], gramas[melhor]) if grama > 0]
+                    resultados[dia][refeicao] = self._montar_resultado(itens, metas, candidatos)
+
+            for dia in range(dias):
+                usados[dia].update(self.base.posicao(item['id']) for item in resultados[dia][refeicao]['itens'])
+        return resultados
+
+
+_otimizadores = {}
+
+
+def obter_otimizador(base=None):
+    """Otimizador por versão da base de alimentos"""
+    base = base or obter_base_alimentos()
+    if base.versao not in _otimizadores:
+        _otimizadores[base.versao] = OtimizadorRefeicoes(base)
+    return _otimizadores[base.versao]
@@ -0,0 +1,222 @@
+"""
+RECEITAS
+Receitas como vetores de ingredientes sobre a base de alimentos (gramas por porção em
+formato CSR): a composição de várias receitas sai de um único produto esparso e fica em
+cache pela versão de cada receita; a porção é escalada para as metas da refeição
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from modules.nutricao_alimentos import (
+    COMPONENTES_RESTRICAO, DIRETORIO_DADOS, REFEICOES_ALIMENTOS, mascara_bits, obter_base_alimentos
+)
+from modules.nutricao_busca import obter_indice_busca
+from modules.nutricao_otimizador import (
+    CHAVES_META, MACROS, TIPO_REFEICAO, TOLERANCIA_ABSOLUTA, TOLERANCIA_RELATIVA
+)
+
+ARQUIVO_RECEITAS = os.path.join(DIRETORIO_DADOS, 'receitas.json')
+
+# Porções sugeridas: múltiplos de 1/4 entre meia e três porções
+PORCOES_MINIMAS = 0.5
+PORCOES_MAXIMAS = 3.0
+ARREDONDAMENTO_PORCAO = 0.25
+
+RECEITAS_POR_REFEICAO = 3
+
+# (versão da base, versão da receita) -> composição por porção e ingredientes resolvidos
+_composicoes = {}
+
+
+def versao_receita(receita):
+    """Hash do rendimento e dos ingredientes: qualquer edição gera uma nova versão"""
+    conteudo = json.dumps(
+        {'porcoes': receita.get('porcoes', 1), 'ingredientes': receita['ingredientes']},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+
+
+def resolver_ingredientes(ingredientes, base=None):
+    """Posições dos ingredientes (id, nome exato ou aproximado); não encontrados voltam com sugestões"""
+    return obter_indice_busca(base).resolver_lista([ingrediente['alimento'] for ingrediente in ingredientes])
+
+
+def vetores_ingredientes(receitas, base):
+    """Matriz esparsa receitas x alimentos (CSR): inícios das linhas, posições e gramas por porção"""
+    posicoes_nomes, nao_encontrados = resolver_ingredientes(
+        [ingrediente for receita in receitas for ingrediente in receita['ingredientes']], base
+    )
+    if nao_encontrados:
+        raise ValueError(f'Ingredientes não encontrados: {", ".join(nao_encontrados)}')
+
+    tamanhos = []
+    posicoes, gramas = [], []
+    for receita in receitas:
+        porcoes = float(receita.get('porcoes', 1))
+        if not receita['ingredientes'] or porcoes <= 0:
+            raise ValueError(f"Receita sem ingredientes ou rendimento inválido: {receita.get('nome')}")
+        tamanhos.append(len(receita['ingredientes']))
+        for ingrediente in receita['ingredientes']:
+            posicoes.append(posicoes_nomes[ingrediente['alimento']])
+            gramas.append(float(ingrediente['gramas']) / porcoes)
+    inicios = np.concatenate(([0], np.cumsum(tamanhos))).astype(np.int64)
+    return inicios, np.array(posicoes, dtype=np.int64), np.array(gramas, dtype=np.float64)
+
+
+def composicao_receitas(receitas, base=None, versoes=None):
+    """
+    Nutrientes por porção (nutrientes x receitas). Só as receitas fora do cache entram
+    no produto esparso: matriz da base nas colunas dos ingredientes x gramas, somada por linha
+    """
+    base = base or obter_base_alimentos()
+    versoes = versoes or [versao_receita(receita) for receita in receitas]
+    pendentes = [indice for indice, versao in enumerate(versoes) if (base.versao, versao) not in _composicoes]
+
+    if pendentes:
+        inicios, posicoes, gramas = vetores_ingredientes([receitas[indice] for indice in pendentes], base)
+        produtos = np.asarray(base.matriz[:, posicoes], dtype=np.float64) * (gramas / 100)
+        composicao = np.add.reduceat(produtos, inicios[:-1], axis=1)
+        contem = np.bitwise_or.reduceat(np.asarray(base.atributos['contem'][posicoes]), inicios[:-1])
+        for coluna, indice in enumerate(pendentes):
+            linha = slice(inicios[coluna], inicios[coluna + 1])
+            _composicoes[(base.versao, versoes[indice])] = {
+                'composicao': composicao[:, coluna],
+                'contem': int(contem[coluna]),
+                'posicoes': posicoes[linha],
+                'gramas': gramas[linha]
+            }
+
+    return [_composicoes[(base.versao, versao)] for versao in versoes]
+
+
+class LivroReceitas:
+    """Receitas com macros por porção (4 x receitas) e máscaras de refeição e componentes"""
+
+    def __init__(self, receitas, base=None):
+        self.base = base or obter_base_alimentos()
+        self.receitas = list(receitas)
+        self.versoes = [versao_receita(receita) for receita in self.receitas]
+        self.compiladas = composicao_receitas(self.receitas, self.base, self.versoes)
+
+        linhas_macros = [self.base.posicao_nutriente[macro] for macro in MACROS]
+        self.macros = np.array([compilada['composicao'][linhas_macros] for compilada in self.compiladas],
+                               dtype=np.float64).T.reshape(len(MACROS), -1)
+        self.refeicoes = np.array([mascara_bits(receita.get('refeicoes', ()), REFEICOES_ALIMENTOS)
+                                   for receita in self.receitas], dtype=np.int64)
+        self.contem = np.array([compilada['contem'] for compilada in self.compiladas], dtype=np.int64)
+        self.posicao = {receita['id']: indice for indice, receita in enumerate(self.receitas)}
+
+    def __len__(self):
+        return len(self.receitas)
+
+    def com_receitas(self, receitas):
+        """Livro com receitas adicionais (ex.: as do coach); composições já calculadas vêm do cache"""
+        return LivroReceitas(self.receitas + list(receitas), self.base) if receitas else self
+
+    def filtrar(self, refeicao=None, excluir_componentes=()):
+        """Índices das receitas liberadas para a refeição (nome do plano ou tipo) sem os componentes"""
+        mascara = np.ones(len(self), dtype=bool)
+        tipo = TIPO_REFEICAO.get(refeicao, refeicao)
+        if tipo:
+            mascara &= (self.refeicoes & mascara_bits([tipo], REFEICOES_ALIMENTOS)) != 0
+        if excluir_componentes:
+            mascara &= (self.contem & mascara_bits(excluir_componentes, COMPONENTES_RESTRICAO)) == 0
+        return np.flatnonzero(mascara)
+
+    def escalar(self, indices, metas):
+        """
+        Porções que aproximam cada receita das metas: mínimos quadrados com uma incógnita
+        (erro relativo por macro), limitado e arredondado a 1/4 de porção. Retorna (porções, erro).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        alvo = np.array([float(metas.get(chave, 0)) for chave in CHAVES_META])
+        pesos = (1 / np.maximum(np.abs(alvo), TOLERANCIA_ABSOLUTA)) ** 2
+        macros = self.macros[:, indices]
+
+        denominador = pesos @ macros ** 2
+        porcoes = np.divide((pesos * alvo) @ macros, denominador, out=np.zeros(len(indices)), where=denominador > 0)
+        porcoes = np.clip(np.round(porcoes / ARREDONDAMENTO_PORCAO) * ARREDONDAMENTO_PORCAO,
+                          PORCOES_MINIMAS, PORCOES_MAXIMAS)
+        erro = pesos @ (macros * porcoes - alvo[:, None]) ** 2
+        return porcoes, erro
+
+    def sugerir(self, refeicao, metas, excluir_componentes=(), quantidade=RECEITAS_POR_REFEICAO):
+        """Receitas da refeição que melhor atendem às metas, já na porção escalada"""
+        indices = self.filtrar(refeicao, excluir_componentes)
+        if not len(indices):
+            return []
+        porcoes, erro = self.escalar(indices, metas)
+        ordem = np.argsort(erro, kind='stable')[:quantidade]
+        return [self.item(indices[posicao], porcoes[posicao], metas) for posicao in ordem]
+
+    def escolher(self, escolha, metas, excluir_componentes=()):
+        """
+        Receita escolhida para a refeição (id ou {'id', 'porcoes'}) -> (índice, porções).
+        Sem porções informadas, a receita é escalada para as metas; uma receita com algum
+        componente excluído pelas restrições é recusada.
+        """
+        receita_id, porcoes = (escolha.get('id'), escolha.get('porcoes')) if isinstance(escolha, dict) else (escolha, None)
+        if receita_id not in self.posicao:
+            raise ValueError(f'Receita não encontrada: {receita_id}')
+        indice = self.posicao[receita_id]
+        if excluir_componentes and self.contem[indice] & mascara_bits(excluir_componentes, COMPONENTES_RESTRICAO):
+            raise ValueError(f"Receita incompatível com as restrições alimentares: {self.receitas[indice]['nome']}")
+        if porcoes is None:
+            porcoes = self.escalar([indice], metas)[0][0]
+        elif not isinstance(porcoes, (int, float)) or not PORCOES_MINIMAS <= porcoes <= PORCOES_MAXIMAS:
+            raise ValueError(f'Porções da receita devem estar entre {PORCOES_MINIMAS:g} e {PORCOES_MAXIMAS:g}')
+        return indice, float(porcoes)
+
+    def ingredientes(self, indice, porcoes=1.0):
+        """Ingredientes da receita como itens (posição na base, gramas) para o otimizador"""
+        compilada = self.compiladas[indice]
+        return [(posicao, float(gramas) * porcoes)
+                for posicao, gramas in zip(compilada['posicoes'].tolist(), compilada['gramas'])]
+
+    def item(self, indice, porcoes=1.0, metas=None):
+        """Receita como item de refeição: porções, gramas, macros, ingredientes e desvio das metas"""
+        receita = self.receitas[indice]
+        compilada = self.compiladas[indice]
+        totais = self.macros[:, indice] * porcoes
+        resultado = {
+            'tipo': 'receita',
+            'id': receita['id'],
+            'receita': receita['nome'],
+            'porcoes': float(porcoes),
+            'gramas': round(float(compilada['gramas'].sum() * porcoes)),
+            'calorias': round(float(totais[0])),
+            'proteina': round(float(totais[1]), 1),
+            'carboidrato': round(float(totais[2]), 1),
+            'gordura': round(float(totais[3]), 1),
+            'ingredientes': [
+                {'id': self.base.ids[posicao], 'alimento': self.base.nomes[posicao], 'gramas': round(float(gramas * porcoes))}
+                for posicao, gramas in zip(compilada['posicoes'].tolist(), compilada['gramas'])
+            ]
+        }
+        if metas is not None:
+            alvo = np.array([float(metas.get(chave, 0)) for chave in CHAVES_META])
+            tolerancia = np.maximum(np.abs(alvo) * TOLERANCIA_RELATIVA, TOLERANCIA_ABSOLUTA)
+            resultado['desvio'] = {chave: round(float(valor), 1) for chave, valor in zip(CHAVES_META, totais - alvo)}
+            resultado['dentro_tolerancia'] = bool(np.all(np.abs(totais - alvo) <= tolerancia))
+        return resultado
+
+
+def carregar_receitas(caminho=ARQUIVO_RECEITAS):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)['receitas']
+
+
+_livros = {}
+
+
+def obter_livro_receitas(base=None):
+    """Receitas padrão (modules/dados/receitas.json) por versão da base de alimentos"""
+    base = base or obter_base_alimentos()
+    if base.versao not in _livros:
+        _livros[base.versao] = LivroReceitas(carregar_receitas(), base)
+    return _livros[base.versao]
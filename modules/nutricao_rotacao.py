@@ -0,0 +1,210 @@
+"""
+ROTAÇÃO DE CARDÁPIOS
+Planos de 7 a 28 dias com as mesmas metas diárias e alimentos que se alternam: cada
+refeição tem um conjunto de candidatos embaralhado pela semente e cada dia libera uma
+janela desse conjunto, o que limita quantas vezes um alimento se repete por semana.
+Os dias ainda não calculados são otimizados em um único lote e guardados em cache.
+"""
+
+import math
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from modules.nutricao_alimentos import interpretar_restricoes
+from modules.nutricao_otimizador import CHAVES_META, REFEICOES_COM_VEGETAIS, TIPO_REFEICAO
+
+DIAS_MINIMOS_ROTACAO = 7
+DIAS_MAXIMOS_ROTACAO = 28
+
+# Vezes que o mesmo alimento pode aparecer na mesma refeição em 7 dias seguidos
+REPETICAO_MAXIMA_PADRAO = 3
+
+# Candidatos de cada papel que entram no rodízio (os mais 'puros' do papel)
+CANDIDATOS_ROTACAO = 16
+
+# Papéis com poucos alimentos na refeição (ex.: gordura no pré-treino) completam o conjunto
+# com os do mesmo papel marcados para estas refeições, na ordem, até respeitar o limite semanal
+REFEICOES_VIZINHAS = {
+    'cafe': ('lanche', 'ceia'),
+    'lanche': ('cafe', 'pre_treino', 'ceia'),
+    'almoco': ('jantar',),
+    'jantar': ('almoco', 'ceia'),
+    'pre_treino': ('lanche', 'pos_treino', 'cafe'),
+    'pos_treino': ('pre_treino', 'lanche', 'almoco', 'jantar'),
+    'ceia': ('lanche', 'jantar')
+}
+
+# Dias otimizados mantidos em memória (chave: versão da base, metas, restrições e alimentos liberados)
+TAMANHO_CACHE_DIAS = 4096
+
+_cache_dias = OrderedDict()
+
+
+def _janela(tamanho, repeticao_maxima):
+    """
+    Alimentos liberados por dia em um conjunto de 'tamanho' candidatos: janelas contíguas
+    (circulares) de k itens cobrem 7k posições por semana, então cada alimento aparece no
+    máximo ceil(7k / tamanho) <= repeticao_maxima vezes
+    """
+    return int(min(tamanho, max(1, tamanho * repeticao_maxima // 7)))
+
+
+def conjuntos_rotacao(otimizador, refeicoes, excluir, semente, repeticao_maxima=REPETICAO_MAXIMA_PADRAO):
+    """
+    Conjuntos embaralhados de candidatos de cada refeição (papéis + vegetais nas principais).
+    Um papel com menos de ceil(7 / repeticao_maxima) candidatos é completado com os do mesmo
+    papel das refeições vizinhas (REFEICOES_VIZINHAS).
+    """
+    gerador = np.random.default_rng(semente)
+    minimo = math.ceil(7 / repeticao_maxima)
+    conjuntos = {}
+    for refeicao in refeicoes:
+        candidatos = otimizador.candidatos(refeicao, excluir, CANDIDATOS_ROTACAO)
+        for vizinha in REFEICOES_VIZINHAS.get(TIPO_REFEICAO.get(refeicao), ()):
+            faltantes = [papel for papel in candidatos if 0 < len(candidatos[papel]) < minimo]
+            if not faltantes:
+                break
+            extras = otimizador.candidatos(refeicao, excluir, CANDIDATOS_ROTACAO, tipo=vizinha)
+            for papel in faltantes:
+                novos = [posicao for posicao in extras[papel].tolist() if posicao not in candidatos[papel]]
+                candidatos[papel] = np.concatenate(
+                    (candidatos[papel], np.array(novos[:minimo - len(candidatos[papel])], dtype=np.int64))
+                )
+        grupos = [candidatos[papel] for papel in sorted(candidatos) if len(candidatos[papel])]
+        if refeicao in REFEICOES_COM_VEGETAIS:
+            grupos.append(otimizador.base.filtrar(categorias=['vegetais'], excluir_componentes=excluir))
+        conjuntos[refeicao] = [gerador.permutation(grupo) for grupo in grupos]
+    return conjuntos
+
+
+def liberados_do_dia(conjuntos, indice_dia, repeticao_maxima):
+    """Refeição -> alimentos liberados no dia (índice absoluto: dias seguidos avançam a janela)"""
+    liberados = {}
+    for refeicao, grupos in conjuntos.items():
+        dia = set()
+        for grupo in grupos:
+            tamanho = len(grupo)
+            janela = _janela(tamanho, repeticao_maxima)
+            inicio = (indice_dia * janela) % tamanho
+            dia.update(grupo[(inicio + np.arange(janela)) % tamanho].tolist())
+        liberados[refeicao] = frozenset(dia)
+    return liberados
+
+
+def _chave_dia(otimizador, refeicoes, excluir, liberados, fixos=None):
+    metas = tuple(
+        (refeicao, tuple(round(float(metas.get(chave, 0)), 1) for chave in CHAVES_META))
+        for refeicao, metas in refeicoes.items()
+    )
+    receitas = tuple(
+        (refeicao, tuple((posicao, round(gramas, 1)) for posicao, gramas in itens))
+        for refeicao, itens in sorted((fixos or {}).items())
+    )
+    return (otimizador.base.versao, metas, frozenset(excluir),
+            tuple((refeicao, tuple(sorted(liberados[refeicao]))) for refeicao in refeicoes), receitas)
+
+
+def _repeticoes_semanais(presenca):
+    """Maior número de dias com o mesmo alimento em qualquer janela de 7 dias (presença: dias x alimentos)"""
+    acumulado = np.vstack([np.zeros((1, presenca.shape[1]), dtype=np.int64), np.cumsum(presenca, axis=0)])
+    janela = min(7, presenca.shape[0])
+    return int((acumulado[janela:] - acumulado[:-janela]).max()) if presenca.size else 0
+
+
+def gerar_rotacao(otimizador, refeicoes, restricoes=(), dias=DIAS_MINIMOS_ROTACAO,
+                  repeticao_maxima=REPETICAO_MAXIMA_PADRAO, semente=0, inicio=None, fixos=None):
+    """
+    Cardápio de 'dias' dias para as metas por refeição (refeição -> metas de macros).
+    A janela de cada dia depende da data, então regenerar a partir da semana seguinte
+    com a mesma semente reaproveita os dias já calculados.
+    fixos: refeição -> itens (posição, gramas) de todos os dias (ingredientes de uma receita escolhida).
+    """
+    if not DIAS_MINIMOS_ROTACAO <= dias <= DIAS_MAXIMOS_ROTACAO:
+        raise ValueError(f'A rotação deve ter entre {DIAS_MINIMOS_ROTACAO} e {DIAS_MAXIMOS_ROTACAO} dias')
+    if repeticao_maxima < 1:
+        raise ValueError('A repetição máxima deve ser de pelo menos 1 vez por semana')
+
+    inicio = inicio or date.today()
+    excluir, nao_reconhecidas = interpretar_restricoes(restricoes)
+    conjuntos = conjuntos_rotacao(otimizador, refeicoes, excluir, semente, repeticao_maxima)
+
+    chaves, pendentes = [], OrderedDict()
+    for dia in range(dias):
+        liberados = liberados_do_dia(conjuntos, inicio.toordinal() + dia, repeticao_maxima)
+        chave = _chave_dia(otimizador, refeicoes, excluir, liberados, fixos)
+        chaves.append(chave)
+        if chave not in _cache_dias:
+            pendentes[chave] = liberados
+
+    acertos = sum(chave not in pendentes for chave in chaves)
+    if pendentes:
+        calculados = otimizador.otimizar_dias(refeicoes, restricoes, list(pendentes.values()), fixos)
+        for chave, resultado in zip(pendentes, calculados):
+            _cache_dias[chave] = resultado
+    for chave in chaves:
+        _cache_dias.move_to_end(chave)
+    while len(_cache_dias) > TAMANHO_CACHE_DIAS:
+        _cache_dias.popitem(last=False)
+
+    plano = []
+    for dia, chave in enumerate(chaves):
+        resultado = _cache_dias[chave]
+        totais = np.array([[resultado[refeicao]['totais'][meta] for meta in CHAVES_META]
+                           for refeicao in refeicoes]).sum(axis=0)
+        plano.append({
+            'dia': dia + 1,
+            'data': (inicio + timedelta(days=dia)).isoformat(),
+            'refeicoes': resultado,
+            'totais': {meta: round(float(valor), 1) for meta, valor in zip(CHAVES_META, totais)},
+            'dentro_tolerancia': all(resultado[refeicao]['dentro_tolerancia'] for refeicao in refeicoes)
+        })
+
+    return {
+        'dias': plano,
+        'variedade': _variedade(otimizador, plano, refeicoes, repeticao_maxima, conjuntos, fixos),
+        'restricoes_nao_reconhecidas': nao_reconhecidas,
+        'cache': {'dias_unicos': len(set(chaves)), 'acertos': acertos, 'calculados': len(pendentes)}
+    }
+
+
+def _variedade(otimizador, plano, refeicoes, repeticao_maxima, conjuntos, fixos=None):
+    """
+    Alimentos distintos e repetições semanais (por refeição e no dia como um todo).
+    Refeições com algum papel de menos de 7 / repeticao_maxima candidatos mesmo depois de
+    completado com as refeições vizinhas não conseguem respeitar o limite. Os ingredientes
+    das receitas escolhidas se repetem por escolha e ficam fora da contagem de repetições.
+    """
+    escolhidos = {refeicao: {posicao for posicao, _ in itens} for refeicao, itens in (fixos or {}).items()}
+    posicoes = {
+        refeicao: [[posicao for posicao in (otimizador.base.posicao(item['id'])
+                                            for item in dia['refeicoes'][refeicao]['itens'])
+                    if posicao not in escolhidos.get(refeicao, ())]
+                   for dia in plano]
+        for refeicao in refeicoes
+    }
+    todos = sorted({posicao for dias in posicoes.values() for itens in dias for posicao in itens})
+    coluna = {posicao: indice for indice, posicao in enumerate(todos)}
+
+    presenca_dia = np.zeros((len(plano), len(todos)), dtype=np.int64)
+    por_refeicao = {}
+    for refeicao, dias in posicoes.items():
+        presenca = np.zeros_like(presenca_dia)
+        for dia, itens in enumerate(dias):
+            presenca[dia, [coluna[posicao] for posicao in itens]] = 1
+        presenca_dia |= presenca
+        por_refeicao[refeicao] = _repeticoes_semanais(presenca)
+
+    repeticao_refeicao = max(por_refeicao.values(), default=0)
+    return {
+        'alimentos_distintos': len(todos),
+        'repeticao_maxima': repeticao_maxima,
+        'repeticao_semanal_por_refeicao': por_refeicao,
+        'repeticao_semanal_no_dia': _repeticoes_semanais(presenca_dia),
+        'dentro_limite': repeticao_refeicao <= repeticao_maxima,
+        'candidatos_insuficientes': [
+            refeicao for refeicao, grupos in conjuntos.items()
+            if any(len(grupo) * repeticao_maxima < 7 for grupo in grupos)
+        ]
+    }
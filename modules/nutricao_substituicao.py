@@ -0,0 +1,110 @@
+"""
+SUBSTITUIÇÃO DE ALIMENTOS
+Vizinhos mais próximos no espaço de macros normalizado (fração das calorias vinda de
+proteína, carboidrato e gordura, ou seja, macros por 100 kcal): o substituto entra com
+as mesmas calorias e o perfil de macros mais parecido
+"""
+
+import numpy as np
+
+from modules.nutricao_alimentos import componentes_excluidos, obter_base_alimentos
+
+QUANTIDADE_PADRAO = 5
+ARREDONDAMENTO_G = 5
+
+KCAL_POR_GRAMA = np.array([4.0, 4.0, 9.0])
+
+
+class SubstituicaoAlimentos:
+    """
+    Pontos (fração de kcal de P, C, G) particionados por categoria. Com ~10^2 alimentos por
+    categoria a busca exaustiva vetorizada fica abaixo de uma árvore KD em custo e não
+    exige dependência nova.
+    """
+
+    def __init__(self, base=None):
+        self.base = base or obter_base_alimentos()
+        self.energia = np.asarray(self.base.coluna('energia_kcal'), dtype=np.float64) / 100  # kcal/g
+        macros = np.array([self.base.coluna(nutriente) for nutriente in ('proteina_g', 'carboidrato_g', 'gordura_g')],
+                          dtype=np.float64).T / 100  # g/g
+
+        energia_macros = macros * KCAL_POR_GRAMA
+        total = energia_macros.sum(axis=1, keepdims=True)
+        self.pontos = np.divide(energia_macros, total, out=np.zeros_like(energia_macros), where=total > 0)
+        self.macros = macros
+
+        self.categoria = np.asarray(self.base.atributos['categoria'])
+        self.validos = self.energia > 0
+        self.por_categoria = {
+            codigo: np.flatnonzero((self.categoria == codigo) & self.validos)
+            for codigo in range(len(self.base.categorias))
+        }
+
+    def _candidatos(self, posicao, categorias, restricoes, refeicao):
+        if categorias:
+            codigos = [self.base.posicao_categoria[categoria] for categoria in categorias
+                       if categoria in self.base.posicao_categoria]
+        else:
+            codigos = [int(self.categoria[posicao])]
+        candidatos = np.concatenate([self.por_categoria[codigo] for codigo in codigos]) if codigos \
+            else np.empty(0, dtype=np.int64)
+
+        excluir = componentes_excluidos(restricoes)
+        if excluir or refeicao:
+            permitidos = self.base.filtrar(refeicao=refeicao, excluir_componentes=excluir)
+            candidatos = candidatos[np.isin(candidatos, permitidos)]
+        return candidatos[candidatos != posicao]
+
+    def substituir(self, posicao, gramas, quantidade=QUANTIDADE_PADRAO, categorias=None, restricoes=(),
+                   refeicao=None):
+        """
+        Os k substitutos mais próximos do alimento (por padrão da mesma categoria),
+        com a gramagem que mantém as calorias da porção original
+        """
+        if not self.validos[posicao]:
+            raise ValueError(f'Alimento sem calorias para comparar: {self.base.nomes[posicao]}')
+
+        candidatos = self._candidatos(posicao, categorias, restricoes, refeicao)
+        distancias = np.linalg.norm(self.pontos[candidatos] - self.pontos[posicao], axis=1)
+        quantidade = min(quantidade, len(candidatos))
+        if quantidade == 0:
+            return []
+        if quantidade < len(candidatos):
+            proximos = np.argpartition(distancias, quantidade - 1)[:quantidade]
+        else:
+            proximos = np.arange(len(candidatos))
+        proximos = proximos[np.argsort(distancias[proximos], kind='stable')]
+
+        calorias = gramas * self.energia[posicao]
+        original = self.macros[posicao] * gramas
+        resultado = []
+        for indice in proximos:
+            substituto = candidatos[indice]
+            gramas_substituto = max(ARREDONDAMENTO_G,
+                                    round(calorias / self.energia[substituto] / ARREDONDAMENTO_G) * ARREDONDAMENTO_G)
+            macros_substituto = self.macros[substituto] * gramas_substituto
+            resultado.append({
+                'id': self.base.ids[substituto],
+                'alimento': self.base.nomes[substituto],
+                'categoria': self.base.categorias[self.categoria[substituto]],
+                'gramas': gramas_substituto,
+                'distancia': round(float(distancias[indice]), 3),
+                'diferenca': {
+                    'calorias': round(float(gramas_substituto * self.energia[substituto] - calorias)),
+                    'proteina': round(float(macros_substituto[0] - original[0]), 1),
+                    'carboidrato': round(float(macros_substituto[1] - original[1]), 1),
+                    'gordura': round(float(macros_substituto[2] - original[2]), 1)
+                }
+            })
+        return resultado
+
+
+_substituicoes = {}
+
+
+def obter_substituicao(base=None):
+    """Motor de substituição por versão da base de alimentos"""
+    base = base or obter_base_alimentos()
+    if base.versao not in _substituicoes:
+        _substituicoes[base.versao] = SubstituicaoAlimentos(base)
+    return _substituicoes[base.versao]